@@ -0,0 +1,123 @@
+'''
+NumPy batch simulator: advances many independent packed boards (see bitboard.py)
+together as one uint64 array of shape (N,).
+
+Rows are resolved through the bitboard row tables converted to arrays, and up/down
+moves use the same bit-level transpose, so every step is a handful of array
+operations no matter how many boards are in flight. Rewards match Grid.move.
+'''
+import numpy as np
+
+import bitboard
+
+SHIFTS = np.arange(0, 64, 4, dtype=np.uint64) # nibble offsets of the 16 cells
+ROW_SHIFTS = np.arange(0, 64, 16, dtype=np.uint64)
+
+LEFT_TABLE, RIGHT_TABLE = bitboard.row_tables()
+LEFT_ROWS = np.array([entry[0] for entry in LEFT_TABLE], dtype=np.uint64)
+LEFT_REWARDS = np.array([entry[2] for entry in LEFT_TABLE], dtype=np.int64)
+LEFT_SCORES = np.array([entry[3] for entry in LEFT_TABLE], dtype=np.int64)
+RIGHT_ROWS = np.array([entry[0] for entry in RIGHT_TABLE], dtype=np.uint64)
+RIGHT_REWARDS = np.array([entry[2] for entry in RIGHT_TABLE], dtype=np.int64)
+RIGHT_SCORES = np.array([entry[3] for entry in RIGHT_TABLE], dtype=np.int64)
+
+
+def to_array(boards):
+    return np.asarray(boards, dtype=np.uint64)
+
+
+def transpose(boards):
+    a1 = boards & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = boards & np.uint64(0x0000F0F00000F0F0)
+    a3 = boards & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << np.uint64(12)) | (a3 >> np.uint64(12))
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> np.uint64(24)) | (b3 << np.uint64(24))
+
+
+def mirror(boards):
+    boards = ((boards & np.uint64(0x0F0F0F0F0F0F0F0F)) << np.uint64(4)) | ((boards >> np.uint64(4)) & np.uint64(0x0F0F0F0F0F0F0F0F))
+    return ((boards & np.uint64(0x00FF00FF00FF00FF)) << np.uint64(8)) | ((boards >> np.uint64(8)) & np.uint64(0x00FF00FF00FF00FF))
+
+
+def flip(boards):
+    boards = ((boards & np.uint64(0x0000FFFF0000FFFF)) << np.uint64(16)) | ((boards >> np.uint64(16)) & np.uint64(0x0000FFFF0000FFFF))
+    return ((boards & np.uint64(0x00000000FFFFFFFF)) << np.uint64(32)) | (boards >> np.uint64(32))
+
+
+def canonical_key(boards):
+    """
+    Vectorized bitboard.canonical_key: the smallest of the 8 symmetric images of every board.
+    """
+    t = transpose(boards)
+    m, tm = mirror(boards), mirror(t)
+    return np.minimum.reduce([boards, m, flip(boards), flip(m), t, tm, flip(t), flip(tm)])
+
+
+def apply_rows(boards, rows_table, rewards_table, scores_table):
+    rows = ((boards[:, None] >> ROW_SHIFTS) & np.uint64(0xFFFF)).astype(np.intp) # (N, 4) row indices
+    result = np.bitwise_or.reduce(rows_table[rows] << ROW_SHIFTS, axis=1)
+    return result, rewards_table[rows].sum(axis=1), scores_table[rows].sum(axis=1)
+
+
+def move(boards, direction):
+    """
+    Vectorized bitboard.move: returns (new_boards, rewards, scores) for a (N,) uint64 array.
+    A board's move was legal iff its new board differs.
+    """
+    if direction == 'left':
+        return apply_rows(boards, LEFT_ROWS, LEFT_REWARDS, LEFT_SCORES)
+    if direction == 'right':
+        return apply_rows(boards, RIGHT_ROWS, RIGHT_REWARDS, RIGHT_SCORES)
+    if direction == 'up':
+        result, rewards, scores = apply_rows(transpose(boards), LEFT_ROWS, LEFT_REWARDS, LEFT_SCORES)
+    else:
+        result, rewards, scores = apply_rows(transpose(boards), RIGHT_ROWS, RIGHT_REWARDS, RIGHT_SCORES)
+    return transpose(result), rewards, scores
+
+
+def move_all(boards):
+    """
+    Plays every action on every board. Returns (after, rewards, legal), each of shape
+    (4, N) with the actions in bitboard.ACTIONS order.
+    """
+    after = np.empty((len(bitboard.ACTIONS), len(boards)), dtype=np.uint64)
+    rewards = np.empty((len(bitboard.ACTIONS), len(boards)), dtype=np.int64)
+    for k, action in enumerate(bitboard.ACTIONS):
+        after[k], rewards[k], _ = move(boards, action)
+    return after, rewards, after != boards[None, :]
+
+
+def legal_mask(boards):
+    return move_all(boards)[2]
+
+
+def empty_mask(boards):
+    return ((boards[:, None] >> SHIFTS) & np.uint64(0xF)) == 0 # (N, 16)
+
+
+def max_exponents(boards):
+    return ((boards[:, None] >> SHIFTS) & np.uint64(0xF)).max(axis=1)
+
+
+def choose(mask, rng):
+    """
+    Picks one True column uniformly at random in every row of a boolean (N, K) mask.
+    Rows without any True entry get index 0.
+    """
+    counts = mask.sum(axis=1)
+    picks = (rng.random(len(mask)) * counts).astype(np.int64)
+    return (np.cumsum(mask, axis=1) > picks[:, None]).argmax(axis=1)
+
+
+def spawn(boards, rng):
+    """
+    Adds a random 2 (90%) or 4 (10%) tile to every board that has an empty cell.
+    """
+    empty = empty_mask(boards)
+    cells = choose(empty, rng).astype(np.uint64)
+    exponents = np.where(rng.random(len(boards)) < 0.9, 1, 2).astype(np.uint64)
+    spawned = boards | (exponents << (cells * np.uint64(4)))
+    return np.where(empty.any(axis=1), spawned, boards)
@@ -0,0 +1,286 @@
+'''
+Speed benchmarks for the move engine and both agents.
+
+Every benchmark runs on the same seeded set of mid-game boards, results are
+written as JSON, and a stored baseline can be compared against to catch
+regressions:
+
+    python benchmark.py --output bench.json --save-baseline baseline.json
+    python benchmark.py --output bench.json --baseline baseline.json   # exits 1 on a regression
+
+Baselines are machine specific, so record them on the machine that checks them.
+The size<n>_ metrics repeat the engine and agent measurements on n x n boards to
+show how throughput scales from 4x4 to 6x6.
+'''
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import bitboard
+import packed
+from core import Game, Grid
+from state import State
+from expectimax import ExpectimaxAI
+from montecarlo import MonteCarloAI
+
+ACTIONS = bitboard.ACTIONS
+
+
+def benchmark_boards(count=200, seed=2048, max_moves=150, size=4):
+    """
+    Seeded mid-game positions: each one comes from random play of up to max_moves moves.
+    """
+    state = random.getstate()
+    random.seed(seed)
+    boards = []
+    while len(boards) < count:
+        grid = Grid(size)
+        grid.random_cell()
+        grid.random_cell()
+        game = Game(grid, None, None, testing_mode=True)
+        for _ in range(random.randint(1, max_moves)):
+            actions = game.get_legal_actions()
+            if not actions:
+                break
+            grid.move(random.choice(actions))
+            grid.random_cell()
+        if game.get_legal_actions():
+            boards.append(grid.get_state())
+    random.setstate(state)
+    return boards
+
+
+def timed(function, min_seconds, setup=None):
+    """
+    Calls function() until min_seconds have passed, returns (calls, seconds). With setup,
+    function(setup()) is called instead and only the function's time is counted.
+    """
+    calls = 0
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            function(argument)
+        else:
+            function()
+        elapsed += time.perf_counter() - start
+        calls += 1
+    return calls, elapsed
+
+
+def bench_grid_move(boards, min_seconds):
+    grids = []
+    for cells in boards:
+        grid = Grid(len(cells))
+        grid.set_cells(cells)
+        grids.append(grid)
+
+    def copies():
+        # Grid.move works in place, so every call moves fresh copies made outside the timed region
+        return [(grid.clone_grid(), action) for grid in grids for action in ACTIONS]
+
+    def run(moves):
+        for grid, action in moves:
+            grid.move(action)
+    calls, seconds = timed(run, min_seconds, copies)
+    return {'grid_move_per_sec': calls * len(grids) * len(ACTIONS) / seconds}
+
+
+def bench_state_move(boards, min_seconds):
+    states = [State.from_cells(cells) for cells in boards]
+
+    def run():
+        for state in states:
+            for action in ACTIONS:
+                state.move(action)
+    calls, seconds = timed(run, min_seconds)
+    return {'state_move_per_sec': calls * len(states) * len(ACTIONS) / seconds}
+
+
+def bench_bitboard_move(boards, min_seconds):
+    packed = [bitboard.encode(cells) for cells in boards]
+    bitboard.row_tables()
+
+    def run():
+        for board in packed:
+            for action in ACTIONS:
+                bitboard.move(board, action)
+    calls, seconds = timed(run, min_seconds)
+    return {'bitboard_move_per_sec': calls * len(packed) * len(ACTIONS) / seconds}
+
+
+def bench_packed_move(boards, min_seconds):
+    engine = packed.engine(len(boards[0]))
+    encoded = [engine.encode(cells) for cells in boards]
+
+    def run():
+        for board in encoded:
+            for action in ACTIONS:
+                engine.move(board, action)
+    calls, seconds = timed(run, min_seconds)
+    return {'packed_move_per_sec': calls * len(encoded) * len(ACTIONS) / seconds}
+
+
+def bench_legal_actions(boards, min_seconds):
+    games = []
+    for cells in boards:
+        grid = Grid(len(cells))
+        grid.set_cells(cells)
+        games.append(Game(grid, None, None, testing_mode=True))
+
+    def run():
+        for game in games:
+            game.get_legal_actions()
+    calls, seconds = timed(run, min_seconds)
+    return {'legal_actions_per_sec': calls * len(games) / seconds}
+
+
+def warm_up(ai, cells):
+    """
+    Plays one untimed move, so lazily built tables are ready, then empties the agent's cache.
+    """
+    grid = Grid(len(cells))
+    grid.set_cells([row[:] for row in cells])
+    ai.get_action(Game(grid, None, None, testing_mode=True))
+    if ai.cache is not None:
+        ai.cache.clear()
+
+
+def bench_expectimax(boards, depths, backend, frontier=False):
+    results = {}
+    name = f'{backend}_frontier' if frontier else backend # frontier search batches whole root moves
+    for depth in depths:
+        ai = ExpectimaxAI(None, depth=depth, backend=backend, frontier=depth if frontier else 0)
+        warm_up(ai, boards[0]) # one-time table setup stays out of the timings
+        nodes = 0
+        latencies = []
+        for cells in boards:
+            grid = Grid(len(cells))
+            grid.set_cells(cells)
+            game = Game(grid, None, None, testing_mode=True)
+            ai.get_action(game)
+            nodes += ai.nodes
+            latencies.append(ai.latency)
+        total = sum(latencies)
+        results[f'expectimax_{name}_d{depth}_nodes_per_sec'] = nodes / total if total else 0.0
+        results[f'expectimax_{name}_d{depth}_move_ms'] = 1000 * total / len(latencies)
+    return results
+
+
+def bench_montecarlo(boards, settings, backend):
+    results = {}
+    for simulations, max_depth in settings:
+        random.seed(0)
+        ai = MonteCarloAI(None, 0.9, simulations, max_depth, backend=backend, seed=0)
+        rollouts = 0
+        start = time.perf_counter()
+        for cells in boards:
+            grid = Grid(len(cells))
+            grid.set_cells(cells)
+            game = Game(grid, None, None, testing_mode=True)
+            rollouts += len(game.get_legal_actions()) * simulations
+            ai.get_action(game)
+        seconds = time.perf_counter() - start
+        results[f'montecarlo_{backend}_s{simulations}_d{max_depth}_rollouts_per_sec'] = rollouts / seconds
+    return results
+
+
+def bench_board_sizes(sizes, min_seconds, search_count, depths, settings):
+    """
+    Engine and agent throughput on boards of each size. The agents use their 'bitboard'
+    backend, which is the 64-bit bitboard on 4x4 and a PackedEngine on bigger boards.
+    """
+    results = {}
+    for size in sizes:
+        boards = benchmark_boards(size=size)
+        measured = {}
+        measured.update(bench_grid_move(boards, min_seconds))
+        measured.update(bench_state_move(boards, min_seconds))
+        measured.update(bench_packed_move(boards, min_seconds))
+        measured.update(bench_expectimax(boards[:search_count], depths, 'bitboard'))
+        measured.update(bench_montecarlo(boards[:search_count], settings, 'bitboard'))
+        results.update((f'size{size}_{name}', value) for name, value in measured.items())
+    return results
+
+
+def run_benchmarks(quick=False):
+    boards = benchmark_boards()
+    min_seconds = 0.2 if quick else 1.0
+    search_boards = boards[:5] if quick else boards[:20]
+    depths = (1, 2) if quick else (1, 2, 3)
+    settings = ((10, 10),) if quick else ((10, 10), (50, 20), (100, 50))
+
+    results = {}
+    results.update(bench_grid_move(boards, min_seconds))
+    results.update(bench_state_move(boards, min_seconds))
+    results.update(bench_bitboard_move(boards, min_seconds))
+    results.update(bench_legal_actions(boards, min_seconds))
+    for backend in ('grid', 'bitboard'):
+        results.update(bench_expectimax(search_boards, depths, backend))
+    results.update(bench_expectimax(search_boards, depths, 'bitboard', frontier=True))
+    for backend in ('bitboard', 'numpy'):
+        results.update(bench_montecarlo(search_boards, settings, backend))
+    results.update(bench_board_sizes((4, 5, 6), min_seconds, 3 if quick else 10, (1,) if quick else (1, 2),
+                                     settings[:1]))
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def lower_is_better(name):
+    return name.endswith('_ms')
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the metrics that got worse than the baseline by more than tolerance (a fraction).
+    """
+    regressions = []
+    for name, old in baseline['results'].items():
+        new = results['results'].get(name)
+        if new is None or not old:
+            continue
+        change = (old - new) / old if not lower_is_better(name) else (new - old) / old
+        if change > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the move engine and the agents.')
+    parser.add_argument('--output', default='bench_output.json', help='where to write the results')
+    parser.add_argument('--baseline', default=None, help='baseline results to compare against')
+    parser.add_argument('--save-baseline', default=None, help='also store the results as a baseline here')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before failing (fraction)')
+    parser.add_argument('--quick', action='store_true', help='fewer boards, depths and settings')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick)
+    for name, value in results['results'].items():
+        print(f'{name}: {value:.1f}')
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f'REGRESSION {name}: {old:.1f} -> {new:.1f} ({change:.0%} worse)')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+'''
+64-bit bitboard backend for the 4x4 game.
+
+The board is a single int holding 16 nibbles, each the log2 exponent of a tile
+(0 = empty, 1 = 2, 2 = 4, ...). Cell (i, j) lives in nibble 4 * i + j, so row i
+is the 16-bit word (board >> (16 * i)) & 0xFFFF and column j of a row sits at
+bits 4 * j. "Left" moves tiles towards column 0.
+
+Moves are resolved with precomputed 65,536-entry row tables. The rewards match
+Grid.move exactly (merge score + 10 * change in empty cells + sum of absolute
+cell differences), so agents can switch backends without changing behaviour.
+Tiles above 32768 (exponent 15) do not fit in a nibble: encode refuses them and the
+row tables never merge two 32768 tiles, where Grid.move would make a 65536.
+'''
+import random
+
+SIZE = 4
+ROW_MASK = 0xFFFF
+ACTIONS = ('up', 'down', 'left', 'right')  # same order as Game.get_legal_actions
+MAX_EXPONENT = 15 # largest exponent a nibble holds
+
+
+def build_row_entry(row):
+    """
+    Resolves a left move on one packed row using the same compress/merge/compress
+    steps as Grid.move_left. Returns (result_row, moved, reward, score).
+    """
+    exponents = [(row >> (4 * j)) & 0xF for j in range(SIZE)]
+    values = [1 << e if e else 0 for e in exponents]
+
+    line = [v for v in values if v != 0]
+    line += [0] * (SIZE - len(line))
+    score = 0
+    for i in range(SIZE - 1):
+        if line[i] != 0 and line[i] == line[i + 1] and line[i] < 1 << MAX_EXPONENT: # a merged 32768 pair would wrap
+            line[i] *= 2
+            score += line[i]
+            line[i + 1] = 0
+    line = [v for v in line if v != 0]
+    line += [0] * (SIZE - len(line))
+
+    result = 0
+    for j, v in enumerate(line):
+        if v:
+            result |= (v.bit_length() - 1) << (4 * j)
+
+    empty_delta = line.count(0) - values.count(0)
+    difference = sum(abs(a - b) for a, b in zip(line, values))
+    reward = score + empty_delta * 10 + difference
+    return result, result != row, reward, score
+
+
+def reverse_row(row):
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | ((row >> 12) & 0xF)
+
+
+def build_tables():
+    left = [build_row_entry(row) for row in range(ROW_MASK + 1)]
+    right = []
+    for row in range(ROW_MASK + 1):
+        result, moved, reward, score = left[reverse_row(row)]
+        right.append((reverse_row(result), moved, reward, score))
+    return left, right
+
+
+# (LEFT_TABLE, RIGHT_TABLE): row -> (result_row, moved, reward, score) for a move towards column 0 / column 3.
+# Built on first use so that importing this module stays cheap.
+TABLES = None
+
+
+def row_tables():
+    global TABLES
+    if TABLES is None:
+        TABLES = build_tables()
+    return TABLES
+
+
+def transpose(board):
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def mirror(board):
+    """
+    Left-right reflection: reverses the cells of every row.
+    """
+    board = ((board & 0x0F0F0F0F0F0F0F0F) << 4) | ((board >> 4) & 0x0F0F0F0F0F0F0F0F)
+    return ((board & 0x00FF00FF00FF00FF) << 8) | ((board >> 8) & 0x00FF00FF00FF00FF)
+
+
+def flip(board):
+    """
+    Top-bottom reflection: reverses the order of the rows.
+    """
+    board = ((board & 0x0000FFFF0000FFFF) << 16) | ((board >> 16) & 0x0000FFFF0000FFFF)
+    return ((board & 0x00000000FFFFFFFF) << 32) | (board >> 32)
+
+
+def symmetries(board):
+    """
+    The 8 rotations and reflections of board. Transform t applies a transpose if t & 4,
+    then a mirror if t & 1, then a flip if t & 2.
+    """
+    t = transpose(board)
+    m, tm = mirror(board), mirror(t)
+    return (board, m, flip(board), flip(m), t, tm, flip(t), flip(tm))
+
+
+def symmetry(board, transform):
+    return symmetries(board)[transform]
+
+
+def canonical(board):
+    """
+    Returns (canonical_board, transform): the smallest of the 8 symmetric boards, which
+    all have the same value, and the transform that maps board onto it.
+    """
+    images = symmetries(board)
+    smallest = min(images)
+    return smallest, images.index(smallest)
+
+
+def canonical_key(board):
+    """
+    The canonical board alone, for tables keyed by position that never map moves back.
+    """
+    return min(symmetries(board))
+
+
+def transpose_key(board):
+    """
+    The smaller of board and its transpose. ExpectimaxAI.calculate_score scores a
+    smoothness pair from its left or top tile, so it is only symmetric under
+    transposition: this is the canonical form that keeps heuristic values exact.
+    """
+    t = transpose(board)
+    return t if t < board else board
+
+
+def build_action_symmetries():
+    transposed = {'up': 'left', 'left': 'up', 'down': 'right', 'right': 'down'}
+    mirrored = {'up': 'up', 'down': 'down', 'left': 'right', 'right': 'left'}
+    flipped = {'up': 'down', 'down': 'up', 'left': 'left', 'right': 'right'}
+    forward = []
+    for transform in range(8):
+        mapping = {}
+        for action in ACTIONS:
+            mapped = transposed[action] if transform & 4 else action
+            mapped = mirrored[mapped] if transform & 1 else mapped
+            mapping[action] = flipped[mapped] if transform & 2 else mapped
+        forward.append(mapping)
+    backward = [{mapped: action for action, mapped in mapping.items()} for mapping in forward]
+    return forward, backward
+
+
+# ACTION_SYMMETRIES[t][action] is the action on symmetry(board, t) that matches action on board,
+# ACTION_INVERSES[t] maps it back
+ACTION_SYMMETRIES, ACTION_INVERSES = build_action_symmetries()
+
+
+def may_overflow(cells, moves):
+    """
+    True if a 65536 tile could appear on cells within the given number of moves. The tile sum
+    only grows by the spawned tile (at most 4) after each move, and a 65536 tile needs at least 65536.
+    """
+    return sum(map(sum, cells)) + 4 * moves >= 1 << (MAX_EXPONENT + 1)
+
+
+def encode(cells):
+    """
+    Packs a 4x4 list of tile values (as held in Grid.cells) into a bitboard.
+    """
+    board = 0
+    for i in range(SIZE):
+        for j in range(SIZE):
+            value = cells[i][j]
+            if value > 1 << MAX_EXPONENT:
+                raise ValueError(f'tile {value} does not fit in a bitboard (at most {1 << MAX_EXPONENT})')
+            if value:
+                board |= (value.bit_length() - 1) << (4 * (SIZE * i + j))
+    return board
+
+
+def decode(board):
+    """
+    Unpacks a bitboard into a fresh 4x4 list of tile values.
+    """
+    cells = []
+    for i in range(SIZE):
+        row = (board >> (16 * i)) & ROW_MASK
+        cells.append([1 << e if e else 0 for e in ((row >> (4 * j)) & 0xF for j in range(SIZE))])
+    return cells
+
+
+def apply_rows(board, table):
+    result = 0
+    reward = 0
+    score = 0
+    for i in range(SIZE):
+        new_row, moved, row_reward, row_score = table[(board >> (16 * i)) & ROW_MASK]
+        result |= new_row << (16 * i)
+        reward += row_reward
+        score += row_score
+    return result, reward, score
+
+
+def move(board, direction):
+    """
+    Slides the board in the given direction.
+    Returns (new_board, reward, score) where reward is what Grid.move would return
+    and score is the merge score that Grid.current_score would gain.
+    The move is legal iff new_board != board.
+    """
+    left_table, right_table = TABLES or row_tables()
+    if direction == 'left':
+        return apply_rows(board, left_table)
+    if direction == 'right':
+        return apply_rows(board, right_table)
+    if direction == 'up':
+        result, reward, score = apply_rows(transpose(board), left_table)
+    else:
+        result, reward, score = apply_rows(transpose(board), right_table)
+    return transpose(result), reward, score
+
+
+def legal_actions(board):
+    left_table, right_table = TABLES or row_tables()
+    t = transpose(board)
+    rows = [(board >> (16 * i)) & ROW_MASK for i in range(SIZE)]
+    cols = [(t >> (16 * i)) & ROW_MASK for i in range(SIZE)]
+    actions = []
+    if any(left_table[c][1] for c in cols):
+        actions.append('up')
+    if any(right_table[c][1] for c in cols):
+        actions.append('down')
+    if any(left_table[r][1] for r in rows):
+        actions.append('left')
+    if any(right_table[r][1] for r in rows):
+        actions.append('right')
+    return actions
+
+
+def empty_cells(board):
+    """
+    Returns the empty (i, j) positions in row-major order, like Grid.retrieve_empty_cells.
+    """
+    return [(k >> 2, k & 3) for k in range(SIZE * SIZE) if not (board >> (4 * k)) & 0xF]
+
+
+def count_empty(board):
+    return sum(1 for k in range(SIZE * SIZE) if not (board >> (4 * k)) & 0xF)
+
+
+def set_tile(board, cell, exponent):
+    return board | (exponent << (4 * (SIZE * cell[0] + cell[1])))
+
+
+def spawn(board, rng=random):
+    """
+    Adds a random 2 (90%) or 4 (10%) tile, consuming randomness exactly like Grid.random_cell.
+    """
+    cell = rng.choice(empty_cells(board))
+    return set_tile(board, cell, 1 if rng.random() < 0.9 else 2)
+
+
+def max_exponent(board):
+    return max((board >> (4 * k)) & 0xF for k in range(SIZE * SIZE))
+
+
+def max_tile(board):
+    e = max_exponent(board)
+    return 1 << e if e else 0
+
+
+def found_2048(board):
+    return any((board >> (4 * k)) & 0xF == 11 for k in range(SIZE * SIZE))
+
+
+def is_terminal(board):
+    # same rule as ExpectimaxAI.is_terminal: a 2048 tile or no legal move left
+    return found_2048(board) or not legal_actions(board)
+
+
+class BoardView:
+    '''Read-only Grid-like view of a bitboard, for code written against Grid (e.g. the heuristics).'''
+    def __init__(self, board):
+        self.size = SIZE
+        self.board = board
+        self.cells = decode(board)
+
+    def retrieve_empty_cells(self):
+        return empty_cells(self.board)
+
+    def has_empty_cells(self):
+        return count_empty(self.board) > 0
+
+    def found_2048(self):
+        return found_2048(self.board)
@@ -0,0 +1,76 @@
+'''
+Non-interactive command line for headless evaluation runs, e.g.
+
+    python cli.py --agent E --depth 2 --games 20 --seed 1
+    python cli.py --agent MC --simulations 200 --max-depth 30 --backend numpy --processes 8
+
+Nothing GUI related is imported unless --plot is given.
+'''
+import argparse
+import sys
+
+from parallel import run_parallel_tests
+from plots import plot_scores
+from tuning import load_weights
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Play headless 2048 evaluation games with an AI agent.')
+    parser.add_argument('--agent', choices=('E', 'MC'), default='E', help="'E' for expectimax, 'MC' for Monte Carlo")
+    parser.add_argument('--games', type=int, default=50, help='number of games to play')
+    parser.add_argument('--seed', type=int, default=0, help='game i is seeded with seed + i')
+    parser.add_argument('--size', type=int, default=4, help='board size')
+    parser.add_argument('--backend', choices=('grid', 'bitboard', 'numpy'), default=None,
+                        help="board backend of the agent ('numpy' is Monte Carlo only)")
+    parser.add_argument('--depth', type=int, default=None, help='expectimax search depth')
+    parser.add_argument('--frontier', type=int, default=None,
+                        help='score the leaves of the last this many expectimax plies in one vectorized batch (needs numpy)')
+    parser.add_argument('--table-cache', default=None, help='file to cache the expectimax heuristic tables in')
+    parser.add_argument('--heuristic-weights', default=None,
+                        help='expectimax heuristic weights: a tuning.py output or {term: weight} JSON file')
+    parser.add_argument('--simulations', type=int, default=None, help='Monte Carlo rollouts per action')
+    parser.add_argument('--max-depth', type=int, default=None, help='Monte Carlo rollout length')
+    parser.add_argument('--gamma', type=float, default=None, help='Monte Carlo discount factor')
+    parser.add_argument('--stats', action='store_true', help='collect and print per-move search statistics')
+    parser.add_argument('--weights', default=None,
+                        help='n-tuple network checkpoint (see ntuple.py): the expectimax evaluator or Monte Carlo rollout policy')
+    parser.add_argument('--book', default=None, help='move book file (see movebook.py) to play known positions from')
+    parser.add_argument('--no-reuse', action='store_true', help="start every move's search from scratch")
+    parser.add_argument('--processes', type=int, default=1, help='play games on this many processes')
+    parser.add_argument('--record', default=None, help='append the games to this gamelog file (see gamelog.py)')
+    parser.add_argument('--plot', default=None, help='save a plot of the scores to this file')
+    return parser.parse_args(argv)
+
+
+def agent_options(args):
+    if args.agent == 'E':
+        names = {'depth': args.depth, 'backend': args.backend, 'table_cache': args.table_cache,
+                 'frontier': args.frontier,
+                 'heuristic_weights': load_weights(args.heuristic_weights) if args.heuristic_weights else None}
+    else:
+        names = {'simulations': args.simulations, 'max_depth': args.max_depth, 'gamma': args.gamma,
+                 'backend': args.backend}
+    names['stats'] = args.stats or None
+    names['reuse'] = False if args.no_reuse else None
+    names['book'] = args.book
+    if args.weights and args.agent == 'E':
+        names.update(evaluator='ntuple', weights=args.weights)
+    elif args.weights:
+        names['policy'] = args.weights
+    return {name: value for name, value in names.items() if value is not None}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = agent_options(args)
+    results, _ = run_parallel_tests(args.games, args.agent, args.seed, args.processes, options, args.size,
+                                    record=args.record)
+    scores = [result['score'] for result in results]
+
+    if args.plot:
+        plot_scores(scores, 'expectimax' if args.agent == 'E' else 'montecarlo', args.plot, show=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
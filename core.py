@@ -0,0 +1,415 @@
+'''
+GUI-free core of the game: the Grid data structure and the Game controller.
+
+Nothing here imports tkinter, matplotlib or numpy at module load, so headless
+jobs and worker processes start quickly. pytk2048.py adds the Tk front end.
+'''
+import random
+from expectimax import ExpectimaxAI
+from montecarlo import MonteCarloAI
+from driver import BackgroundSearch, GameDriver
+from gamelog import GameRecorder
+
+
+class Grid:
+    '''The data structure representation of the 2048 game.'''
+    def __init__(self, n):
+        self.size = n
+        self.cells = self.generate_empty_grid()
+        self.compressed = False
+        self.merged = False
+        self.moved = False
+        self.current_score = 0
+
+    def generate_empty_grid(self):
+        return [[0] * self.size for _ in range(self.size)]
+
+    def clone_grid(self):
+        new_grid = Grid(self.size)
+        new_grid.set_cells([row[:] for row in self.cells])
+        new_grid.current_score = self.current_score
+        new_grid.compressed = self.compressed
+        new_grid.merged = self.merged
+        new_grid.moved = self.moved
+        return new_grid
+
+    def set_cells(self, cells):
+        self.cells = cells
+
+    def get_state(self):
+        return [row.copy() for row in self.cells]
+
+    def random_cell(self, rng=random):
+        cell = rng.choice(self.retrieve_empty_cells())
+        i = cell[0]
+        j = cell[1]
+        self.cells[i][j] = 2 if rng.random() < 0.9 else 4
+
+    def retrieve_empty_cells(self):
+        return [(i, j) for i in range(self.size) for j in range(self.size) if self.cells[i][j] == 0]
+
+    def getScore(self):
+        return self.current_score
+    
+    def left_compress(self):
+        for i in range(self.size):
+            self.cells[i] = [num for num in self.cells[i] if num != 0]
+            self.cells[i] += [0] * (self.size - len(self.cells[i]))
+    
+    def left_merge(self):
+        for i in range(self.size):
+            for j in range(self.size - 1):
+                if self.cells[i][j] == self.cells[i][j + 1]:
+                    self.cells[i][j] *= 2
+                    self.cells[i][j + 1] = 0
+                    self.current_score += self.cells[i][j]
+    
+
+    def has_empty_cells(self):
+        return any(cell == 0 for row in self.cells for cell in row)
+
+    def can_merge(self):
+        for i in range(self.size):
+            for j in range(self.size):
+                if self.cells[i][j] == 0:
+                    continue
+                if i < self.size - 1 and self.cells[i][j] == self.cells[i + 1][j]:
+                    return True
+                if j < self.size - 1 and self.cells[i][j] == self.cells[i][j + 1]:
+                    return True
+        return False
+
+    def found_2048(self):
+        return any(cell == 2048 for row in self.cells for cell in row)
+
+    def clear_flags(self):
+        self.compressed = False
+        self.merged = False
+        self.moved = False
+
+    def move(self, direction):
+        initial_empty_cells = len(self.retrieve_empty_cells())
+        initial_state = self.get_state()
+
+        if direction == 'up':
+            reward = self.move_up()
+        elif direction == 'down':
+            reward = self.move_down()
+        elif direction == 'left':
+            reward = self.move_left()
+        elif direction == 'right':
+            reward = self.move_right()
+
+        final_empty_cells = len(self.retrieve_empty_cells())
+        final_state = self.get_state()
+
+        # Calculate reward based on the change in the number of empty cells and the grid state
+        reward += (final_empty_cells - initial_empty_cells) * 10  # Example heuristic
+        reward += self.calculate_state_difference(initial_state, final_state)
+
+        return reward
+
+    def move_up(self):
+        self.transpose()
+        reward = self.move_left()
+        self.transpose()
+        return reward
+
+    def move_down(self):
+        self.transpose()
+        reward = self.move_right()
+        self.transpose()
+        return reward
+
+    def move_left(self):
+        reward = 0
+        for row in self.cells:
+            reward += self.compress(row)
+            reward += self.merge(row)
+            reward += self.compress(row)
+        return reward
+
+    def move_right(self):
+        reward = 0
+        for row in self.cells:
+            row.reverse()
+            reward += self.compress(row)
+            reward += self.merge(row)
+            reward += self.compress(row)
+            row.reverse()
+        return reward
+
+    def compress(self, row):
+        new_row = [num for num in row if num != 0]
+        new_row += [0] * (self.size - len(new_row))
+        reward = 0
+        if new_row != row:
+            self.moved = True
+            reward = sum(new_row) - sum(row)
+        row[:] = new_row
+        return reward
+
+    def merge(self, row):
+        # merge tiles with the same value
+        reward = 0
+        for i in range(self.size - 1):
+            if row[i] != 0 and row[i] == row[i + 1]:
+                row[i] *= 2
+                reward += row[i]
+                row[i + 1] = 0
+                self.merged = True
+                self.moved = True
+        return reward
+
+    def calculate_state_difference(self, initial_state, final_state):
+        """
+        Calculate the difference between the initial and final grid states.
+        This can be used as part of the reward calculation.
+        """
+        difference = 0
+        for i in range(self.size):
+            for j in range(self.size):
+                difference += abs(final_state[i][j] - initial_state[i][j])
+        return difference
+
+    def transpose(self):
+        self.cells = [list(row) for row in zip(*self.cells)]
+
+    def reverse(self):
+        self.cells = [row[::-1] for row in self.cells]
+
+    def can_move_up(self):
+        for j in range(self.size):
+            for i in range(1, self.size):
+                if self.cells[i][j] != 0 and (self.cells[i - 1][j] == 0 or self.cells[i - 1][j] == self.cells[i][j]):
+                    return True
+        return False
+
+    def can_move_down(self):
+        for j in range(self.size):
+            for i in range(self.size - 2, -1, -1):
+                if self.cells[i][j] != 0 and (self.cells[i + 1][j] == 0 or self.cells[i + 1][j] == self.cells[i][j]):
+                    return True
+        return False
+
+    def can_move_left(self):
+        for i in range(self.size):
+            for j in range(1, self.size):
+                if self.cells[i][j] != 0 and (self.cells[i][j - 1] == 0 or self.cells[i][j - 1] == self.cells[i][j]):
+                    return True
+        return False
+
+    def can_move_right(self):
+        for i in range(self.size):
+            for j in range(self.size - 2, -1, -1):
+                if self.cells[i][j] != 0 and (self.cells[i][j + 1] == 0 or self.cells[i][j + 1] == self.cells[i][j]):
+                    return True
+        return False
+
+
+class Game:
+    '''The main game class which is the controller of the whole game.'''
+    def __init__(self, grid, panel, user_choice='E', testing_mode=False, ai_options=None, move_time=None):
+        self.grid = grid
+        self.panel = panel
+        self.testing_mode = testing_mode
+        self.start_cells_num = 2
+        self.over = False
+        self.won = False
+        self.keep_playing = False
+        self.driver = None # GameDriver of the GUI game loop
+        # GUI only: seconds per move for an anytime search on a background thread, None searches inline
+        self.move_time = move_time
+        self.search = None # BackgroundSearch of the move being searched
+        self.recorder = None # gamelog.GameRecorder of run_tests games
+        ai_options = ai_options or {} # extra keyword arguments for the agent, e.g. {'depth': 2, 'backend': 'bitboard'}
+        if user_choice == 'MC':
+            self.ai = MonteCarloAI(self, **dict({'gamma': 0.9, 'simulations': 100, 'max_depth': 50}, **ai_options))
+        elif user_choice == 'E':
+            self.ai = ExpectimaxAI(self, **ai_options)
+
+    def clone_game(self):
+        """
+        Creates a deep copy of the game, including its grid and state, but without an agent.
+        """
+        grid_copy = self.grid.clone_grid()
+        game_copy = Game(grid_copy, self.panel, user_choice=None)
+        game_copy.over = self.over
+        game_copy.won = self.won
+        game_copy.keep_playing = self.keep_playing
+        return game_copy
+
+    def get_state(self):
+        return self.grid.get_state()
+
+    def simulate_action(self, action):
+        # the agents search with state.State, which avoids this copy; kept for callers that want a Game
+        game_copy = self.clone_game()
+        reward = game_copy.grid.move(action)  
+        return (game_copy, reward)  # return the simulated grid and reward
+
+    def is_game_terminated(self):
+        return self.over or (self.won and not self.keep_playing)
+
+    def get_legal_actions(self):
+        actions = []
+        if self.can_move_up():
+            actions.append('up')
+        if self.can_move_down():
+            actions.append('down')
+        if self.can_move_left():
+            actions.append('left')
+        if self.can_move_right():
+            actions.append('right')
+        return actions
+
+    def can_move_up(self):
+        return self.grid.can_move_up()
+
+    def can_move_down(self):
+        return self.grid.can_move_down()
+
+    def can_move_left(self):
+        return self.grid.can_move_left()
+
+    def can_move_right(self):
+        return self.grid.can_move_right()
+
+    def start(self):
+        self.add_start_cells()
+        if not self.testing_mode:
+            self.panel.paint()
+        self.run_ai()
+
+    # test the AI over multiple runs, optionally recording the games to a gamelog file
+    def run_tests(self, num_tests=5, record=None):
+        scores = []
+        highest_tiles = []
+        if record is not None:
+            self.recorder = GameRecorder(record)
+
+        size = self.grid.size
+        for i in range(num_tests):
+            self.grid = Grid(size)
+            self.over = False
+            self.won = False
+            self.keep_playing = False
+            self.add_start_cells()
+            final_score, max_tile = self.run_ai()
+            scores.append(final_score)
+            highest_tiles.append(max_tile)
+            print(f"Test {i + 1}: Final score = {final_score}, Highest tile = {max_tile}")
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        
+        mean_score = sum(scores) / num_tests
+        highest_tile = max(highest_tiles)
+        print(f"Mean score: {mean_score}")
+        print(f"Highest tile: {highest_tile}")
+        print(f'Highest score: {max(scores)}')
+        if getattr(self.ai, 'stats', None) is not None: # the agent's stats cover every game of the batch
+            print(self.ai.stats.report())
+        return scores
+
+    def add_start_cells(self, rng=random):
+        for _ in range(self.start_cells_num):
+            self.grid.random_cell(rng)
+
+    def can_move(self):
+        return self.grid.has_empty_cells() or self.grid.can_merge()
+
+    def apply_action(self, action):
+        if action == 'up':
+            self.up(self.grid)
+        elif action == 'down':
+            self.down(self.grid)
+        elif action == 'left':
+            self.left(self.grid)
+        elif action == 'right':
+            self.right(self.grid)
+        
+        self.grid.moved = True
+
+    def run_ai(self):
+        if self.testing_mode:
+            result = GameDriver(self, self.recorder).run()
+            return result['score'], result['max_tile']
+
+        # GUI mode: play one move per Tk tick so the window stays responsive
+        if self.driver is None:
+            self.driver = GameDriver(self)
+        if self.move_time is not None:
+            return self.run_ai_background()
+        self.driver.step()
+        self.panel.paint()
+        if self.driver.finished:
+            final_score = self.grid.getScore()
+            max_tile = max(max(row) for row in self.grid.cells)
+            return final_score, max_tile
+        self.panel.root.after(100, self.run_ai)
+
+    def run_ai_background(self):
+        """
+        GUI anytime mode: the move is searched on a background thread with a deadline of
+        move_time seconds while the Tk loop keeps running and polls for it.
+        """
+        if self.search is None:
+            if self.driver.check_finished():
+                return self.grid.getScore(), max(max(row) for row in self.grid.cells)
+            self.search = BackgroundSearch(self.ai, self.move_time).start(self)
+        if not self.search.done():
+            self.panel.root.after(10, self.run_ai) # poll again without blocking repaints
+            return
+        search, self.search = self.search, None
+        self.driver.play(search.move, search.seconds)
+        self.panel.paint()
+        if self.driver.finished:
+            return self.grid.getScore(), max(max(row) for row in self.grid.cells)
+        self.panel.root.after(1, self.run_ai)
+
+    def you_win(self):
+        if not self.won:
+            self.won = True
+            print('You Win!')
+            if not self.testing_mode:
+                import tkinter.messagebox as messagebox
+                if messagebox.askyesno('2048', 'You Win!\nAre you going to continue the 2048 game?'):
+                    self.keep_playing = True
+
+    def game_over(self):
+        if not self.testing_mode:
+            import tkinter.messagebox as messagebox
+            messagebox.showinfo('2048', 'Oops!\nGame over!')
+
+    def up(self, grid):
+        grid.transpose()
+        grid.left_compress()
+        grid.left_merge()
+        grid.moved = grid.compressed or grid.merged
+        grid.left_compress()
+        grid.transpose()
+
+    def down(self, grid):
+        grid.transpose()
+        grid.reverse()
+        grid.left_compress()
+        grid.left_merge()
+        grid.moved = grid.compressed or grid.merged
+        grid.left_compress()
+        grid.reverse()
+        grid.transpose()
+
+    def left(self, grid):
+        grid.left_compress()
+        grid.left_merge()
+        grid.moved = grid.compressed or grid.merged
+        grid.left_compress()
+
+    def right(self, grid):
+        grid.reverse()
+        grid.left_compress()
+        grid.left_merge()
+        grid.moved = grid.compressed or grid.merged
+        grid.left_compress()
+        grid.reverse()
@@ -0,0 +1,173 @@
+'''
+Iterative, GUI-free game driver.
+
+GameDriver plays a Game one agent move at a time with the same rules as the
+original Game.run_ai (move, win check, tile spawn, game-over check), but in a
+loop instead of one recursive call per move, and it records per-move timings.
+The Tk front end and the test harnesses are thin wrappers around it.
+
+BackgroundSearch runs one agent search on a worker thread with a deadline, so
+the Tk loop can keep repainting and poll for the move instead of blocking.
+'''
+import random
+import threading
+import time
+
+
+class GameDriver:
+    '''Plays one Game move by move and records its result.'''
+    def __init__(self, game, recorder=None, seed=None, spawn_rng=random):
+        self.game = game
+        self.spawn_rng = spawn_rng # random source of the tile spawns, e.g. one kept apart from the agent's
+        self.moves = 0
+        self.move_times = [] # seconds spent in ai.get_action for every move
+        self.finished = False
+        self.started = time.perf_counter()
+        self.recorder = recorder # optional gamelog.GameRecorder the moves are streamed to
+        if recorder is not None:
+            recorder.start_game(game.grid, seed)
+
+    def step(self):
+        """
+        Plays one agent move and the following tile spawn.
+        Returns the move played, or None once the game is finished.
+        """
+        if self.check_finished():
+            return None
+        start = time.perf_counter()
+        move = self.game.ai.get_action(self.game)
+        return self.play(move, time.perf_counter() - start)
+
+    def check_finished(self):
+        if self.finished or self.game.is_game_terminated():
+            self.finished = True
+            self.finish_record()
+        return self.finished
+
+    def play(self, move, seconds):
+        """
+        Applies a move chosen elsewhere (e.g. by a BackgroundSearch that took seconds),
+        then the win check, tile spawn and game-over check of step.
+        """
+        game = self.game
+        game.grid.clear_flags()
+        self.move_times.append(seconds)
+        self.moves += 1
+        score = game.grid.getScore()
+
+        if move:
+            game.apply_action(move)
+
+        spawn = None
+        if game.grid.found_2048():
+            game.you_win()
+            if not game.keep_playing:
+                self.finished = True
+
+        if not self.finished:
+            if game.grid.moved:
+                spawn = self.spawn_tile() # Add a new tile if the grid has moved
+
+            if not game.can_move():
+                game.over = True
+                game.game_over()
+                self.finished = True
+
+        if self.recorder is not None:
+            self.recorder.record_move(move, game.grid.getScore() - score, seconds, spawn)
+            if self.finished:
+                self.finish_record()
+        return move
+
+    def spawn_tile(self):
+        """
+        Adds the random tile; returns (i, j, value) of it when the game is being recorded.
+        """
+        grid = self.game.grid
+        if self.recorder is None:
+            grid.random_cell(self.spawn_rng)
+            return None
+        empty_cells = grid.retrieve_empty_cells()
+        grid.random_cell(self.spawn_rng)
+        for i, j in empty_cells:
+            if grid.cells[i][j]:
+                return i, j, grid.cells[i][j]
+
+    def finish_record(self):
+        """
+        Closes the game's record; also for games stopped early, e.g. by run(max_moves).
+        """
+        if self.recorder is None or self.recorder.game is None:
+            return
+        grid = self.game.grid
+        self.recorder.finish_game(grid.getScore(), max(max(row) for row in grid.cells), self.game.won, self.game.over)
+
+    def run(self, max_moves=None):
+        """
+        Plays until the game is finished (or max_moves more moves were played) and returns result().
+        """
+        played = 0
+        while not self.finished and (max_moves is None or played < max_moves):
+            self.step()
+            played += 1
+        return self.result()
+
+    def result(self):
+        grid = self.game.grid
+        max_tile = max(max(row) for row in grid.cells)
+        return {
+            'score': grid.getScore(),
+            'max_tile': max_tile,
+            'won': self.game.won,
+            'over': self.game.over,
+            'finished': self.finished,
+            'moves': self.moves,
+            'seconds': time.perf_counter() - self.started,
+            'move_times': self.move_times,
+        }
+
+
+def run_many(games, max_moves=None):
+    """
+    Plays several independent games in one loop, one move of each game per round,
+    and returns their result records in the same order.
+    """
+    drivers = [GameDriver(game) for game in games]
+    active = list(drivers)
+    rounds = 0
+    while active and (max_moves is None or rounds < max_moves):
+        for driver in active:
+            driver.step()
+        active = [driver for driver in active if not driver.finished]
+        rounds += 1
+    return [driver.result() for driver in drivers]
+
+
+class BackgroundSearch:
+    '''One agent search on a daemon thread, for callers that must not block (the Tk loop).
+
+    The agent searches a copy of the game until time_limit seconds have passed, using
+    get_action's deadline (iterative deepening for expectimax, rollout batches for Monte
+    Carlo). Poll done() and read move and seconds once it returns True. The agent must
+    not be used by anything else until then.
+    '''
+    def __init__(self, ai, time_limit):
+        self.ai = ai
+        self.time_limit = time_limit
+        self.move = None
+        self.seconds = 0.0
+        self.thread = None
+
+    def start(self, game):
+        snapshot = game.clone_game() # the caller may repaint or otherwise read game meanwhile
+        self.thread = threading.Thread(target=self.search, args=(snapshot,), daemon=True)
+        self.thread.start()
+        return self
+
+    def search(self, game):
+        start = time.perf_counter()
+        self.move = self.ai.get_action(game, start + self.time_limit)
+        self.seconds = time.perf_counter() - start
+
+    def done(self):
+        return self.thread is not None and not self.thread.is_alive()
@@ -0,0 +1,230 @@
+'''
+Row-decomposed lookup tables for the ExpectimaxAI.calculate_score heuristic.
+
+Every component of calculate_score is a sum (or a max) of per-row and per-column
+terms, so it can be read from 65,536-entry tables indexed by a packed 16-bit row
+of a bitboard (see bitboard.py). Columns are scored with the same tables on the
+transposed board. A leaf then costs a few dozen table lookups instead of five
+passes over the cells, and the scores are identical to calculate_score.
+Boards of other sizes (see packed.py) use PackedTables, whose entries are
+filled in as rows are first seen.
+'''
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+import bitboard
+import packed
+
+TABLE_NAMES = ('empty', 'smoothness', 'mono_ge', 'mono_le', 'row_sum', 'border', 'row_max')
+TABLE_SIZE = bitboard.ROW_MASK + 1
+# cache files: magic | version | CRC-32 of the tables, then the tables as little-endian int64;
+# bump CACHE_VERSION whenever row_entries changes, so that older files are rebuilt
+CACHE_MAGIC = b'2048HTAB'
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<8sII')
+
+# weights of the calculate_score terms; only their ratios matter when choosing moves
+DEFAULT_WEIGHTS = {'empty': 100, 'corner': 1, 'smoothness': 1, 'monotonicity': 1, 'border': -5, 'constant': 1000}
+
+
+def complete_weights(weights=None):
+    """
+    Completes a partial {term: weight} dict with the default weights.
+    """
+    unknown = set(weights or ()) - set(DEFAULT_WEIGHTS)
+    if unknown:
+        raise ValueError(f'unknown heuristic weights: {sorted(unknown)}')
+    return dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+
+def weighted_score(weights, empty_cells, corner_score, smoothness, border_penalty, monotonicity_score):
+    return (weights['empty'] * empty_cells +
+            weights['corner'] * corner_score +
+            weights['smoothness'] * smoothness +
+            weights['constant'] + weights['monotonicity'] * monotonicity_score +
+            weights['border'] * border_penalty)
+
+
+def row_entries(row, size=bitboard.SIZE, bits=4):
+    exponents = [(row >> (bits * j)) & ((1 << bits) - 1) for j in range(size)]
+    values = [1 << e if e else 0 for e in exponents]
+    pairs = list(zip(values, values[1:]))
+    return (
+        values.count(0), # empty cells
+        -sum(abs(a - b) for a, b in pairs if a != 0), # smoothness towards the next cell
+        sum(1 for a, b in pairs if a >= b), # non-increasing pairs
+        sum(1 for a, b in pairs if a <= b), # non-decreasing pairs
+        sum(values),
+        sum(min(j, size - 1 - j) * v for j, v in enumerate(values)), # column part of the border distance
+        max(exponents),
+    )
+
+
+class HeuristicTables:
+    '''Per-row tables for the calculate_score components, optionally cached to disk.'''
+    def __init__(self, cache_path=None):
+        tables = None
+        if cache_path and os.path.exists(cache_path):
+            tables = self.load(cache_path)
+        if tables is None:
+            tables = self.build()
+            if cache_path:
+                self.save(cache_path, tables)
+        (self.empty, self.smoothness, self.mono_ge, self.mono_le,
+         self.row_sum, self.border, self.row_max) = tables
+        self.arrays = None # the tables as numpy arrays, built by the first score_arrays call
+
+    def build(self):
+        entries = [row_entries(row) for row in range(TABLE_SIZE)]
+        return [list(column) for column in zip(*entries)]
+
+    def load(self, path):
+        """
+        Reads the tables from a cache file, or returns None if the file is not a complete cache
+        of this version (truncated, corrupted or written by an older row_entries), so that it is rebuilt.
+        """
+        with open(path, 'rb') as f:
+            raw = f.read()
+        payload = raw[CACHE_HEADER.size:]
+        if len(raw) < CACHE_HEADER.size or len(payload) != 8 * len(TABLE_NAMES) * TABLE_SIZE:
+            return None
+        magic, version, checksum = CACHE_HEADER.unpack_from(raw)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or zlib.crc32(payload) != checksum:
+            return None
+        data = array('q')
+        data.frombytes(payload)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return [data[k * TABLE_SIZE:(k + 1) * TABLE_SIZE].tolist() for k in range(len(TABLE_NAMES))]
+
+    def save(self, path, tables):
+        data = array('q')
+        for table in tables:
+            data.extend(table)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        payload = data.tobytes()
+        with open(path, 'wb') as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, zlib.crc32(payload)))
+            f.write(payload)
+
+    def components(self, board):
+        """
+        Returns (empty_cells, corner_score, smoothness, border_penalty, monotonicity)
+        exactly as the ExpectimaxAI heuristics compute them on the decoded board.
+        """
+        r0, r1, r2, r3 = board & 0xFFFF, (board >> 16) & 0xFFFF, (board >> 32) & 0xFFFF, board >> 48
+        transposed = bitboard.transpose(board)
+        c0, c1, c2, c3 = transposed & 0xFFFF, (transposed >> 16) & 0xFFFF, (transposed >> 32) & 0xFFFF, transposed >> 48
+        smoothness, mono_ge, mono_le, row_max = self.smoothness, self.mono_ge, self.mono_le, self.row_max
+
+        empty_cells = self.empty[r0] + self.empty[r1] + self.empty[r2] + self.empty[r3]
+        smooth = (smoothness[r0] + smoothness[r1] + smoothness[r2] + smoothness[r3] +
+                  smoothness[c0] + smoothness[c1] + smoothness[c2] + smoothness[c3])
+
+        # the four rotations in ExpectimaxAI.monotonicity pair row and column directions like this
+        rows_ge = mono_ge[r0] + mono_ge[r1] + mono_ge[r2] + mono_ge[r3]
+        rows_le = mono_le[r0] + mono_le[r1] + mono_le[r2] + mono_le[r3]
+        cols_ge = mono_ge[c0] + mono_ge[c1] + mono_ge[c2] + mono_ge[c3]
+        cols_le = mono_le[c0] + mono_le[c1] + mono_le[c2] + mono_le[c3]
+        mono = max(rows_ge + cols_ge, rows_ge + cols_le, rows_le + cols_le, rows_le + cols_ge)
+
+        # distance to the border is min(i, 3 - i) + min(j, 3 - j): rows 1 and 2 add their sum once
+        border = self.border
+        border_penalty = border[r0] + border[r1] + border[r2] + border[r3] + self.row_sum[r1] + self.row_sum[r2]
+
+        max_exponent = max(row_max[r0], row_max[r1], row_max[r2], row_max[r3])
+        corner_score = 1 if max_exponent in (r0 & 0xF, r0 >> 12, r3 & 0xF, r3 >> 12) else 0
+        return empty_cells, corner_score, smooth, border_penalty, mono
+
+    def score(self, board, weights=DEFAULT_WEIGHTS):
+        return weighted_score(weights, *self.components(board))
+
+    def score_arrays(self):
+        """
+        The component tables as numpy arrays for score_many, converted on the first call.
+        """
+        if self.arrays is None:
+            import numpy as np
+
+            self.arrays = [np.array(table, dtype=np.int64) for table in
+                           (self.empty, self.smoothness, self.mono_ge, self.mono_le, self.row_sum, self.border, self.row_max)]
+        return self.arrays
+
+    def score_many(self, boards, weights=DEFAULT_WEIGHTS):
+        """
+        Vectorized score of a uint64 array of bitboards (needs numpy), for scoring a whole
+        search frontier in one call. The results equal score() board by board.
+        """
+        import numpy as np
+        import batch
+
+        empty, smoothness, mono_ge, mono_le, row_sum, border, row_max = self.score_arrays()
+        mask = np.uint64(bitboard.ROW_MASK)
+        rows = ((boards[:, None] >> batch.ROW_SHIFTS) & mask).astype(np.intp) # (N, 4)
+        cols = ((batch.transpose(boards)[:, None] >> batch.ROW_SHIFTS) & mask).astype(np.intp)
+
+        empty_cells = empty[rows].sum(axis=1)
+        smooth = smoothness[rows].sum(axis=1) + smoothness[cols].sum(axis=1)
+        rows_ge, rows_le = mono_ge[rows].sum(axis=1), mono_le[rows].sum(axis=1)
+        cols_ge, cols_le = mono_ge[cols].sum(axis=1), mono_le[cols].sum(axis=1)
+        mono = np.maximum.reduce([rows_ge + cols_ge, rows_ge + cols_le, rows_le + cols_le, rows_le + cols_ge])
+        border_penalty = border[rows].sum(axis=1) + row_sum[rows[:, 1]] + row_sum[rows[:, 2]]
+
+        max_exponent = row_max[rows].max(axis=1)
+        r0, r3 = rows[:, 0], rows[:, 3]
+        corner_score = ((max_exponent == (r0 & 0xF)) | (max_exponent == (r0 >> 12)) |
+                        (max_exponent == (r3 & 0xF)) | (max_exponent == (r3 >> 12))).astype(np.int64)
+        return weighted_score(weights, empty_cells, corner_score, smooth, border_penalty, mono)
+
+
+class PackedTables(HeuristicTables):
+    '''The same components for the packed boards of one PackedEngine, with row entries built on first use.'''
+    def __init__(self, engine):
+        self.engine = engine
+        self.entries = packed.RowTable(lambda row: row_entries(row, engine.size, packed.BITS))
+        size = engine.size
+        self.distances = [min(i, size - 1 - i) for i in range(size)] # row part of the border distance
+
+    def components(self, board):
+        engine, entries = self.engine, self.entries
+        words = engine.rows(board)
+        rows = [entries[row] for row in words]
+        cols = [entries[col] for col in engine.rows(engine.transpose(board))]
+
+        empty_cells = sum(entry[0] for entry in rows)
+        smooth = sum(entry[1] for entry in rows) + sum(entry[1] for entry in cols)
+        rows_ge = sum(entry[2] for entry in rows)
+        rows_le = sum(entry[3] for entry in rows)
+        cols_ge = sum(entry[2] for entry in cols)
+        cols_le = sum(entry[3] for entry in cols)
+        mono = max(rows_ge + cols_ge, rows_ge + cols_le, rows_le + cols_le, rows_le + cols_ge)
+        border_penalty = sum(entry[5] + distance * entry[4] for entry, distance in zip(rows, self.distances))
+
+        max_exponent = max(entry[6] for entry in rows)
+        first, last = words[0], words[-1]
+        corner_shift = packed.BITS * (engine.size - 1)
+        corners = (first & packed.CELL_MASK, first >> corner_shift, last & packed.CELL_MASK, last >> corner_shift)
+        corner_score = 1 if max_exponent in corners else 0
+        return empty_cells, corner_score, smooth, border_penalty, mono
+
+
+heuristic_tables = {} # cache_path -> HeuristicTables
+packed_tables = {} # size -> PackedTables
+
+
+def load_tables(cache_path=None, size=bitboard.SIZE):
+    """
+    Returns the process-wide tables for a board size. The 4x4 HeuristicTables are built
+    (or loaded from cache_path) on the first use of each cache_path; other sizes need no cache file.
+    """
+    if size != bitboard.SIZE:
+        if size not in packed_tables:
+            packed_tables[size] = PackedTables(packed.engine(size))
+        return packed_tables[size]
+    if cache_path not in heuristic_tables:
+        heuristic_tables[cache_path] = HeuristicTables(cache_path)
+    return heuristic_tables[cache_path]
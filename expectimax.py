@@ -1,58 +1,729 @@
+import multiprocessing
+import time
+
+import bitboard
+import packed
+from evaluation import complete_weights, load_tables, weighted_score
+from movebook import MoveBook, search_settings
+from ntuple import load_network
+from state import State
+from stats import StatsCollector
+from transposition import TranspositionTable
+
+
+class SearchTimeout(Exception):
+    '''Raised inside an anytime search once its deadline has passed.'''
+
+
+class GridAdapter:
+    '''Search-state operations on immutable States built from the Grid (see state.py).'''
+    def __init__(self, encode=bitboard.encode):
+        self.encode = encode # packs a state into the key of the cache and the evaluation tables
+
+    def root(self, game):
+        return State.from_cells(game.grid.cells)
+
+    def key(self, state):
+        return self.encode(state)
+
+    def view(self, state):
+        return state
+
+    def is_terminal(self, state):
+        return state.is_terminal()
+
+    def moves(self, state):
+        for action in state.legal_actions():
+            yield action, state.move(action)[0]
+
+    def spawns(self, state):
+        empty_cells = state.retrieve_empty_cells()
+        probability = 1 / len(empty_cells) # tile spawns randomly in an empty cell
+        for cell in empty_cells: # ensures all possible tile spawns (i.e. 2,4) are considered
+            for value, chance in ((2, 0.9), (4, 0.1)): # 90% chance of a 2 tile, 10% chance of a 4 tile (known)
+                yield chance * probability, state.spawn(cell, value)
+
+
+class BitboardAdapter:
+    '''Search-state operations on packed 64-bit boards (see bitboard.py).'''
+    def root(self, game):
+        return bitboard.encode(game.get_state())
+
+    def key(self, board):
+        return board
+
+    def view(self, board):
+        return bitboard.BoardView(board)
+
+    def is_terminal(self, board):
+        return bitboard.is_terminal(board)
+
+    def moves(self, board):
+        for action in bitboard.legal_actions(board):
+            yield action, bitboard.move(board, action)[0]
+
+    def spawns(self, board):
+        empty_cells = bitboard.empty_cells(board)
+        probability = 1 / len(empty_cells)
+        for cell in empty_cells:
+            yield 0.9 * probability, bitboard.set_tile(board, cell, 1)
+            yield 0.1 * probability, bitboard.set_tile(board, cell, 2)
+
+
+class PackedAdapter:
+    '''Search-state operations on the packed boards of a PackedEngine (see packed.py), for any board size.'''
+    def __init__(self, engine):
+        self.engine = engine
+
+    def root(self, game):
+        return self.engine.encode(game.get_state())
+
+    def key(self, board):
+        return board
+
+    def view(self, board):
+        return self.engine.view(board)
+
+    def is_terminal(self, board):
+        return self.engine.is_terminal(board)
+
+    def moves(self, board):
+        engine = self.engine
+        for action in engine.legal_actions(board):
+            yield action, engine.move(board, action)[0]
+
+    def spawns(self, board):
+        engine = self.engine
+        empty_cells = engine.empty_cells(board)
+        probability = 1 / len(empty_cells)
+        for cell in empty_cells:
+            yield 0.9 * probability, engine.set_tile(board, cell, 1)
+            yield 0.1 * probability, engine.set_tile(board, cell, 2)
+
+
+class InstrumentedAdapter:
+    '''Wraps an adapter to time its move generation into a MoveStats record.'''
+    def __init__(self, adapter, record):
+        self.adapter = adapter
+        self.record = record
+
+    def root(self, game):
+        return self.adapter.root(game)
+
+    def key(self, state):
+        return self.adapter.key(state)
+
+    def view(self, state):
+        return self.adapter.view(state)
+
+    def is_terminal(self, state):
+        start = time.perf_counter()
+        terminal = self.adapter.is_terminal(state)
+        self.record.move_generation_seconds += time.perf_counter() - start
+        return terminal
+
+    def moves(self, state):
+        start = time.perf_counter()
+        children = list(self.adapter.moves(state))
+        self.record.move_generation_seconds += time.perf_counter() - start
+        return children
+
+    def spawns(self, state):
+        start = time.perf_counter()
+        children = list(self.adapter.spawns(state))
+        self.record.move_generation_seconds += time.perf_counter() - start
+        return children
+
+
+ADAPTERS = {'grid': GridAdapter(), 'bitboard': BitboardAdapter()}
+
+
+def get_adapter(backend, size=bitboard.SIZE):
+    """
+    The adapter of a backend for boards of the given size. Other sizes than 4x4 key and
+    evaluate packed boards of packed.py; their 'bitboard' backend searches them directly.
+    """
+    if size == bitboard.SIZE:
+        return ADAPTERS[backend]
+    if (backend, size) not in ADAPTERS:
+        engine = packed.engine(size)
+        ADAPTERS[backend, size] = GridAdapter(engine.encode) if backend == 'grid' else PackedAdapter(engine)
+    return ADAPTERS[backend, size]
+
+
+worker_ai = None # the ExpectimaxAI searching subtrees inside a pool worker process
+
+
+def init_worker(settings):
+    global worker_ai
+    worker_ai = ExpectimaxAI(None, backend='bitboard', **settings)
+    bitboard.row_tables() # build the move tables before the first task
+
+
+def search_worker(task):
+    """
+    Searches one subtree in a pool worker. Tasks and results are plain numbers:
+    (board, size, depth, agent_index, probability, lower, upper) -> (value, nodes).
+    """
+    board, size, depth, agent_index, probability, lower, upper = task
+    worker_ai.nodes = 0
+    worker_ai.lower, worker_ai.upper = lower, upper
+    adapter = worker_ai.board_adapter('bitboard', size)
+    value = worker_ai.expectimax(adapter, board, depth, agent_index, lower, upper, probability)
+    return value, worker_ai.nodes
+
 
 class ExpectimaxAI:
 
-    def __init__(self, game, depth=3):
+    def __init__(self, game, depth=3, backend='grid', cache_size=100000, prob_cutoff=0.0, star=0,
+                 evaluator='tables', table_cache=None, workers=0, parallel='root', stats=False, reuse=True,
+                 book=None, weights=None, symmetry=True, frontier=0, heuristic_weights=None):
         self.game = game
         self.depth = depth
+        self.backend = backend # 'grid' searches immutable States (see state.py), 'bitboard' searches packed 64-bit boards
+        # values of (board, depth, agent) nodes, plus the path probability with prob_cutoff, kept
+        # across get_action calls; cache_size is a number of entries (not bytes), 0 disables the cache
+        self.cache = TranspositionTable(cache_size) if cache_size else None
+        # symmetry=True keys the cache on a canonical board, so symmetric positions share entries:
+        # over all 8 symmetries for the n-tuple network, which is symmetric by construction, and
+        # over transposition only for the heuristic, whose smoothness term is not mirror symmetric
+        self.symmetry = symmetry
+        self.cache_key = None # board -> canonical board, set per board size by board_adapter
+        self.prob_cutoff = prob_cutoff # chance outcomes reached with a lower path probability are scored as leaves
+        # 0 = full expectimax, 1 = Star1 pruning of chance nodes. Star2 was dropped: its probes cost
+        # more nodes than they prune, as the heuristic range is wide next to the gaps between moves
+        if star not in (0, 1):
+            raise ValueError(f'star must be 0 or 1, got {star!r}')
+        self.star = star
+        self.lower = float('-inf') # heuristic range used by the Star1 bounds
+        self.upper = float('inf')
+        self.nodes = 0 # nodes expanded by the last get_action call
+        self.deadline = None # time.perf_counter() value at which a running anytime search stops
+        self.completed_depth = 0 # deepest iteration the last anytime search finished
+        # reuse=True keeps the cached values of the previous move's tree, so the realized successor
+        # starts out searched to the depth it had there; reuse=False clears the cache every move
+        self.reuse = reuse
+        self.reused_depth = 0 # iterations of the last anytime search answered by the previous tree
+        self.value = None # expectimax value of the last move returned
+        # optional MoveBook (or its path): positions it holds at least self.depth deep are not searched;
+        # it must have been searched with this agent's evaluator and heuristic weights
+        self.book = MoveBook(book) if isinstance(book, str) else book
+        # 'tables' scores leaves with the precomputed row tables of evaluation.py (same values as calculate_score),
+        # 'heuristic' calls calculate_score directly; table_cache is an optional file to keep the tables in.
+        # 'ntuple' scores leaves with a trained NTupleNetwork, given as weights (the network or its checkpoint path)
+        self.evaluator = evaluator
+        self.tables = load_tables(table_cache) if evaluator == 'tables' else None
+        # weights of the calculate_score terms (evaluation.DEFAULT_WEIGHTS), as tuned by tuning.py;
+        # they apply to the 'tables' and 'heuristic' evaluators
+        self.heuristic_weights = complete_weights(heuristic_weights)
+        self.table_cache = table_cache
+        self.weights = weights
+        self.network = load_network(weights) if evaluator == 'ntuple' else None
+        settings = search_settings(evaluator, heuristic_weights, weights)
+        if self.book is not None and self.book.settings != settings:
+            if isinstance(book, str):
+                self.book.close()
+            raise ValueError(f'move book {self.book.path} was searched with {self.book.settings}, not with {settings}')
+        # frontier=k searches every subtree of the last k plies in two passes: collect its leaf boards,
+        # score them all in one vectorized call (numpy), fold the scores back up. It needs the 'tables'
+        # evaluator on 4x4 boards and no Star pruning, and is ignored otherwise
+        self.frontier = frontier
+        self.batched = False # whether frontier search applies to the boards being searched
+        # workers > 0 searches on a process pool: 'root' sends one task per root move,
+        # 'chance' one task per spawn outcome of every root move
+        self.workers = workers
+        self.parallel = parallel
+        self.pool = None
+        self.latency = 0.0 # wall-clock seconds of the last get_action call
+        self.stats = StatsCollector() if stats else None # per-move search statistics, off by default
+        self.move_stats = None # MoveStats record of the move being searched
 
-    def get_action(self, game):
+    def get_action(self, game, deadline=None):
         """
         returns the expectimax action using self.depth and self.evaluationFunction
 
         all tiles are modeled as choosing uniformly at random from their
         legal moves (i.e. 2, 4).
+
+        With a deadline (a time.perf_counter() value) the search deepens iteratively from
+        depth 1 to self.depth and returns the best move of the deepest iteration that
+        finished in time. Anytime searches always run serially.
         """
-        def expectimax(state, depth, agent_index):
-            # base case: if the state is terminal or depth is 0, return the score
-        
-            if depth == 0 or self.is_terminal(state):
-                return self.calculate_score(state)
-
-            # if the agent is max
-            if agent_index == 0:  
-                max_val = float('-inf')
-                for action in game.get_legal_actions():
-                    grid_copy = self.game.simulate_action(action)[0] # use simulate_action
-                    if grid_copy.grid.moved:  # consider valid moves only
-                        max_val = max(max_val, expectimax(grid_copy.grid, depth - 1, 1))
-                return max_val
-
-            # if the agent is min/random
+        self.check_tiles(game)
+        if self.book is not None and game.grid.size == bitboard.SIZE:
+            action = self.book_move(game)
+            if action is not None:
+                return action
+        if self.workers and deadline is None:
+            return self.get_action_parallel(game)
+
+        adapter = self.board_adapter(self.backend, game.grid.size)
+        start = time.perf_counter()
+        self.nodes = 0
+        if self.cache is not None and not self.reuse:
+            self.cache.clear()
+        self.start_stats()
+        if self.move_stats is not None:
+            adapter = InstrumentedAdapter(adapter, self.move_stats)
+        if self.star:
+            self.lower, self.upper = self.score_bounds(game.get_state())
+
+        root = adapter.root(game)
+        if deadline is None:
+            best_action = self.search_root(adapter, root, self.depth)
+        else:
+            best_action = self.search_anytime(adapter, root, deadline)
+        # print(f"Best move: {bestAction})")
+        self.latency = time.perf_counter() - start
+        self.finish_stats()
+        return best_action
+
+    def check_tiles(self, game):
+        """
+        Refuses 4x4 positions on which the search could build a 65536 tile: it fits neither
+        the bitboard nibbles nor the evaluation tables, so its values would be wrong.
+        """
+        if game.grid.size == bitboard.SIZE and bitboard.may_overflow(game.grid.cells, self.depth + 1):
+            raise ValueError('4x4 position is too close to a 65536 tile to search '
+                             f'(tile sum {sum(map(sum, game.grid.cells))}, depth {self.depth})')
+
+    def board_adapter(self, backend, size):
+        """
+        The adapter for boards of this size, with the evaluation tables switched to the same size.
+        """
+        if self.evaluator == 'tables':
+            self.tables = load_tables(self.table_cache, size)
+        elif self.network is not None and size != bitboard.SIZE:
+            raise ValueError('the n-tuple evaluator only scores 4x4 boards')
+        self.batched = bool(self.frontier) and self.evaluator == 'tables' and size == bitboard.SIZE and not self.star
+        if self.batched:
+            self.tables.score_arrays() # convert the tables for score_many now, not inside the first search
+        if self.symmetry:
+            engine = packed.board_engine(size)
+            self.cache_key = engine.canonical_key if self.network is not None else engine.transpose_key
+        else:
+            self.cache_key = None
+        return get_adapter(backend, size)
+
+    def book_move(self, game):
+        """
+        Looks the position up in the move book. Returns its move, or None to search live.
+        """
+        start = time.perf_counter()
+        hit = self.book.lookup(bitboard.encode(game.get_state()), self.depth)
+        if hit is None:
+            return None
+        action, self.value, _ = hit
+        self.nodes = 0
+        self.start_stats()
+        self.latency = time.perf_counter() - start
+        self.finish_stats()
+        return action
+
+    def search_root(self, adapter, root, depth, first=None):
+        best_action = None
+        best_score = float('-inf')
+        moves = adapter.moves(root)
+        if first is not None: # searching the expected best move first puts an aborted iteration's work where it pays
+            moves = sorted(moves, key=lambda move: move[0] != first)
+        for action, child in moves: # consider valid moves only
+            score = self.expectimax(adapter, child, depth, 1, max(best_score, self.lower), self.upper, 1.0)
+            if score > best_score:
+                best_score = score
+                best_action = action
+        self.value = best_score if best_action is not None else None
+        return best_action
+
+    def search_anytime(self, adapter, root, deadline):
+        """
+        Iterative deepening until the deadline. The transposition table keeps the values
+        of the shallower iterations, so each one also warms the cache for the next. With
+        reuse, deepening starts at the depth the previous move's tree already answers for
+        this root, and every iteration searches the previous iteration's best move first.
+        """
+        max_depth = self.depth
+        best_action = None
+        self.reused_depth = self.cached_depth(adapter, root) if self.reuse else 0
+        self.completed_depth = 0
+        self.deadline = deadline
+        try:
+            for depth in range(max(1, self.reused_depth), max_depth + 1):
+                if best_action is not None and time.perf_counter() >= deadline:
+                    break
+                self.depth = depth # node statistics count plies from this iteration's root
+                best_action = self.search_root(adapter, root, depth, best_action if self.reuse else None)
+                self.completed_depth = depth
+        except SearchTimeout: # the unfinished iteration is dropped
+            pass
+        finally:
+            self.depth = max_depth
+            self.deadline = None
+        if best_action is None: # not even depth 1 finished in time
+            best_action = next(iter(adapter.moves(root)), (None, None))[0]
+        return best_action
+
+    def cached_depth(self, adapter, root):
+        """
+        Deepest root iteration the cache can answer without searching. A root iteration of
+        depth d searches the same subtrees as a max node with depth d + 1 inside the tree,
+        which is how the previous move's search stored the realized successor.
+        """
+        if self.cache is None:
+            return 0
+        for depth in range(self.depth, 0, -1):
+            value = self.cache.entries.get(self.table_key(adapter, root, depth + 1, 0, 1.0))
+            if value is not None and (not self.star or value[0] == value[1]): # a bound does not answer it
+                return depth
+        return 0
+
+    def start_stats(self):
+        if self.stats is None:
+            return
+        self.move_stats = self.stats.start_move()
+        if self.cache is not None:
+            self.move_stats.cache_hits = -self.cache.hits
+            self.move_stats.cache_misses = -self.cache.misses
+
+    def finish_stats(self):
+        record = self.move_stats
+        if record is None:
+            return
+        record.latency = self.latency
+        record.nodes = self.nodes
+        if self.cache is not None:
+            record.cache_hits += self.cache.hits
+            record.cache_misses += self.cache.misses
+        self.move_stats = None
+
+    def get_action_parallel(self, game):
+        """
+        Same search as get_action, with the subtrees below the root (or below its first
+        chance layer) searched on a process pool. Only packed boards and numbers cross
+        the process boundary; each worker keeps its own transposition table between moves.
+        """
+        start = time.perf_counter()
+        size = game.grid.size
+        adapter = self.board_adapter('bitboard', size)
+        root = adapter.root(game)
+        self.nodes = 0
+        self.start_stats() # only latency and node counts come back from the workers
+        if self.star:
+            self.lower, self.upper = self.score_bounds(game.get_state())
+
+        moves = list(adapter.moves(root))
+        tasks = [] # per root move, the tasks whose values make up its score
+        for action, child in moves:
+            if self.parallel == 'chance' and self.depth > 0 and not adapter.is_terminal(child):
+                tasks.append([(grandchild, size, 0 if chance < self.prob_cutoff else self.depth - 1, 0, chance,
+                               self.lower, self.upper) for chance, grandchild in adapter.spawns(child)])
             else:
-                expected_val = 0
-                empty_cells = state.retrieve_empty_cells() 
-                probability = 1 / len(empty_cells) # tile spawns randomly in an empty cell
-                for cell in empty_cells: # ensures all possible tile spawns (i.e. 2,4) are considered
-                    grid_copy = state.clone_grid()
-                    # print(grid_copy.cells)
-                    grid_copy.cells[cell[0]][cell[1]] = 2 # spawn a 2 tile
-                    expected_val += 0.9 * probability * expectimax(grid_copy, depth - 1, 0) # 90% chance of spawning a 2 tile (known)
-                    grid_copy.cells[cell[0]][cell[1]] = 4 # spawn a 4 tile
-                    expected_val += 0.1 * probability * expectimax(grid_copy, depth - 1, 0) # 10% chance of spawning a 4 tile (known)
-                return expected_val
+                tasks.append([(child, size, self.depth, 1, 1.0, self.lower, self.upper)])
 
+        flat = [task for move_tasks in tasks for task in move_tasks]
+        results = iter(self.worker_pool().map(search_worker, flat))
         best_action = None
         best_score = float('-inf')
-        for action in game.get_legal_actions():
-            grid_copy = self.game.simulate_action(action)[0]  
-            if grid_copy.grid.moved:  # consider valid moves only
-                score = expectimax(grid_copy.grid, self.depth, 1)
-                if score > best_score:
-                    best_score = score
-                    best_action = action
-        # print(f"Best move: {bestAction})")
+        for (action, child), move_tasks in zip(moves, tasks):
+            if len(move_tasks) == 1 and move_tasks[0][3] == 1:
+                score, nodes = next(results)
+                self.nodes += nodes
+            else:
+                self.nodes += 1 # the chance node itself
+                score = 0
+                for task in move_tasks:
+                    value, nodes = next(results)
+                    score += task[4] * value
+                    self.nodes += nodes
+            if score > best_score:
+                best_score = score
+                best_action = action
+        self.value = best_score if best_action is not None else None
+        self.latency = time.perf_counter() - start
+        self.finish_stats()
         return best_action
-    
+
+    def worker_pool(self):
+        if self.pool is None:
+            settings = {
+                'depth': self.depth,
+                'cache_size': self.cache.max_entries if self.cache else 0,
+                'prob_cutoff': self.prob_cutoff,
+                'star': self.star,
+                'evaluator': self.evaluator,
+                'table_cache': self.table_cache,
+                'weights': self.weights,
+                'symmetry': self.symmetry,
+                'frontier': self.frontier,
+                'heuristic_weights': self.heuristic_weights,
+            }
+            self.pool = multiprocessing.Pool(self.workers, initializer=init_worker, initargs=(settings,))
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def measure_speedup(self, game):
+        """
+        Times the same move with the serial and the parallel search (both starting from
+        empty caches) and returns {'serial': seconds, 'parallel': seconds, 'speedup': ratio}.
+        Both run on the bitboard backend, as the workers do, so the ratio is the gain of
+        parallelism alone. One-time setup (move tables, worker start-up) is left out of both.
+        """
+        workers, backend = self.workers, self.backend
+        self.workers, self.backend = 0, 'bitboard'
+        self.get_action(game) # untimed: builds the tables
+        if self.cache is not None:
+            self.cache.clear()
+        self.get_action(game)
+        serial = self.latency
+        self.backend = backend
+        self.workers = workers or multiprocessing.cpu_count()
+        self.close() # fresh worker caches
+        size = game.grid.size
+        root = self.board_adapter('bitboard', size).root(game)
+        # wait for every worker to start; a depth 0 search of the root stores nothing the timed search looks up
+        self.worker_pool().map(search_worker, [(root, size, 0, 0, 1.0, self.lower, self.upper)] * self.workers,
+                               chunksize=1)
+        self.get_action(game)
+        parallel = self.latency
+        self.workers = workers
+        if not workers:
+            self.close()
+        return {'serial': serial, 'parallel': parallel, 'speedup': serial / parallel if parallel else 0.0}
+
+    def expectimax(self, adapter, state, depth, agent_index, alpha, beta, probability):
+        if self.cache is None:
+            return self.search(adapter, state, depth, agent_index, alpha, beta, probability)
+        key = self.table_key(adapter, state, depth, agent_index, probability)
+        value = self.cache.get(key)
+        if not self.star:
+            if value is None:
+                value = self.search(adapter, state, depth, agent_index, alpha, beta, probability)
+                self.cache.put(key, value)
+            return value
+
+        # with Star pruning an entry is the (lower, upper) bound pair of the node's value: a search
+        # that fails low only proves an upper bound, one that fails high a lower bound, and the two
+        # are equal once the value is exact
+        if value is None:
+            lower, upper = float('-inf'), float('inf')
+        else:
+            lower, upper = value
+            if lower == upper or lower >= beta:
+                return lower
+            if upper <= alpha:
+                return upper
+        value = self.search(adapter, state, depth, agent_index, alpha, beta, probability)
+        if alpha < value < beta or depth == 0:
+            lower = upper = value
+        elif value <= alpha:
+            upper = min(upper, value)
+        else:
+            lower = max(lower, value)
+        self.cache.put(key, (lower, upper))
+        return value
+
+    def node_key(self, adapter, state):
+        board = adapter.key(state)
+        return board if self.cache_key is None else self.cache_key(board)
+
+    def table_key(self, adapter, state, depth, agent_index, probability):
+        """
+        Transposition table key of a node. With prob_cutoff the path probability decides which
+        descendants are cut to leaves, so it is part of the key: the same board reached with
+        another probability is a different subtree. That only matters above the last chance
+        layer whose children are not leaves anyway (a chance node of depth 2 or more).
+        """
+        if self.prob_cutoff and depth >= 3 - agent_index:
+            return self.node_key(adapter, state), depth, agent_index, probability
+        return self.node_key(adapter, state), depth, agent_index
+
+    def search(self, adapter, state, depth, agent_index, alpha, beta, probability):
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 255 and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        if self.move_stats is not None:
+            self.move_stats.count_node(self.depth - depth + 1)
+        # base case: if the state is terminal or depth is 0, return the score
+        if depth == 0 or adapter.is_terminal(state):
+            return self.evaluate(adapter, state)
+        if self.batched and depth <= self.frontier:
+            return self.search_frontier(adapter, state, depth, agent_index, probability)
+
+        # if the agent is max
+        if agent_index == 0:
+            max_val = float('-inf')
+            for action, child in adapter.moves(state):
+                max_val = max(max_val, self.expectimax(adapter, child, depth - 1, 1, max(alpha, max_val), beta, probability))
+                if self.star and max_val >= beta:
+                    break
+            return max_val
+
+        # if the agent is min/random
+        outcomes = list(adapter.spawns(state))
+        if self.star:
+            return self.star_chance(adapter, outcomes, depth, alpha, beta, probability)
+        expected_val = 0
+        for chance, child in outcomes:
+            expected_val += chance * self.chance_child(adapter, child, depth, alpha, beta, probability * chance)
+        return expected_val
+
+    def search_frontier(self, adapter, state, depth, agent_index, probability):
+        """
+        Frontier search of a subtree: the first pass expands it without evaluating
+        anything and collects its distinct leaf boards, the tables score them all in
+        one vectorized call, and the second pass folds the scores back up through the
+        max and chance nodes. Repeated nodes are expanded once, cached values are used
+        as they are and the folded values go into the cache, so the values equal the
+        node-by-node search. With frontier >= depth every root move is one batch.
+        """
+        leaves = {} # leaf board -> its index in the scored array
+        plan = self.collect(adapter, state, depth, agent_index, probability, leaves, {})
+        return self.fold(plan, self.evaluate_many(list(leaves)))
+
+    def collect(self, adapter, state, depth, agent_index, probability, leaves, plans):
+        # the plan of an inner node is [value, cache key, agent index, chances, child plans], its
+        # value filled in by fold; a leaf's plan is the index of its score
+        if agent_index == 0:
+            children = [self.collect_child(adapter, child, depth - 1, 1, probability, leaves, plans)
+                        for action, child in adapter.moves(state)]
+            return [None, None, 0, None, children]
+        chances = []
+        children = []
+        for chance, child in adapter.spawns(state):
+            chances.append(chance)
+            if probability * chance < self.prob_cutoff: # scored as a leaf, like chance_child does
+                children.append(self.collect_child(adapter, child, 0, 0, probability * chance, leaves, plans))
+            else:
+                children.append(self.collect_child(adapter, child, depth - 1, 0, probability * chance, leaves, plans))
+        return [None, None, 1, chances, children]
+
+    def collect_child(self, adapter, state, depth, agent_index, probability, leaves, plans):
+        if depth > 0:
+            key = self.table_key(adapter, state, depth, agent_index, probability)
+            plan = plans.get(key) # the same node reached again within this subtree
+            if plan is not None:
+                return plan
+            if self.cache is not None:
+                value = self.cache.get(key)
+                if value is not None:
+                    plan = plans[key] = [value, None, agent_index, None, None]
+                    return plan
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 255 and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        if self.move_stats is not None:
+            self.move_stats.count_node(self.depth - depth + 1)
+        if depth == 0 or adapter.is_terminal(state):
+            board = adapter.key(state)
+            index = leaves.get(board)
+            if index is None:
+                index = leaves[board] = len(leaves)
+            return index
+        plan = plans[key] = self.collect(adapter, state, depth, agent_index, probability, leaves, plans)
+        plan[1] = key
+        return plan
+
+    def fold(self, plan, values):
+        if type(plan) is int:
+            return values[plan]
+        if plan[0] is not None: # cached, or already folded through another parent
+            return plan[0]
+        if plan[2] == 0:
+            value = max(self.fold(child, values) for child in plan[4])
+        else:
+            value = 0
+            for chance, child in zip(plan[3], plan[4]):
+                value += chance * self.fold(child, values)
+        plan[0] = value
+        if plan[1] is not None and self.cache is not None:
+            self.cache.put(plan[1], value)
+        return value
+
+    def evaluate_many(self, boards):
+        """
+        Scores a list of packed 4x4 boards with one vectorized table lookup.
+        """
+        import numpy as np
+
+        record = self.move_stats
+        if record is not None:
+            start = time.perf_counter()
+        values = self.tables.score_many(np.array(boards, dtype=np.uint64), self.heuristic_weights).tolist()
+        if record is not None:
+            record.evaluations += len(boards)
+            record.evaluation_seconds += time.perf_counter() - start
+        return values
+
+    def chance_child(self, adapter, child, depth, alpha, beta, probability):
+        if probability < self.prob_cutoff: # too unlikely to be worth a subtree, score it as a leaf
+            return self.expectimax(adapter, child, 0, 0, alpha, beta, probability)
+        return self.expectimax(adapter, child, depth - 1, 0, alpha, beta, probability)
+
+    def star_chance(self, adapter, outcomes, depth, alpha, beta, probability):
+        """
+        Star1 chance node: stops as soon as the already searched outcomes plus the
+        heuristic range of the remaining ones prove the value lies outside (alpha, beta).
+        """
+        searched = 0.0 # probability-weighted values of the searched outcomes
+        remaining = 1.0 # probability mass not searched yet
+        for chance, child in outcomes:
+            remaining -= chance
+            child_alpha = max((alpha - searched - remaining * self.upper) / chance, self.lower)
+            child_beta = min((beta - searched - remaining * self.lower) / chance, self.upper)
+            searched += chance * self.chance_child(adapter, child, depth, child_alpha, child_beta, probability * chance)
+            if searched + remaining * self.upper <= alpha:
+                return searched + remaining * self.upper
+            if searched + remaining * self.lower >= beta:
+                return searched + remaining * self.lower
+        return searched
+
+    def evaluate(self, adapter, state):
+        record = self.move_stats
+        if record is not None:
+            start = time.perf_counter()
+        if self.tables is not None:
+            value = self.tables.score(adapter.key(state), self.heuristic_weights)
+        elif self.network is not None:
+            board = adapter.key(state)
+            # the network values afterstates of live games, a board without moves is worth nothing
+            value = self.network.value(board) if bitboard.legal_actions(board) else 0.0
+        else:
+            value = self.calculate_score(adapter.view(state))
+        if record is not None:
+            record.evaluations += 1
+            record.evaluation_seconds += time.perf_counter() - start
+        return value
+
+    def score_bounds(self, cells):
+        """
+        Range of calculate_score over the search tree. Tiles only sum to more through
+        spawns (at most 4 per ply), smoothness is at least -4 * tile sum, and the border
+        penalty is at most the largest border distance times the tile sum; empty cells,
+        corner and monotonicity are capped. Each weighted term is at its lowest (highest)
+        at one end of its range. An n-tuple network's range is what its weights allow,
+        plus 0 for dead boards.
+        """
+        if self.network is not None:
+            lowest, highest = self.network.bounds()
+            return min(lowest, 0.0), max(highest, 0.0)
+        size = len(cells)
+        root_sum = sum(sum(row) for row in cells)
+        tile_sum = root_sum + 4 * (self.depth + 1)
+        # a leaf's tiles are powers of two adding up to its tile sum, so there are at least as many
+        # of them as that sum has binary ones; spawns add 2 or 4 each to the root's sum
+        fewest = min(bin(root_sum + added).count('1') for added in range(0, 4 * (self.depth + 1) + 1, 2))
+        distance = 2 * ((size - 1) // 2)
+        ranges = {'empty': (0, size * size - fewest), 'corner': (0, 1), 'smoothness': (-4 * tile_sum, 0),
+                  'monotonicity': (0, 2 * size * (size - 1)), 'border': (0, distance * tile_sum)}
+        weights = self.heuristic_weights
+        lowest = weights['constant'] + sum(min(weights[term] * lo, weights[term] * hi) for term, (lo, hi) in ranges.items())
+        highest = weights['constant'] + sum(max(weights[term] * lo, weights[term] * hi) for term, (lo, hi) in ranges.items())
+        return lowest, highest
+
     def calculate_smoothness(self, grid): # smoothness heuristic = tries to minimize the difference between adjacent tiles
         smoothness = 0
         for i in range(grid.size):
@@ -118,13 +789,9 @@ class ExpectimaxAI:
         smoothness = self.calculate_smoothness(grid)
         border_penalty = self.mid_tile_penalty(grid)
         monotonicity_score = self.monotonicity(grid)
-        # weights of all heuristics
-        score = ( 
-                 100 * empty_cells + 
-                 corner_score +
-                 smoothness +
-                 1000 + monotonicity_score +
-                 -5 * border_penalty)
+        # weights of all heuristics (self.heuristic_weights)
+        score = weighted_score(self.heuristic_weights, empty_cells, corner_score, smoothness,
+                               border_penalty, monotonicity_score)
         return score 
 
     def is_terminal(self, state):
@@ -0,0 +1,317 @@
+'''
+Compact, append-only binary log of played games.
+
+A log file starts with b'2048GLOG' and holds one record per game. A record is a
+fixed header followed by its start tiles and five per-move columns:
+
+    header     moves (uint32) | seed (int64, -1 if unknown) | size | start tiles | won | over (uint8)
+               | score | max tile (uint32)
+    start      (cell, exponent) byte pairs, cell = i * size + j
+    columns    actions (uint8 index into bitboard.ACTIONS, 255 = none)
+               | spawn cells (uint8, 255 = no spawn) | spawn exponents (uint8)
+               | rewards (int32, merge score of the move) | seconds (float32, time to choose the move)
+
+Columns are little-endian, like the header, whatever the byte order of the
+machine that wrote them. About 11 bytes per move, so a million moves is
+roughly 11 MB. GameRecorder buffers whole records and writes them in large
+batches. GameDriver feeds it from the game loop (GameDriver(game, recorder=...)).
+read_games streams a log record by record without building Game objects, and replay rebuilds each
+position from the start tiles, moves and spawns with the bitboard (4x4) or State
+engine:
+
+    for record in read_games('games.log'):
+        for board, action, reward, seconds in replay(record):
+            ...
+'''
+import struct
+import sys
+from array import array
+
+import bitboard
+from state import State
+
+MAGIC = b'2048GLOG'
+HEADER = struct.Struct('<IqBBBBII')
+NO_ACTION = 255
+NO_SPAWN = 255
+BYTES_PER_MOVE = 11 # action, spawn cell and exponent bytes, int32 reward, float32 seconds
+SWAP_BYTES = sys.byteorder == 'big' # the columns are stored little-endian
+
+
+def column_bytes(column):
+    """
+    The little-endian bytes of an array column.
+    """
+    if SWAP_BYTES:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def read_column(typecode, data):
+    """
+    An array column from its little-endian bytes.
+    """
+    column = array(typecode)
+    column.frombytes(data)
+    if SWAP_BYTES:
+        column.byteswap()
+    return column
+
+
+class GameRecorder:
+    '''Streams game records to an append-only log, or keeps them in memory when path is None.'''
+    def __init__(self, path=None, flush_bytes=1 << 20):
+        self.path = path
+        self.flush_bytes = flush_bytes # buffered bytes that trigger a write
+        self.buffer = bytearray()
+        self.games = 0
+        self.game = None # record of the game being played
+        if path is not None:
+            with open(path, 'ab') as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+
+    def start_game(self, grid, seed=None):
+        """
+        Begins a record; the tiles already on the grid are its start tiles.
+        """
+        size = grid.size
+        start = bytearray()
+        for i in range(size):
+            for j in range(size):
+                if grid.cells[i][j]:
+                    start += bytes((i * size + j, grid.cells[i][j].bit_length() - 1))
+        self.game = {
+            'seed': -1 if seed is None else seed,
+            'size': size,
+            'start': start,
+            'actions': bytearray(),
+            'cells': bytearray(),
+            'exponents': bytearray(),
+            'rewards': array('i'),
+            'seconds': array('f'),
+        }
+
+    def record_move(self, action, reward, seconds, spawn=None):
+        """
+        Adds a move: the action chosen, its merge score, the time taken to choose it, and
+        the (i, j, value) tile spawned afterwards, if any.
+        """
+        game = self.game
+        game['actions'].append(NO_ACTION if action is None else bitboard.ACTIONS.index(action))
+        if spawn is None:
+            game['cells'].append(NO_SPAWN)
+            game['exponents'].append(0)
+        else:
+            i, j, value = spawn
+            game['cells'].append(i * game['size'] + j)
+            game['exponents'].append(value.bit_length() - 1)
+        game['rewards'].append(reward)
+        game['seconds'].append(seconds)
+
+    def finish_game(self, score, max_tile, won, over):
+        game, self.game = self.game, None
+        self.buffer += HEADER.pack(len(game['actions']), game['seed'], game['size'], len(game['start']) // 2,
+                                   bool(won), bool(over), score, max_tile)
+        self.buffer += game['start']
+        self.buffer += game['actions']
+        self.buffer += game['cells']
+        self.buffer += game['exponents']
+        self.buffer += column_bytes(game['rewards'])
+        self.buffer += column_bytes(game['seconds'])
+        self.games += 1
+        if self.path is not None and len(self.buffer) >= self.flush_bytes:
+            self.flush()
+
+    def write_records(self, data):
+        """
+        Appends records encoded elsewhere, e.g. the take() of a recorder in a worker process.
+        """
+        self.buffer += data
+        if self.path is not None and len(self.buffer) >= self.flush_bytes:
+            self.flush()
+
+    def take(self):
+        """
+        Returns and clears the buffered records (for in-memory recorders).
+        """
+        data, self.buffer = bytes(self.buffer), bytearray()
+        return data
+
+    def flush(self):
+        if self.path is not None and self.buffer:
+            with open(self.path, 'ab') as f:
+                f.write(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        self.flush()
+
+
+class GameRecord:
+    '''One recorded game, with its move columns as bytes and arrays.'''
+    __slots__ = ('seed', 'size', 'won', 'over', 'score', 'max_tile', 'start', 'actions', 'cells',
+                 'exponents', 'rewards', 'seconds')
+
+    def __len__(self):
+        return len(self.actions)
+
+    def moves(self):
+        return [None if a == NO_ACTION else bitboard.ACTIONS[a] for a in self.actions]
+
+
+def body_size(header):
+    """
+    Bytes of start tiles and columns that follow an unpacked record header.
+    """
+    moves, start_tiles = header[0], header[3]
+    return 2 * start_tiles + BYTES_PER_MOVE * moves
+
+
+def parse_record(header, body):
+    """
+    Builds a GameRecord from its unpacked header and the bytes that follow it.
+    """
+    moves, seed, size, start_tiles, won, over, score, max_tile = header
+    view = memoryview(body)
+    record = GameRecord()
+    record.seed = None if seed == -1 else seed
+    record.size, record.won, record.over = size, bool(won), bool(over)
+    record.score, record.max_tile = score, max_tile
+    record.start = bytes(view[:2 * start_tiles])
+    offset = 2 * start_tiles
+    record.actions = bytes(view[offset:offset + moves])
+    record.cells = bytes(view[offset + moves:offset + 2 * moves])
+    record.exponents = bytes(view[offset + 2 * moves:offset + 3 * moves])
+    offset += 3 * moves
+    record.rewards = read_column('i', view[offset:offset + 4 * moves])
+    record.seconds = read_column('f', view[offset + 4 * moves:offset + 8 * moves])
+    return record
+
+
+def parse_records(data, offset=0):
+    """
+    Yields the GameRecords in a bytes-like object of records, starting at offset.
+    """
+    view = memoryview(data)
+    end = len(view)
+    while offset < end:
+        if end - offset < HEADER.size:
+            raise ValueError(f'truncated game record at byte {offset}')
+        header = HEADER.unpack_from(view, offset)
+        offset += HEADER.size
+        size = body_size(header)
+        if end - offset < size:
+            raise ValueError(f'truncated game record at byte {offset - HEADER.size}')
+        yield parse_record(header, view[offset:offset + size])
+        offset += size
+
+
+def read_games(path):
+    """
+    Yields every GameRecord of a log file, reading one record at a time.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a game log')
+        while True:
+            offset = f.tell()
+            data = f.read(HEADER.size)
+            if not data:
+                return
+            if len(data) < HEADER.size:
+                raise ValueError(f'{path}: truncated game record at byte {offset}')
+            header = HEADER.unpack(data)
+            body = f.read(body_size(header))
+            if len(body) < body_size(header):
+                raise ValueError(f'{path}: truncated game record at byte {offset}')
+            yield parse_record(header, body)
+
+
+def start_board(record):
+    """
+    The position before the first move: a packed bitboard for 4x4 games, else a State.
+    """
+    size = record.size
+    if size == bitboard.SIZE:
+        board = 0
+        for k in range(0, len(record.start), 2):
+            board = bitboard.set_tile(board, divmod(record.start[k], size), record.start[k + 1])
+        return board
+    board = State((0,) * size for _ in range(size))
+    for k in range(0, len(record.start), 2):
+        board = board.spawn(divmod(record.start[k], size), 1 << record.start[k + 1])
+    return board
+
+
+def advance(record, board, k):
+    """
+    Plays move k of a record and its spawn on board.
+    """
+    action, cell = record.actions[k], record.cells[k]
+    if type(board) is int:
+        if action != NO_ACTION:
+            board = bitboard.move(board, bitboard.ACTIONS[action])[0]
+        if cell != NO_SPAWN:
+            board = bitboard.set_tile(board, divmod(cell, record.size), record.exponents[k])
+        return board
+    if action != NO_ACTION:
+        board = board.move(bitboard.ACTIONS[action])[0]
+    if cell != NO_SPAWN:
+        board = board.spawn(divmod(cell, record.size), 1 << record.exponents[k])
+    return board
+
+
+def replay(record):
+    """
+    Yields (board, action, reward, seconds) for every move of a record, board being the
+    position the move was chosen in.
+    """
+    board = start_board(record)
+    if type(board) is not int:
+        for k in range(len(record.actions)):
+            action = record.actions[k]
+            yield board, None if action == NO_ACTION else bitboard.ACTIONS[action], record.rewards[k], record.seconds[k]
+            board = advance(record, board, k)
+        return
+
+    # 4x4 fast path: a cell index i * 4 + j is also the tile's nibble in the bitboard
+    actions, move = bitboard.ACTIONS, bitboard.move
+    for action, cell, exponent, reward, seconds in zip(record.actions, record.cells, record.exponents,
+                                                       record.rewards, record.seconds):
+        name = None if action == NO_ACTION else actions[action]
+        yield board, name, reward, seconds
+        if name is not None:
+            board = move(board, name)[0]
+        if cell != NO_SPAWN:
+            board |= exponent << (4 * cell)
+
+
+def final_board(record):
+    """
+    The position after the last move and spawn of a record.
+    """
+    board = start_board(record)
+    for k in range(len(record.actions)):
+        board = advance(record, board, k)
+    return board
+
+
+def summarize_log(path):
+    """
+    Scans a log: games, moves, mean score and the highest tile, without replaying moves.
+    """
+    games = moves = total_score = highest = 0
+    for record in read_games(path):
+        games += 1
+        moves += len(record)
+        total_score += record.score
+        highest = max(highest, record.max_tile)
+    return {'games': games, 'moves': moves, 'mean_score': total_score / games if games else 0.0,
+            'highest_tile': highest}
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(path, summarize_log(path))
@@ -1,55 +1,233 @@
 import random
+import time
+from array import array
+import bitboard
+import packed
+from movebook import MoveBook
+from ntuple import load_network
+from state import State
+from stats import StatsCollector
+
+class TrajectoryBuffer:
+    '''Preallocated record of one rollout: visited states, policy actions and cumulative rewards.'''
+    def __init__(self, max_depth):
+        self.states = [None] * max_depth
+        self.actions = [None] * max_depth
+        self.rewards = array('d', bytes(8 * max_depth))
+        self.returns = array('d', bytes(8 * max_depth))
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def capacity(self):
+        return len(self.states)
+
+    def clear(self):
+        self.length = 0
+
+    def append(self, state, action, reward):
+        t = self.length
+        self.states[t] = state
+        self.actions[t] = action
+        self.rewards[t] = reward
+        self.length = t + 1
+
+    def discounted_returns(self, gamma):
+        """
+        u_t = sum over k >= t of gamma^(k - t) * reward_k, for every t in one backward pass
+        """
+        returns, rewards = self.returns, self.rewards
+        ut = 0.0
+        for t in range(self.length - 1, -1, -1):
+            ut = rewards[t] + gamma * ut
+            returns[t] = ut
+        return returns
+
+
+def discounted_returns(rewards, lengths, gamma):
+    """
+    Vectorized TrajectoryBuffer.discounted_returns for a (T, M) array of rewards whose
+    column m holds a rollout of lengths[m] steps. Steps past a rollout's end return 0.
+    """
+    import numpy as np
+
+    returns = np.zeros(rewards.shape)
+    ut = np.zeros(rewards.shape[1])
+    for t in range(rewards.shape[0] - 1, -1, -1):
+        ut = np.where(t < lengths, rewards[t] + gamma * ut, 0.0)
+        returns[t] = ut
+    return returns
+
 
 class MonteCarloAI:
-    def __init__(self, game, gamma=0.3, simulations=50, max_depth=10): # Initialize game, discount factor, number of simulations, and maximum depth
-        self.game = game 
+    def __init__(self, game, gamma=0.3, simulations=50, max_depth=10, backend='grid', seed=None, store=None, stats=False,
+                 reuse=True, book=None, policy=None, symmetry=True): # Initialize game, discount factor, number of simulations, and maximum depth
+        self.game = game
         self.gamma = gamma # discount factor
+        # every action needs at least one rollout of at least one step to be scored
+        if simulations < 1:
+            raise ValueError(f'simulations must be at least 1, got {simulations!r}')
+        if max_depth < 1:
+            raise ValueError(f'max_depth must be at least 1, got {max_depth!r}')
         self.simulations = simulations
         self.max_depth = max_depth  #
+        # 'grid' rolls out immutable States of row tuples (see state.py),
+        # 'bitboard' rolls out packed boards one at a time (64-bit for 4x4, packed.py for other sizes),
+        # 'numpy' advances all rollouts of all actions together as one array (see batch.py, 4x4 only:
+        # other sizes fall back to 'bitboard')
+        self.backend = backend
+        self.seed = seed # seeds the randomness of the 'numpy' rollouts
+        self.rng = None
+        # optional UtilityStore: a bounded, saveable table of packed 4x4 boards that takes the place of N and U
+        self.store = store
         self.N = {}  # counter of total visits
-        self.U = {}  # utility estimates
+        self.U = {} if store is None else store  # utility estimates
+        # symmetry=True keys N and U on the canonical form of a state, so all 8 rotations and
+        # reflections of a position share one estimate (rollout returns do not depend on orientation)
+        self.symmetry = symmetry
+        self.key = None # state -> its key in N and U, set per board size by get_action
+        self.trajectory = TrajectoryBuffer(max_depth) # reused by every rollout of simulate/simulate_bitboard
+        self.latency = 0.0 # wall-clock seconds of the last get_action call
+        self.value = None # mean rollout score of the last move returned
+        self.stats = StatsCollector() if stats else None # per-move statistics, off by default
+        self.move_stats = None # MoveStats record of the move being played
+        # reuse=True also scores actions with the rollouts of the previous move that went through
+        # the realized successor; branch_stats holds them: state -> {action: [score total, rollouts]}
+        self.reuse = reuse
+        self.branch_stats = {}
+        self.reused = 0 # rollouts reused by the last get_action call
+        self.book = MoveBook(book) if isinstance(book, str) else book # optional MoveBook (or its path) of searched moves
+        # optional NTupleNetwork (or checkpoint path, 4x4 only): greedy rollout steps then maximize
+        # merge score + network value of the afterstate instead of its utility in U
+        self.policy = load_network(policy) if policy is not None else None
+
+    def get_action(self, game, deadline=None): # returns the best action based on the Monte Carlo Tree Search algorithm
+        start = time.perf_counter()
+        if game.grid.size != bitboard.SIZE and (self.store is not None or self.policy is not None):
+            raise ValueError('utility stores and n-tuple policies only work on 4x4 boards')
+        self.key = self.key_function(game.grid.size)
+        if self.stats is not None:
+            self.move_stats = self.stats.start_move()
+        hit = None
+        if self.book is not None and game.grid.size == bitboard.SIZE:
+            hit = self.book.lookup(bitboard.encode(game.get_state()))
+        if hit is not None: # a move of the book's deep expectimax search
+            best_action, self.value = hit[0], hit[1]
+            self.branch_stats = {} # no rollouts were played from this position
+        elif deadline is None:
+            best_action = self.choose_action(game)
+        else: # anytime mode: stop at the deadline (a time.perf_counter() value)
+            best_action = self.choose_action_anytime(game, deadline)
+        self.latency = time.perf_counter() - start
+        record = self.move_stats
+        if record is not None:
+            record.latency = self.latency
+            record.move_generation_seconds = self.latency - record.evaluation_seconds
+            self.move_stats = None
+        return best_action
 
-    def get_action(self, game): # returns the best action based on the Monte Carlo Tree Search algorithm
-        
+    def key_function(self, size):
+        """
+        Maps a rollout state to its key in N and U: its canonical form, or None to key
+        states as they are. Stores hold packed boards, so grid states are packed first.
+        """
+        if not self.symmetry:
+            return None
+        if self.backend == 'grid' and self.store is None:
+            return State.canonical_key
+        engine = packed.board_engine(size)
+        if self.backend == 'grid':
+            return lambda state: engine.canonical_key(engine.encode(state))
+        return engine.canonical_key
+
+    def utility(self, state):
+        key = self.key
+        return self.U.get(state if key is None else key(state), 0)
+
+    def choose_action(self, game):
         best_action = None
         best_score = -float('inf')
 
+        if self.backend == 'numpy' and game.grid.size == bitboard.SIZE:
+            return self.get_action_batch(game)
+
+        simulate = self.simulate if self.backend == 'grid' else self.simulate_bitboard
+        reused = self.reused_rollouts(game)
+
         for action in game.get_legal_actions(): # left, right, up, down
-            total_score = 0
+            total_score, count = reused.get(action, (0, 0))
             for _ in range(self.simulations):
-                total_score += self.simulate(game, action) # simulate the game and add to the total score
-            average_score = total_score / self.simulations # calculate the average score
+                total_score += simulate(game, action) # simulate the game and add to the total score
+            average_score = total_score / (self.simulations + count) # calculate the average score
 
             if average_score > best_score: # update the best action and best score
                 best_score = average_score
                 best_action = action
 
         # print(f"Best move: {best_action}, best score: {best_score}")
+        self.value = best_score if best_action is not None else None
+        return best_action
+
+    def choose_action_anytime(self, game, deadline, batch_size=10):
+        """
+        Plays rollouts in rounds of batch_size per legal action until the deadline or until
+        every action has self.simulations of them, and returns the action with the best
+        mean so far (actions can end up with a few rollouts fewer than others). The 'numpy' backend plays its anytime rollouts with simulate_bitboard.
+        """
+        simulate = self.simulate if self.backend == 'grid' else self.simulate_bitboard
+        actions = game.get_legal_actions()
+        reused = self.reused_rollouts(game)
+        totals = [reused.get(action, (0, 0))[0] for action in actions]
+        counts = [reused.get(action, (0, 0))[1] for action in actions] # rollouts per action, reused ones included
+        played = [0] * len(actions) # fresh rollouts per action
+        while played and played[-1] < self.simulations and time.perf_counter() < deadline:
+            for i, action in enumerate(actions):
+                for _ in range(min(batch_size, self.simulations - played[i])):
+                    if time.perf_counter() >= deadline:
+                        break
+                    totals[i] += simulate(game, action)
+                    counts[i] += 1
+                    played[i] += 1
+
+        best_action = None
+        best_score = -float('inf')
+        for action, total, count in zip(actions, totals, counts):
+            if count and total / count > best_score:
+                best_score = total / count
+                best_action = action
+        self.value = best_score if best_action is not None else None
+        if best_action is None and actions: # the deadline passed before the first rollout
+            best_action = actions[0]
         return best_action
     
     def simulate(self, game, action): # simulate the game and return the utility of the initial state of the trajectory
 
-        # clone the game and simulate the action
-        game_clone = game.clone_game()
-        reward = game_clone.simulate_action(action)[1] # get the reward
+        # play the action (plus a random tile spawn) on an immutable state instead of a Game clone
+        state, reward, _ = State.from_cells(game.grid.cells).move(action) # get the reward
+        state = state.spawn_random()
 
-        trajectory = [] 
+        trajectory = self.trajectory_buffer()
         depth = 0  # depth counter
-        while not game_clone.is_game_terminated() and depth < self.max_depth: 
-            for row in game_clone.get_state(): 
-                state = tuple(tuple(row)) # convert the state to a tuple to hold state, policy_action, and reward
-            
-            legal_actions = game_clone.get_legal_actions() 
+        terminated = game.is_game_terminated()
+        while not terminated and depth < self.max_depth: 
+            legal_actions = state.legal_actions()
+            if not legal_actions: # the rollout reached a lost position
+                break
             # pick a policy action using epsilon-greedy strategy
             if random.random() < 0.1: 
                 policy_action = random.choice(legal_actions) # exploration
             else: # take action w/ highest utility
+                if self.move_stats is not None:
+                    self.move_stats.evaluations += len(legal_actions)
                 best_action = None
                 best_utility = -float('inf')
                 for action in legal_actions:
-                    next_state = game_clone.simulate_action(action)[0].get_state() 
-                    s_tuple = tuple(tuple(row) for row in next_state) 
-                    utility = self.U.get(s_tuple, 0) # get the utility of the next state
+                    if self.policy is None:
+                        utility = self.utility(state.move(action)[0]) # get the utility of the next state
+                    else:
+                        after, _, score = state.move(action)
+                        utility = score + self.policy.value(bitboard.encode(after))
 
                     if utility > best_utility:
                         best_utility = utility
@@ -57,35 +235,220 @@ class MonteCarloAI:
                 policy_action = best_action # exploitation
             # policy_action = random.choice(legal_actions)  # use this for baseline testing
             
-            reward += game_clone.simulate_action(policy_action)[1] # get the reward
-            trajectory.append((state, policy_action, reward)) 
+            next_state, step_reward, _ = state.move(policy_action)
+            reward += step_reward # get the reward
+            # states hash like tuples of rows, so they (or their canonical forms) key N and U as before
+            trajectory.append(state, policy_action, reward) 
+            state = next_state.spawn_random()
             depth += 1  # increment the depth counter
 
         # Update utilities estimates based on the trajectory
-        self.update_utilities(trajectory)
+        self.backup(trajectory)
+        if self.reuse:
+            self.record_branch(trajectory)
 
         # return the utility of the initial state of the trajectory
-        for row in game.get_state():
-            initial_state = tuple(tuple(row))
-        return self.U.get(initial_state, 0) 
-    
+        if not trajectory:
+            return 0
+        return self.utility(trajectory.states[0])
 
-    def update_utilities(self, trajectory): # update the utilities based on the trajectory
+    def simulate_bitboard(self, game, action): # same rollout as simulate, on packed boards keyed directly in N/U
+        engine = packed.board_engine(game.grid.size) # the bitboard module for 4x4, a PackedEngine otherwise
+        board, reward, _ = engine.move(engine.encode(game.get_state()), action)
+        board = engine.spawn(board)
 
-        # print("updating utilities")
-        T = len(trajectory)
-        for t in range(T):
-            state = trajectory[t][0] # get the state, policy action, and reward
-            if state not in self.N: # if state was unvisited, initialize the counters
-                self.N[state] = 0 # counter of total visits
-                self.U[state] = 0 # utility estimates
+        trajectory = self.trajectory_buffer()
+        depth = 0
+        terminated = game.is_game_terminated()
+        while not terminated and depth < self.max_depth:
+            state = board
+            legal_actions = engine.legal_actions(board)
+            if not legal_actions:
+                break
+            if random.random() < 0.1:
+                policy_action = random.choice(legal_actions)
+            else:
+                if self.move_stats is not None:
+                    self.move_stats.evaluations += len(legal_actions)
+                best_action = None
+                best_utility = -float('inf')
+                for action in legal_actions:
+                    if self.policy is None:
+                        utility = self.utility(engine.move(board, action)[0])
+                    else:
+                        after, _, score = engine.move(board, action)
+                        utility = score + self.policy.value(after)
+                    if utility > best_utility:
+                        best_utility = utility
+                        best_action = action
+                policy_action = best_action
+
+            board, step_reward, _ = engine.move(board, policy_action)
+            board = engine.spawn(board)
+            reward += step_reward
+            trajectory.append(state, policy_action, reward)
+            depth += 1
 
-            self.N[state] += 1 # increment the counter of total visits
+        self.backup(trajectory)
+        if self.reuse:
+            self.record_branch(trajectory)
 
-            # calculate utility u_t
-            ut = sum(self.gamma ** (k - t) * trajectory[k][2] for k in range(t, T))
+        if not trajectory:
+            return 0
+        return self.utility(trajectory.states[0])
 
-            # Update utility estimate U^pi(s_t) based on utility u_t
-            self.U[state] = ((self.N[state] - 1) * self.U[state] + ut) / self.N[state]  
+    def reused_rollouts(self, game):
+        """
+        Returns {action: [score total, rollouts]} gathered by the previous move's rollouts
+        for the current position, and starts an empty table for this move's rollouts.
+        """
+        previous, self.branch_stats = self.branch_stats, {}
+        self.reused = 0
+        if not self.reuse or not previous:
+            return {}
+        if self.backend == 'grid':
+            root = State.from_cells(game.grid.cells)
+        else:
+            root = packed.board_engine(game.grid.size).encode(game.get_state())
+        reused = previous.get(root, {})
+        self.reused = sum(count for _, count in reused.values())
+        return reused
+
+    def record_branch(self, trajectory):
+        """
+        The second step of a rollout is what a rollout of the next move would do from the
+        rollout's first state: if that state turns out to be the realized successor, U of the
+        second state is one more sample of the score of the second action there.
+        """
+        if len(trajectory) < 2:
+            return
+        entry = self.branch_stats.setdefault(trajectory.states[0], {}).setdefault(trajectory.actions[0], [0, 0])
+        entry[0] += self.utility(trajectory.states[1])
+        entry[1] += 1
+
+    def backup(self, trajectory):
+        record = self.move_stats
+        if record is None:
+            self.update_utilities(trajectory)
+            return
+        start = time.perf_counter()
+        self.update_utilities(trajectory)
+        record.evaluation_seconds += time.perf_counter() - start
+        record.rollouts += 1
+        record.rollout_steps += len(trajectory)
+
+    def trajectory_buffer(self):
+        if self.trajectory.capacity() != self.max_depth:
+            self.trajectory = TrajectoryBuffer(self.max_depth)
+        self.trajectory.clear()
+        return self.trajectory
     
-    
\ No newline at end of file
+
+    def get_action_batch(self, game):
+        """
+        Same rollouts as simulate_bitboard, but all simulations of all legal actions
+        advance together as one array of packed boards. Each action is scored by the
+        mean utility of its rollouts' first states once the whole batch is recorded.
+        """
+        import numpy as np
+        import batch
+
+        if self.rng is None:
+            self.rng = np.random.default_rng(self.seed)
+        actions = game.get_legal_actions()
+        if not actions:
+            self.value = None
+            return None
+        reused = self.reused_rollouts(game)
+        root = bitboard.encode(game.get_state())
+        first_moves = [bitboard.move(root, action) for action in actions]
+        boards = batch.to_array([board for board, _, _ in first_moves for _ in range(self.simulations)])
+        rewards = np.array([reward for _, reward, _ in first_moves for _ in range(self.simulations)], dtype=np.int64)
+        boards = batch.spawn(boards, self.rng)
+
+        count = len(boards)
+        index = np.arange(count)
+        states = np.zeros((self.max_depth, count), dtype=np.uint64)
+        cumulative = np.zeros((self.max_depth, count), dtype=np.int64) # cumulative reward after each step
+        lengths = np.zeros(count, dtype=np.intp)
+        alive = np.full(count, not game.is_game_terminated())
+        for depth in range(self.max_depth):
+            after, step_rewards, legal = batch.move_all(boards)
+            alive &= legal.any(axis=0) # rollouts that reached a lost position stop
+            if not alive.any():
+                break
+            # epsilon-greedy: a random legal action, or the one whose afterstate has the highest utility
+            explore = self.rng.random(count) < 0.1
+            utilities = np.zeros(after.shape)
+            if self.move_stats is not None and (self.store is not None or self.U or self.policy is not None):
+                self.move_stats.evaluations += int(legal[:, alive].sum())
+            if self.policy is not None:
+                scores = np.stack([batch.move(boards, action)[2] for action in bitboard.ACTIONS])
+                values = [self.policy.value(b) for b in after.ravel().tolist()]
+                utilities = scores + np.array(values).reshape(after.shape)
+            elif self.store is not None or self.U:
+                after_keys = after.ravel() if self.key is None else batch.canonical_key(after.ravel())
+                if self.store is not None:
+                    utilities = self.store.get_many(after_keys).reshape(after.shape)
+                else:
+                    utilities = np.array([self.U.get(b, 0) for b in after_keys.tolist()], dtype=float).reshape(after.shape)
+            utilities[~legal] = -float('inf')
+            chosen = np.where(explore, batch.choose(legal.T, self.rng), utilities.argmax(axis=0))
+            if depth == 0:
+                first_actions = chosen # policy actions of the first states, for record_branch
+
+            states[depth] = boards
+            rewards = rewards + step_rewards[chosen, index]
+            cumulative[depth] = rewards
+            lengths += alive
+            boards = np.where(alive, batch.spawn(after[chosen, index], self.rng), boards)
+
+        backup_start = time.perf_counter()
+        returns = discounted_returns(cumulative, lengths, self.gamma)
+        keys = states if self.key is None else batch.canonical_key(states.ravel()).reshape(states.shape)
+        for m in range(count):
+            for key, ut in zip(keys[:lengths[m], m].tolist(), returns[:lengths[m], m].tolist()):
+                self.visit(key, ut)
+        if self.move_stats is not None:
+            self.move_stats.evaluation_seconds += time.perf_counter() - backup_start
+            self.move_stats.rollouts += count
+            self.move_stats.rollout_steps += int(lengths.sum())
+        first_states = states[0].tolist()
+        first_keys = keys[0].tolist()
+        scores = np.array([self.U.get(first_keys[m], 0) if lengths[m] else 0 for m in range(count)], dtype=float)
+        totals = scores.reshape(len(actions), self.simulations).sum(axis=1)
+        counts = np.full(len(actions), self.simulations)
+        for i, action in enumerate(actions):
+            total, reused_count = reused.get(action, (0, 0))
+            totals[i] += total
+            counts[i] += reused_count
+        if self.reuse:
+            second_keys = keys[1].tolist() if self.max_depth > 1 else []
+            for m in np.flatnonzero(lengths >= 2).tolist():
+                entry = self.branch_stats.setdefault(first_states[m], {}).setdefault(bitboard.ACTIONS[first_actions[m]], [0, 0])
+                entry[0] += self.U.get(second_keys[m], 0)
+                entry[1] += 1
+        means = totals / counts
+        self.value = float(means.max())
+        return actions[int(means.argmax())]
+
+    def update_utilities(self, trajectory): # update the utilities based on the trajectory (a TrajectoryBuffer)
+
+        # print("updating utilities")
+        returns = trajectory.discounted_returns(self.gamma) # utility u_t of every step
+        key = self.key
+        for t in range(len(trajectory)):
+            state = trajectory.states[t]
+            self.visit(state if key is None else key(state), returns[t])
+
+    def visit(self, state, ut): # Update utility estimate U^pi(s) based on utility u_t (state being its key in N and U)
+        if self.store is not None: # the store keeps its own counts and running means
+            if not self.store.read_only: # a read-only store is a fixed value table
+                self.store.visit(state, ut)
+            return
+        if state not in self.N: # if state was unvisited, initialize the counters
+            self.N[state] = 0 # counter of total visits
+            self.U[state] = 0 # utility estimates
+
+        self.N[state] += 1 # increment the counter of total visits
+        self.U[state] = ((self.N[state] - 1) * self.U[state] + ut) / self.N[state]
@@ -0,0 +1,254 @@
+'''
+Precomputed move book: best moves and values of frequently visited positions.
+
+Positions are stored in canonical form (see bitboard.canonical), so one entry
+covers all 8 rotations and reflections of a board. The game is symmetric, but the
+smoothness heuristic only scores a pair from its non-empty left or top tile, so it
+is exact only under transposition. For a reflected orientation, the book move is
+therefore the deep search's move for an equivalent board, which a live search of
+that orientation could rank slightly differently. A book file holds a header
+and then four arrays in native byte order, sorted by key:
+
+    b'2048BOK2' | count (uint64) | settings size (uint64) | settings (JSON, padded to 8 bytes)
+                | keys (uint64 * count) | values (float64 * count)
+                | moves (uint8 * count, index into bitboard.ACTIONS) | depths (uint8 * count)
+
+The settings are the evaluator and heuristic weights the positions were searched
+with (see search_settings). Its moves and values are only those of a live search
+with the same settings, so ExpectimaxAI refuses a book whose settings differ.
+
+MoveBook memory-maps the file and binary-searches the keys, so opening a book
+is instant, lookups take a few microseconds, and processes share its pages.
+Books are built offline by playing games to find common positions and then
+searching each of them deeply on a process pool:
+
+    python movebook.py --output book.bin --games 200 --positions 5000 --depth 4 --processes 8
+
+Agents take the book as ExpectimaxAI(game, book='book.bin') (or cli.py --book)
+and fall back to a live search for positions that are not in it.
+'''
+import argparse
+import json
+import mmap
+import multiprocessing
+import random
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import bitboard
+from evaluation import complete_weights
+
+MAGIC = b'2048BOK2'
+HEADER_SIZE = 24 # magic, count and settings size; the settings follow
+
+
+def search_settings(evaluator='tables', heuristic_weights=None, weights=None):
+    """
+    The settings that decide the values of a book search, as stored in the book header. The
+    'tables' and 'heuristic' evaluators score leaves alike, so both are recorded as 'heuristic'
+    with the complete weights; an n-tuple network is recorded by its checkpoint path.
+    """
+    if evaluator == 'ntuple':
+        return {'evaluator': 'ntuple', 'network': weights if isinstance(weights, str) else None}
+    return {'evaluator': 'heuristic', 'heuristic_weights': complete_weights(heuristic_weights)}
+
+
+class MoveBook:
+    '''Read-only, memory-mapped view of a book file.'''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:8] != MAGIC:
+            self.map.close()
+            raise ValueError(f'{path} is not a move book (or was written by an older version)')
+        count = int.from_bytes(self.map[8:16], sys.byteorder)
+        settings_size = int.from_bytes(self.map[16:24], sys.byteorder)
+        self.settings = json.loads(self.map[HEADER_SIZE:HEADER_SIZE + settings_size]) # see search_settings
+        start = HEADER_SIZE + settings_size
+        view = memoryview(self.map)
+        end = start + 8 * count
+        self.keys = view[start:end].cast('Q')
+        self.values = view[end:end + 8 * count].cast('d')
+        self.moves = view[end + 8 * count:end + 9 * count]
+        self.depths = view[end + 9 * count:end + 10 * count]
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key):
+        """
+        Index of a canonical board in the book, or -1.
+        """
+        i = bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def lookup(self, board, min_depth=0):
+        """
+        Returns (action, value, depth) for a packed board in its own orientation, or None
+        if the book has no entry for it searched at least min_depth deep.
+        """
+        key, transform = bitboard.canonical(board)
+        i = self.find(key)
+        if i < 0 or self.depths[i] < min_depth:
+            self.misses += 1
+            return None
+        self.hits += 1
+        action = bitboard.ACTION_INVERSES[transform][bitboard.ACTIONS[self.moves[i]]]
+        return action, self.values[i], self.depths[i]
+
+    def close(self):
+        # the array views must go before the map can be closed
+        for view in (self.keys, self.values, self.moves, self.depths):
+            view.release()
+        self.map.close()
+
+
+def write_book(path, entries, settings=None):
+    """
+    Writes {canonical board: (action, value, depth)} as a book file, searched with the given
+    search_settings (the default evaluator and weights if None).
+    """
+    settings = json.dumps(search_settings() if settings is None else settings, sort_keys=True).encode()
+    settings += b' ' * (-len(settings) % 8) # keeps the arrays 8-byte aligned
+    keys = sorted(entries)
+    values = array('d', (entries[key][1] for key in keys))
+    moves = bytes(bitboard.ACTIONS.index(entries[key][0]) for key in keys)
+    depths = bytes(entries[key][2] for key in keys)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(keys).to_bytes(8, sys.byteorder))
+        f.write(len(settings).to_bytes(8, sys.byteorder))
+        f.write(settings)
+        f.write(array('Q', keys).tobytes())
+        f.write(values.tobytes())
+        f.write(moves)
+        f.write(depths)
+
+
+def read_book(path):
+    """
+    Returns the entries of a book file as a dict, e.g. to extend a book.
+    """
+    book = MoveBook(path)
+    entries = {book.keys[i]: (bitboard.ACTIONS[book.moves[i]], book.values[i], book.depths[i])
+               for i in range(len(book))}
+    book.close()
+    return entries
+
+
+def collect_worker(task):
+    """
+    Plays one seeded game and counts the canonical positions the agent had to move from.
+    """
+    from core import Game, Grid
+
+    seed, ai_options, max_moves = task
+    random.seed(seed)
+    game = Game(Grid(bitboard.SIZE), None, 'E', testing_mode=True, ai_options=ai_options)
+    game.add_start_cells()
+    positions = Counter()
+    for _ in range(max_moves):
+        actions = game.get_legal_actions()
+        if not actions or game.grid.found_2048():
+            break
+        positions[bitboard.canonical(bitboard.encode(game.grid.cells))[0]] += 1
+        game.grid.clear_flags()
+        game.apply_action(game.ai.get_action(game))
+        game.grid.random_cell()
+    return positions
+
+
+book_ai = None # the ExpectimaxAI searching book positions inside a pool worker process
+
+
+def init_search_worker(settings):
+    from expectimax import ExpectimaxAI
+
+    global book_ai
+    book_ai = ExpectimaxAI(None, backend='bitboard', **settings)
+
+
+def search_worker(board):
+    """
+    Searches one canonical board. Returns (board, action, value), action None if it has no move.
+    """
+    from core import Game, Grid
+
+    grid = Grid(bitboard.SIZE)
+    grid.set_cells(bitboard.decode(board))
+    action = book_ai.get_action(Game(grid, None, None, testing_mode=True))
+    return board, action, book_ai.value
+
+
+def build_book(path, games=200, positions=5000, depth=4, processes=None, seed=0, play_options=None,
+               max_moves=400, base=None, verbose=True, search_options=None):
+    """
+    Plays games with a fast agent to find the most frequent positions, searches the
+    top ones at the given depth on a process pool and writes them as a book. The
+    searches take search_options (evaluator, heuristic_weights, weights) as ExpectimaxAI
+    options. Entries of an existing base book, which must have been searched with the
+    same settings, are kept unless they are searched again deeper.
+    """
+    play_options = dict({'depth': 1, 'backend': 'bitboard'}, **(play_options or {}))
+    search_options = dict(search_options or {})
+    settings = search_settings(**search_options)
+    entries = {}
+    if base:
+        base_book = MoveBook(base)
+        base_settings = base_book.settings
+        base_book.close()
+        if base_settings != settings:
+            raise ValueError(f'base book {base} was searched with {base_settings}, not {settings}')
+        entries = read_book(base)
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        counts = Counter()
+        tasks = [(seed + i, play_options, max_moves) for i in range(games)]
+        for game_positions in pool.imap_unordered(collect_worker, tasks):
+            counts.update(game_positions)
+        boards = [board for board, _ in counts.most_common()
+                  if board not in entries or entries[board][2] < depth][:positions]
+        if verbose:
+            print(f'{len(counts)} distinct positions in {games} games, searching {len(boards)} at depth {depth}')
+
+    with multiprocessing.Pool(processes, initializer=init_search_worker, initargs=(dict(search_options, depth=depth),)) as pool:
+        for board, action, value in pool.imap_unordered(search_worker, boards, chunksize=16):
+            if action is not None:
+                entries[board] = (action, value, depth)
+
+    write_book(path, entries, settings)
+    if verbose:
+        print(f'Wrote {len(entries)} positions to {path} in {time.perf_counter() - start:.1f} s')
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a move book of deeply searched common positions.')
+    parser.add_argument('--output', default='book.bin', help='book file to write')
+    parser.add_argument('--games', type=int, default=200, help='games played to find common positions')
+    parser.add_argument('--positions', type=int, default=5000, help='number of most frequent positions to search')
+    parser.add_argument('--depth', type=int, default=4, help='expectimax depth of the book searches')
+    parser.add_argument('--play-depth', type=int, default=1, help='expectimax depth of the agent playing the games')
+    parser.add_argument('--seed', type=int, default=0, help='game i is seeded with seed + i')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (all cores by default)')
+    parser.add_argument('--base', default=None, help='existing book to extend')
+    parser.add_argument('--heuristic-weights', default=None,
+                        help='heuristic weights of the book searches: a tuning.py output or {term: weight} JSON file')
+    args = parser.parse_args(argv)
+    search_options = {}
+    if args.heuristic_weights:
+        from tuning import load_weights
+        search_options['heuristic_weights'] = load_weights(args.heuristic_weights)
+    build_book(args.output, args.games, args.positions, args.depth, args.processes, args.seed,
+               {'depth': args.play_depth}, base=args.base, search_options=search_options)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+'''
+N-tuple network evaluator trained by TD(0) self-play.
+
+The network scores a packed board (see bitboard.py) as the sum of weights looked
+up for a few 4-cell tuples: the outer and inner row and three 2x2 squares. Each
+tuple is read on all 8 rotations and reflections of the board and shares its
+table between them, so a board costs 40 lookups. Every tuple covers two 8-bit
+pieces of the board, so its index is two shifts and masks, and each table is an
+array('d') of 65,536 weights (2.6 MB in total).
+
+Training plays games with afterstate TD(0): the agent picks the move maximizing
+merge score + V(afterstate), and V of the previous afterstate is moved towards
+the reward plus V of the next one. Moves and spawns are those of the bitboard
+engine, which reproduces Grid.move exactly. Weights are checkpointed to disk and
+load into ExpectimaxAI(evaluator='ntuple', weights=...) or as a rollout policy
+with MonteCarloAI(policy=...):
+
+    python ntuple.py --games 20000 --output weights.bin --every 1000
+    python cli.py --agent E --depth 1 --backend bitboard --weights weights.bin
+'''
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+import bitboard
+
+MAGIC = b'2048NTUP'
+TABLE_SIZE = 1 << 16
+
+# (low_shift, high_shift) of the two 8-bit board pieces making up each tuple's index
+TUPLES = (
+    (0, 8), # outer row
+    (16, 24), # inner row
+    (0, 16), # corner square
+    (4, 20), # edge square
+    (20, 36), # center square
+)
+
+
+class NTupleNetwork:
+    '''Symmetric n-tuple value function over packed boards.'''
+    def __init__(self, tuples=TUPLES, weights=None):
+        self.tuples = tuple(tuple(shifts) for shifts in tuples)
+        self.weights = weights or [array('d', bytes(8 * TABLE_SIZE)) for _ in self.tuples]
+        self.features = [(table, low, high) for table, (low, high) in zip(self.weights, self.tuples)]
+        self.games = 0 # training games played so far
+        self.bounds_cache = None
+
+    def value(self, board):
+        total = 0.0
+        for image in bitboard.symmetries(board):
+            for table, low, high in self.features:
+                total += table[((image >> low) & 0xFF) | (((image >> high) & 0xFF) << 8)]
+        return total
+
+    def update(self, board, delta):
+        """
+        Adds delta to every weight that value(board) reads.
+        """
+        for image in bitboard.symmetries(board):
+            for table, low, high in self.features:
+                table[((image >> low) & 0xFF) | (((image >> high) & 0xFF) << 8)] += delta
+        self.bounds_cache = None
+
+    def bounds(self):
+        """
+        (lowest, highest) value any board can get, for the Star1 windows of ExpectimaxAI.
+        """
+        if self.bounds_cache is None:
+            images = 8
+            self.bounds_cache = (sum(images * min(table) for table in self.weights),
+                                 sum(images * max(table) for table in self.weights))
+        return self.bounds_cache
+
+    def best_move(self, board):
+        """
+        Returns (action, afterstate, score) maximizing merge score + value(afterstate),
+        or None if the board has no legal move.
+        """
+        best = None
+        best_value = -float('inf')
+        for action in bitboard.ACTIONS:
+            after, _, score = bitboard.move(board, action)
+            if after == board:
+                continue
+            value = score + self.value(after)
+            if value > best_value:
+                best_value = value
+                best = (action, after, score)
+        return best
+
+    def save(self, path):
+        header = array('Q', [len(self.tuples), self.games] + [shift for shifts in self.tuples for shift in shifts])
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f: # a crash mid-write never leaves a truncated checkpoint
+            f.write(MAGIC)
+            f.write(header.tobytes())
+            for table in self.weights:
+                f.write(table.tobytes())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(8) != MAGIC:
+                raise ValueError(f'{path} is not an n-tuple checkpoint')
+            head = array('Q')
+            head.frombytes(f.read(16))
+            count, games = head
+            shifts = array('Q')
+            shifts.frombytes(f.read(16 * count))
+            weights = []
+            for _ in range(count):
+                table = array('d')
+                table.frombytes(f.read(8 * TABLE_SIZE))
+                if len(table) != TABLE_SIZE:
+                    raise ValueError(f'{path} is truncated')
+                weights.append(table)
+        network = cls([(shifts[2 * k], shifts[2 * k + 1]) for k in range(count)], weights)
+        network.games = games
+        return network
+
+
+def load_network(network):
+    """
+    Accepts an NTupleNetwork or the path of a checkpoint.
+    """
+    return NTupleNetwork.load(network) if isinstance(network, str) else network
+
+
+def play_training_game(network, alpha, rng):
+    """
+    One self-play game with TD(0) updates of the afterstate values.
+    Returns (score, max_tile, moves).
+    """
+    board = bitboard.spawn(bitboard.spawn(0, rng), rng)
+    previous = None # afterstate of the previous move
+    score = 0
+    moves = 0
+    while True:
+        best = network.best_move(board)
+        if best is None: # lost: the last afterstate leads nowhere
+            if previous is not None:
+                network.update(previous, -alpha * network.value(previous))
+            break
+        _, after, reward = best
+        if previous is not None:
+            network.update(previous, alpha * (reward + network.value(after) - network.value(previous)))
+        previous = after
+        score += reward
+        moves += 1
+        board = bitboard.spawn(after, rng)
+    network.games += 1
+    return score, bitboard.max_tile(board), moves
+
+
+def train(network, games, alpha=0.0025, seed=None, checkpoint=None, every=1000, verbose=True):
+    """
+    Trains for the given number of games, saving to checkpoint every `every` games and at the end.
+    Returns the list of (score, max_tile, moves) of the games.
+    """
+    rng = random.Random(seed)
+    results = []
+    start = time.perf_counter()
+    for game in range(1, games + 1):
+        results.append(play_training_game(network, alpha, rng))
+        if game % every == 0 or game == games:
+            if checkpoint:
+                network.save(checkpoint)
+            if verbose:
+                recent = results[-every:]
+                mean = sum(score for score, _, _ in recent) / len(recent)
+                reached = sum(tile >= 2048 for _, tile, _ in recent) / len(recent)
+                print(f'Games {network.games}: mean score {mean:.0f}, 2048 reached {reached:.1%}, '
+                      f'{time.perf_counter() - start:.0f} s')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train an n-tuple network evaluator by TD(0) self-play.')
+    parser.add_argument('--games', type=int, default=10000, help='training games to play')
+    parser.add_argument('--alpha', type=float, default=0.0025, help='learning rate per weight')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the spawns')
+    parser.add_argument('--output', default='weights.bin', help='checkpoint file')
+    parser.add_argument('--every', type=int, default=1000, help='checkpoint and report every this many games')
+    parser.add_argument('--resume', action='store_true', help='continue training the weights in --output')
+    args = parser.parse_args(argv)
+    network = NTupleNetwork.load(args.output) if args.resume and os.path.exists(args.output) else NTupleNetwork()
+    train(network, args.games, args.alpha, args.seed, args.output, args.every)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
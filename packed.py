@@ -0,0 +1,275 @@
+'''
+Packed boards of any size, for the 5x5 and 6x6 variants.
+
+A board is a single (arbitrary precision) int with 5 bits per cell, each the log2
+exponent of a tile (0 = empty, 1 = 2, 2 = 4, ...). Cell (i, j) lives at bits
+5 * (size * i + j), so row i is the (5 * size)-bit word
+(board >> (5 * size * i)) & row_mask. Five bits hold tiles up to 2^31, which
+bigger boards can reach long after the 4-bit nibbles of bitboard.py run out.
+
+Rows of 5 or 6 cells have 2^25 or 2^30 possible words, too many to tabulate
+up front, so each PackedEngine fills its per-size row tables on first lookup of a
+row. A game only ever meets a few thousand distinct rows, so after the first
+moves a slide is one dictionary lookup per row and a vertical move adds two
+table-driven transposes. Rewards match Grid.move exactly (see state.slide_row).
+An engine offers the same functions as the bitboard module, so code written
+against bitboard works on it unchanged:
+
+    engine = packed.engine(5)
+    board = engine.spawn(engine.spawn(0))
+    board, reward, score = engine.move(board, 'left')
+'''
+import random
+
+import bitboard
+from state import ACTIONS, slide_row, slide_row_right
+
+BITS = 5
+CELL_MASK = (1 << BITS) - 1
+
+
+class RowTable(dict):
+    '''Row word -> table entry, built by build(row) on the first lookup of each row.'''
+    def __init__(self, build):
+        super().__init__()
+        self.build = build
+
+    def __missing__(self, row):
+        entry = self[row] = self.build(row)
+        return entry
+
+
+class PackedEngine:
+    '''Moves and spawns on packed boards of one size.'''
+    ACTIONS = ACTIONS
+
+    def __init__(self, size):
+        self.size = size
+        self.row_bits = BITS * size
+        self.row_mask = (1 << self.row_bits) - 1
+        self.row_shifts = tuple(self.row_bits * i for i in range(size))
+        self.cell_shifts = tuple(BITS * k for k in range(size * size))
+        # row -> (result_row, moved, reward, score) for a move towards column 0 / column size - 1
+        self.left = RowTable(self.build_left)
+        self.right = RowTable(self.build_right)
+        # row -> its cells spread to column 0 of consecutive rows, the building block of transpose
+        self.spread = RowTable(self.build_spread)
+        self.reversed = RowTable(self.build_reversed) # row -> the row with its cells in reverse order
+
+    def row_values(self, row):
+        return tuple(1 << e if e else 0 for e in ((row >> (BITS * j)) & CELL_MASK for j in range(self.size)))
+
+    def pack_row(self, values):
+        row = 0
+        for j, value in enumerate(values):
+            if value:
+                row |= (value.bit_length() - 1) << (BITS * j)
+        return row
+
+    def build_left(self, row):
+        new_row, reward, score = slide_row(self.row_values(row))
+        result = self.pack_row(new_row)
+        return result, result != row, reward, score
+
+    def build_right(self, row):
+        new_row, reward, score = slide_row_right(self.row_values(row))
+        result = self.pack_row(new_row)
+        return result, result != row, reward, score
+
+    def build_reversed(self, row):
+        result = 0
+        for j in range(self.size):
+            result |= ((row >> (BITS * j)) & CELL_MASK) << (BITS * (self.size - 1 - j))
+        return result
+
+    def build_spread(self, row):
+        spread = 0
+        for j in range(self.size):
+            spread |= ((row >> (BITS * j)) & CELL_MASK) << (self.row_bits * j)
+        return spread
+
+    def rows(self, board):
+        mask = self.row_mask
+        return [(board >> shift) & mask for shift in self.row_shifts]
+
+    def transpose(self, board):
+        spread, mask = self.spread, self.row_mask
+        result = 0
+        for i, shift in enumerate(self.row_shifts):
+            result |= spread[(board >> shift) & mask] << (BITS * i)
+        return result
+
+    def mirror(self, board):
+        """
+        Left-right reflection: reverses the cells of every row.
+        """
+        reversed_rows, mask = self.reversed, self.row_mask
+        result = 0
+        for shift in self.row_shifts:
+            result |= reversed_rows[(board >> shift) & mask] << shift
+        return result
+
+    def flip(self, board):
+        """
+        Top-bottom reflection: reverses the order of the rows.
+        """
+        result = 0
+        for row, shift in zip(self.rows(board), reversed(self.row_shifts)):
+            result |= row << shift
+        return result
+
+    def symmetries(self, board):
+        """
+        The 8 rotations and reflections of board, in the transform order of bitboard.symmetries.
+        """
+        t = self.transpose(board)
+        m, tm = self.mirror(board), self.mirror(t)
+        return (board, m, self.flip(board), self.flip(m), t, tm, self.flip(t), self.flip(tm))
+
+    def canonical(self, board):
+        """
+        Returns (canonical_board, transform) like bitboard.canonical; bitboard.ACTION_INVERSES
+        maps actions on the canonical board back.
+        """
+        images = self.symmetries(board)
+        smallest = min(images)
+        return smallest, images.index(smallest)
+
+    def canonical_key(self, board):
+        return min(self.symmetries(board))
+
+    def transpose_key(self, board):
+        # see bitboard.transpose_key
+        t = self.transpose(board)
+        return t if t < board else board
+
+    def encode(self, cells):
+        """
+        Packs a list of rows of tile values (as held in Grid.cells) into a board.
+        """
+        board = 0
+        for i, row in enumerate(cells):
+            for j, value in enumerate(row):
+                if value:
+                    board |= (value.bit_length() - 1) << (BITS * (self.size * i + j))
+        return board
+
+    def decode(self, board):
+        """
+        Unpacks a board into a fresh list of rows of tile values.
+        """
+        return [list(self.row_values(row)) for row in self.rows(board)]
+
+    def apply_rows(self, board, table):
+        mask = self.row_mask
+        result = 0
+        reward = 0
+        score = 0
+        for shift in self.row_shifts:
+            new_row, moved, row_reward, row_score = table[(board >> shift) & mask]
+            result |= new_row << shift
+            reward += row_reward
+            score += row_score
+        return result, reward, score
+
+    def move(self, board, direction):
+        """
+        Slides the board in the given direction. Returns (new_board, reward, score) like
+        bitboard.move; the move is legal iff new_board != board.
+        """
+        if direction == 'left':
+            return self.apply_rows(board, self.left)
+        if direction == 'right':
+            return self.apply_rows(board, self.right)
+        result, reward, score = self.apply_rows(self.transpose(board), self.left if direction == 'up' else self.right)
+        return self.transpose(result), reward, score
+
+    def legal_actions(self, board):
+        left, right = self.left, self.right
+        rows = self.rows(board)
+        cols = self.rows(self.transpose(board))
+        actions = []
+        if any(left[c][1] for c in cols):
+            actions.append('up')
+        if any(right[c][1] for c in cols):
+            actions.append('down')
+        if any(left[r][1] for r in rows):
+            actions.append('left')
+        if any(right[r][1] for r in rows):
+            actions.append('right')
+        return actions
+
+    def empty_cells(self, board):
+        """
+        Returns the empty (i, j) positions in row-major order, like Grid.retrieve_empty_cells.
+        """
+        size = self.size
+        return [divmod(k, size) for k, shift in enumerate(self.cell_shifts) if not (board >> shift) & CELL_MASK]
+
+    def count_empty(self, board):
+        return sum(1 for shift in self.cell_shifts if not (board >> shift) & CELL_MASK)
+
+    def set_tile(self, board, cell, exponent):
+        return board | (exponent << (BITS * (self.size * cell[0] + cell[1])))
+
+    def spawn(self, board, rng=random):
+        """
+        Adds a random 2 (90%) or 4 (10%) tile, consuming randomness exactly like Grid.random_cell.
+        """
+        cell = rng.choice(self.empty_cells(board))
+        return self.set_tile(board, cell, 1 if rng.random() < 0.9 else 2)
+
+    def max_exponent(self, board):
+        return max((board >> shift) & CELL_MASK for shift in self.cell_shifts)
+
+    def max_tile(self, board):
+        e = self.max_exponent(board)
+        return 1 << e if e else 0
+
+    def found_2048(self, board):
+        return any((board >> shift) & CELL_MASK == 11 for shift in self.cell_shifts)
+
+    def is_terminal(self, board):
+        # same rule as ExpectimaxAI.is_terminal: a 2048 tile or no legal move left
+        return self.found_2048(board) or not self.legal_actions(board)
+
+    def view(self, board):
+        return PackedView(self, board)
+
+
+class PackedView:
+    '''Read-only Grid-like view of a packed board, for code written against Grid (e.g. calculate_score).'''
+    def __init__(self, engine, board):
+        self.size = engine.size
+        self.engine = engine
+        self.board = board
+        self.cells = engine.decode(board)
+
+    def retrieve_empty_cells(self):
+        return self.engine.empty_cells(self.board)
+
+    def has_empty_cells(self):
+        return self.engine.count_empty(self.board) > 0
+
+    def found_2048(self):
+        return self.engine.found_2048(self.board)
+
+
+ENGINES = {} # size -> PackedEngine, shared so that every agent of a process fills the same row tables
+
+
+def engine(size):
+    if size not in ENGINES:
+        ENGINES[size] = PackedEngine(size)
+    return ENGINES[size]
+
+
+def board_engine(size):
+    """
+    The fastest engine for a board size: the bitboard module for 4x4, a PackedEngine otherwise.
+    Both provide encode, move, legal_actions, spawn, max_tile, ... with the same signatures.
+    """
+    if size == bitboard.SIZE:
+        return bitboard
+    return engine(size)
+
@@ -0,0 +1,99 @@
+'''
+Multi-process evaluation harness: plays Game.run_tests style evaluation games
+across a process pool. Every game gets its own deterministic seed, results are
+streamed back as games finish, and the same statistics as run_tests are reported.
+Games run in testing mode, so no window is ever opened.
+'''
+import multiprocessing
+import random
+
+from core import Game, Grid
+from driver import GameDriver
+from gamelog import GameRecorder
+from stats import StatsCollector
+
+
+def play_game(task):
+    """
+    Plays one seeded game in testing mode and returns its result record. With record
+    set, the result also carries the game's gamelog record as bytes.
+    """
+    index, seed, user_choice, ai_options, size, record = task
+    random.seed(seed)
+    ai_options = dict(ai_options or {})
+    if user_choice == 'MC':
+        ai_options.setdefault('seed', seed) # seeds the 'numpy' rollouts
+    game = Game(Grid(size), None, user_choice, testing_mode=True, ai_options=ai_options)
+    game.add_start_cells()
+    recorder = GameRecorder() if record else None
+    result = GameDriver(game, recorder, seed).run()
+    return {
+        'game': index,
+        'seed': seed,
+        'score': result['score'],
+        'max_tile': result['max_tile'],
+        'won': result['max_tile'] >= 2048,
+        'moves': result['moves'],
+        'seconds': result['seconds'],
+        'stats': game.ai.stats.records() if getattr(game.ai, 'stats', None) is not None else None,
+        'record': recorder.take() if recorder is not None else None,
+    }
+
+
+def summarize(results):
+    scores = [result['score'] for result in results]
+    summary = {
+        'games': len(results),
+        'mean_score': sum(scores) / len(results) if results else 0,
+        'highest_tile': max((result['max_tile'] for result in results), default=0),
+        'highest_score': max(scores, default=0),
+        'win_rate': sum(result['won'] for result in results) / len(results) if results else 0,
+    }
+    if any(result.get('stats') for result in results): # agents were built with stats=True
+        collector = StatsCollector()
+        for result in results:
+            collector.merge(result.get('stats') or [])
+        summary['search'] = collector.summary()
+        summary['search_report'] = collector.report()
+    return summary
+
+
+def run_parallel_tests(num_tests=50, user_choice='E', seed=0, processes=None, ai_options=None, size=4,
+                       callback=None, verbose=True, record=None):
+    """
+    Plays num_tests games on a pool of processes (all cores by default, none if processes=1).
+    Game i is seeded with seed + i, so a run is reproducible regardless of scheduling.
+    callback(result) is called in this process as each game finishes.
+    With record (a path), every game is appended to that gamelog file as it arrives.
+    Returns (results ordered by game, summary).
+    """
+    tasks = [(i, seed + i, user_choice, ai_options, size, record is not None) for i in range(num_tests)]
+    results = []
+    recorder = GameRecorder(record) if record is not None else None
+    pool = None if processes == 1 else multiprocessing.Pool(processes) # a single process plays inline
+    try:
+        for result in (map(play_game, tasks) if pool is None else pool.imap_unordered(play_game, tasks)):
+            results.append(result)
+            if recorder is not None:
+                recorder.write_records(result.pop('record'))
+            if verbose:
+                print(f"Test {result['game'] + 1}: Final score = {result['score']}, Highest tile = {result['max_tile']}")
+            if callback is not None:
+                callback(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if recorder is not None:
+            recorder.close()
+
+    results.sort(key=lambda result: result['game'])
+    summary = summarize(results)
+    if verbose:
+        print(f"Mean score: {summary['mean_score']}")
+        print(f"Highest tile: {summary['highest_tile']}")
+        print(f"Highest score: {summary['highest_score']}")
+        print(f"Win rate: {summary['win_rate']:.2%}")
+        if 'search_report' in summary:
+            print(summary['search_report'])
+    return results, summary
@@ -0,0 +1,64 @@
+'''
+Score plots for evaluation runs. matplotlib is only imported when a plot is drawn.
+'''
+
+
+def plot_scores(scores, choice_name, path=None, show=True):
+    import matplotlib.pyplot as plt
+
+    # plot the scores over the runs
+    num_runs = len(scores)
+    plt.figure(figsize=(10, 5))
+    plt.plot(scores, label=f'{choice_name} AI')
+    plt.xlabel('Run')
+    plt.ylabel('Score')
+    plt.title(f'Scores over {num_runs} Runs')
+    plt.legend()
+    # save before showing: closing the window clears the figure, so a later savefig writes a blank image
+    if path:
+        plt.savefig(path)
+    if show:
+        plt.show()
+    plt.close()
+
+
+def plot_tournament(scores, path=None, show=False, z=1.96):
+    """
+    Plots a tournament: the running mean score of every entrant with its confidence band, and
+    the score distributions side by side. scores maps entrant name -> scores in seed order.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+
+    figure, (means_axis, box_axis) = plt.subplots(1, 2, figsize=(14, 5))
+    for name, values in scores.items():
+        games, means, lows, highs = [], [], [], []
+        total = total_squares = 0.0
+        for n, value in enumerate(values, 1):
+            total += value
+            total_squares += value * value
+            mean = total / n
+            half = z * ((max(total_squares - n * mean * mean, 0.0) / (n - 1)) / n) ** 0.5 if n > 1 else 0.0
+            games.append(n)
+            means.append(mean)
+            lows.append(mean - half)
+            highs.append(mean + half)
+        line, = means_axis.plot(games, means, label=name)
+        means_axis.fill_between(games, lows, highs, color=line.get_color(), alpha=0.2)
+    means_axis.xaxis.set_major_locator(MaxNLocator(integer=True))
+    means_axis.set_xlabel('Games')
+    means_axis.set_ylabel('Mean score')
+    means_axis.set_title('Running mean score')
+    means_axis.legend()
+
+    box_axis.boxplot(list(scores.values()))
+    box_axis.set_xticks(range(1, len(scores) + 1))
+    box_axis.set_xticklabels(list(scores))
+    box_axis.set_ylabel('Score')
+    box_axis.set_title('Scores')
+    figure.tight_layout()
+    if path:
+        figure.savefig(path)
+    if show:
+        plt.show()
+    plt.close(figure)
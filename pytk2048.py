@@ -1,211 +1,10 @@
 from __future__ import print_function
 import tkinter as tk 
-import tkinter.messagebox as messagebox
 import sys
-import numpy as np
-import random
-import matplotlib.pyplot as plt
-from expectimax import ExpectimaxAI
-from montecarlo import MonteCarloAI
+from core import Grid, Game # re-exported for code that imports them from here
+from plots import plot_scores
 
 
-class Grid:
-    '''The data structure representation of the 2048 game.'''
-    def __init__(self, n):
-        self.size = n
-        self.cells = self.generate_empty_grid()
-        self.compressed = False
-        self.merged = False
-        self.moved = False
-        self.current_score = 0
-
-    def generate_empty_grid(self):
-        return [[0] * self.size for _ in range(self.size)]
-
-    def clone_grid(self):
-        new_grid = Grid(self.size)
-        new_grid.set_cells([row[:] for row in self.cells])
-        new_grid.current_score = self.current_score
-        new_grid.compressed = self.compressed
-        new_grid.merged = self.merged
-        new_grid.moved = self.moved
-        return new_grid
-
-    def set_cells(self, cells):
-        self.cells = cells
-
-    def get_state(self):
-        return [row.copy() for row in self.cells]
-
-    def random_cell(self):
-        cell = random.choice(self.retrieve_empty_cells())
-        i = cell[0]
-        j = cell[1]
-        self.cells[i][j] = 2 if random.random() < 0.9 else 4
-
-    def retrieve_empty_cells(self):
-        return [(i, j) for i in range(self.size) for j in range(self.size) if self.cells[i][j] == 0]
-
-    def getScore(self):
-        return self.current_score
-    
-    def left_compress(self):
-        for i in range(self.size):
-            self.cells[i] = [num for num in self.cells[i] if num != 0]
-            self.cells[i] += [0] * (self.size - len(self.cells[i]))
-    
-    def left_merge(self):
-        for i in range(self.size):
-            for j in range(self.size - 1):
-                if self.cells[i][j] == self.cells[i][j + 1]:
-                    self.cells[i][j] *= 2
-                    self.cells[i][j + 1] = 0
-                    self.current_score += self.cells[i][j]
-    
-
-    def has_empty_cells(self):
-        return any(cell == 0 for row in self.cells for cell in row)
-
-    def can_merge(self):
-        for i in range(self.size):
-            for j in range(self.size):
-                if self.cells[i][j] == 0:
-                    continue
-                if i < self.size - 1 and self.cells[i][j] == self.cells[i + 1][j]:
-                    return True
-                if j < self.size - 1 and self.cells[i][j] == self.cells[i][j + 1]:
-                    return True
-        return False
-
-    def found_2048(self):
-        return any(cell == 2048 for row in self.cells for cell in row)
-
-    def clear_flags(self):
-        self.compressed = False
-        self.merged = False
-        self.moved = False
-
-    def move(self, direction):
-        initial_empty_cells = len(self.retrieve_empty_cells())
-        initial_state = self.get_state()
-
-        if direction == 'up':
-            reward = self.move_up()
-        elif direction == 'down':
-            reward = self.move_down()
-        elif direction == 'left':
-            reward = self.move_left()
-        elif direction == 'right':
-            reward = self.move_right()
-
-        final_empty_cells = len(self.retrieve_empty_cells())
-        final_state = self.get_state()
-
-        # Calculate reward based on the change in the number of empty cells and the grid state
-        reward += (final_empty_cells - initial_empty_cells) * 10  # Example heuristic
-        reward += self.calculate_state_difference(initial_state, final_state)
-
-        return reward
-
-    def move_up(self):
-        self.transpose()
-        reward = self.move_left()
-        self.transpose()
-        return reward
-
-    def move_down(self):
-        self.transpose()
-        reward = self.move_right()
-        self.transpose()
-        return reward
-
-    def move_left(self):
-        reward = 0
-        for row in self.cells:
-            reward += self.compress(row)
-            reward += self.merge(row)
-            reward += self.compress(row)
-        return reward
-
-    def move_right(self):
-        reward = 0
-        for row in self.cells:
-            row.reverse()
-            reward += self.compress(row)
-            reward += self.merge(row)
-            reward += self.compress(row)
-            row.reverse()
-        return reward
-
-    def compress(self, row):
-        new_row = [num for num in row if num != 0]
-        new_row += [0] * (self.size - len(new_row))
-        reward = 0
-        if new_row != row:
-            self.moved = True
-            reward = sum(new_row) - sum(row)
-        row[:] = new_row
-        return reward
-
-    def merge(self, row):
-        # merge tiles with the same value
-        reward = 0
-        for i in range(self.size - 1):
-            if row[i] != 0 and row[i] == row[i + 1]:
-                row[i] *= 2
-                reward += row[i]
-                row[i + 1] = 0
-                self.merged = True
-                self.moved = True
-        return reward
-
-    def calculate_state_difference(self, initial_state, final_state):
-        """
-        Calculate the difference between the initial and final grid states.
-        This can be used as part of the reward calculation.
-        """
-        difference = 0
-        for i in range(self.size):
-            for j in range(self.size):
-                difference += abs(final_state[i][j] - initial_state[i][j])
-        return difference
-
-    def transpose(self):
-        self.cells = [list(row) for row in zip(*self.cells)]
-
-    def reverse(self):
-        self.cells = [row[::-1] for row in self.cells]
-
-    def can_move_up(self):
-        for j in range(self.size):
-            for i in range(1, self.size):
-                if self.cells[i][j] != 0 and (self.cells[i - 1][j] == 0 or self.cells[i - 1][j] == self.cells[i][j]):
-                    return True
-        return False
-
-    def can_move_down(self):
-        for j in range(self.size):
-            for i in range(self.size - 2, -1, -1):
-                if self.cells[i][j] != 0 and (self.cells[i + 1][j] == 0 or self.cells[i + 1][j] == self.cells[i][j]):
-                    return True
-        return False
-
-    def can_move_left(self):
-        for i in range(self.size):
-            for j in range(1, self.size):
-                if self.cells[i][j] != 0 and (self.cells[i][j - 1] == 0 or self.cells[i][j - 1] == self.cells[i][j]):
-                    return True
-        return False
-
-    def can_move_right(self):
-        for i in range(self.size):
-            for j in range(self.size - 2, -1, -1):
-                if self.cells[i][j] != 0 and (self.cells[i][j + 1] == 0 or self.cells[i][j + 1] == self.cells[i][j]):
-                    return True
-        return False
-    
-    
-
 class GamePanel:
     '''The GUI view class of the 2048 game showing via tkinter.'''
     CELL_PADDING = 10
@@ -282,231 +81,25 @@ class GamePanel:
                         text=cell_text,
                         bg=bg_color, fg=fg_color)
 
-class Game:
-    '''The main game class which is the controller of the whole game.'''
-    def __init__(self, grid, panel, user_choice='E', testing_mode=False):
-        self.grid = grid
-        self.panel = panel
-        self.testing_mode = testing_mode
-        self.start_cells_num = 2
-        self.over = False
-        self.won = False
-        self.keep_playing = False
-        if user_choice == 'MC':
-            self.ai = MonteCarloAI(self, 0.9, 100, 50)
-        elif user_choice == 'E':
-            self.ai = ExpectimaxAI(self)
-
-    def clone_game(self):
-        """
-        Creates a deep copy of the game, including its grid and state.
-        """
-        grid_copy = self.grid.clone_grid()
-        game_copy = Game(grid_copy, self.panel)
-        game_copy.over = self.over
-        game_copy.won = self.won
-        game_copy.keep_playing = self.keep_playing
-        return game_copy
-
-    def get_state(self):
-        return self.grid.get_state()
-
-    def simulate_action(self, action):
-        game_copy = self.clone_game()
-        reward = game_copy.grid.move(action)  
-        return (game_copy, reward)  # return the simulated grid and reward
-
-    def is_game_terminated(self):
-        return self.over or (self.won and not self.keep_playing)
-
-    def get_legal_actions(self):
-        actions = []
-        if self.can_move_up():
-            actions.append('up')
-        if self.can_move_down():
-            actions.append('down')
-        if self.can_move_left():
-            actions.append('left')
-        if self.can_move_right():
-            actions.append('right')
-        return actions
-
-    def can_move_up(self):
-        return self.grid.can_move_up()
-
-    def can_move_down(self):
-        return self.grid.can_move_down()
-
-    def can_move_left(self):
-        return self.grid.can_move_left()
-
-    def can_move_right(self):
-        return self.grid.can_move_right()
-
-    def start(self):
-        self.add_start_cells()
-        if not self.testing_mode:
-            self.panel.paint()
-        self.run_ai()
-
-    # test the AI over multiple runs
-    def run_tests(self, num_tests=5):
-        scores = []
-        highest_tiles = []
-
-        for i in range(num_tests):
-            self.grid = Grid(4)
-            self.over = False
-            self.won = False
-            self.keep_playing = False
-            self.add_start_cells()
-            final_score, max_tile = self.run_ai()
-            scores.append(final_score)
-            highest_tiles.append(max_tile)
-            print(f"Test {i + 1}: Final score = {final_score}, Highest tile = {max_tile}")
-        
-        mean_score = sum(scores) / num_tests
-        highest_tile = max(highest_tiles)
-        print(f"Mean score: {mean_score}")
-        print(f"Highest tile: {highest_tile}")
-        print(f'Highest score: {max(scores)}')
-        return scores
-
-    def add_start_cells(self):
-        for _ in range(self.start_cells_num):
-            self.grid.random_cell()
-
-    def can_move(self):
-        return self.grid.has_empty_cells() or self.grid.can_merge()
-
-    def apply_action(self, action):
-        if action == 'up':
-            self.up(self.grid)
-        elif action == 'down':
-            self.down(self.grid)
-        elif action == 'left':
-            self.left(self.grid)
-        elif action == 'right':
-            self.right(self.grid)
-        
-        self.grid.moved = True
-
-    def run_ai(self):
-        if self.is_game_terminated():
-            final_score = self.grid.getScore()
-            max_tile = max(max(row) for row in self.grid.cells)
-            return final_score, max_tile
-
-        self.grid.clear_flags()
-        move = self.ai.get_action(self)
-
-        if move:
-            self.apply_action(move)
-
-        if not self.testing_mode:
-            self.panel.paint()
-            self.panel.root.update()
-
-        if self.grid.found_2048():
-            self.you_win()
-            if not self.keep_playing:
-                final_score = self.grid.getScore()
-                max_tile = max(max(row) for row in self.grid.cells)
-                return final_score, max_tile
-            
-
-        if self.grid.moved:
-            self.grid.random_cell()  # Add a new tile if the grid has moved
-
-        if not self.testing_mode:
-            self.panel.paint()
-            if not self.can_move():
-                self.over = True
-                self.game_over()
-                final_score = self.grid.getScore()
-                max_tile = max(max(row) for row in self.grid.cells)
-                return final_score, max_tile        
-            self.panel.root.after(100, self.run_ai)
-        else:
-            if not self.can_move():
-                self.over = True
-                self.game_over()
-                final_score = self.grid.getScore()
-                max_tile = max(max(row) for row in self.grid.cells)
-                return final_score, max_tile
-            return self.run_ai()
-        
-
-    def you_win(self):
-        if not self.won:
-            self.won = True
-            print('You Win!')
-            if not self.testing_mode:
-                if messagebox.askyesno('2048', 'You Win!\nAre you going to continue the 2048 game?'):
-                    self.keep_playing = True
-
-    def game_over(self):
-        if not self.testing_mode:
-            messagebox.showinfo('2048', 'Oops!\nGame over!')
-
-    def up(self, grid):
-        grid.transpose()
-        grid.left_compress()
-        grid.left_merge()
-        grid.moved = grid.compressed or grid.merged
-        grid.left_compress()
-        grid.transpose()
-
-    def down(self, grid):
-        grid.transpose()
-        grid.reverse()
-        grid.left_compress()
-        grid.left_merge()
-        grid.moved = grid.compressed or grid.merged
-        grid.left_compress()
-        grid.reverse()
-        grid.transpose()
-
-    def left(self, grid):
-        grid.left_compress()
-        grid.left_merge()
-        grid.moved = grid.compressed or grid.merged
-        grid.left_compress()
-
-    def right(self, grid):
-        grid.reverse()
-        grid.left_compress()
-        grid.left_merge()
-        grid.moved = grid.compressed or grid.merged
-        grid.left_compress()
-        grid.reverse()
 if __name__ == '__main__':
-    size = 4
-    grid = Grid(size)
-    # user input for AI choice + testing mode
+    # user input for board size, AI choice + testing mode
+    size = input("Board size? (blank for 4)\n")
+    grid = Grid(int(size) if size.strip() else 4)
     choice = input("Choose AI: 1. Monte Carlo ('MC') 2. Expectimax ('E')\n")
     testing_mode = input("Testing mode? (y/n)\n")
     if testing_mode == 'y':
-        panel = GamePanel(grid)
         game2048 = Game(grid, None, choice, testing_mode=True)
         choice_name = 'expectimax' if choice == 'E' else 'montecarlo'
         num_runs = 50
         scores = game2048.run_tests(num_runs)
 
-        # plot the scores over the runs
-        plt.figure(figsize=(10, 5))
-        plt.plot(scores, label=f'{choice_name} AI')
-        plt.xlabel('Run')
-        plt.ylabel('Score')
-        plt.title(f'Scores over {num_runs} Runs')
-        plt.legend()
-        plt.show()
-
-        plt.savefig(f'{choice_name}_scores.png')
+        plot_scores(scores, choice_name, f'{choice_name}_scores.png')
 
     else:
+        move_time = input("Seconds per move? (blank to search every move to full depth)\n")
         panel = GamePanel(grid)
-        game2048 = Game(grid, panel, choice, testing_mode=False)
+        game2048 = Game(grid, panel, choice, testing_mode=False,
+                        move_time=float(move_time) if move_time.strip() else None)
         game2048.start()
 
         panel.root.mainloop() 
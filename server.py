@@ -0,0 +1,423 @@
+'''
+Local best-move service: other processes on the host ask for moves over HTTP
+instead of importing the agents and building their tables themselves.
+
+    python server.py --port 8048 --workers 4
+    curl -s localhost:8048/move -d '{"board": [[2, 0, 0, 0], [0, 4, 0, 0], [0, 0, 0, 0], [0, 0, 0, 2]], "agent": "E", "depth": 2}'
+    curl -s localhost:8048/metrics
+
+POST /move takes a JSON object with the board (rows of tile values), the agent
+('E' or 'MC'), an optional time budget in seconds ("time") and agent options
+(E: depth, backend, evaluator, frontier, star, prob_cutoff; MC: simulations,
+max_depth, gamma, backend). A time budget runs the agent's anytime search with
+the depth or simulations as its cap. Boards, options and the time budget are
+checked against AGENT_OPTIONS and the size and tile limits, and bad requests
+get a 400 reply. The reply is
+{"move", "value", "nodes", "search_seconds", "seconds", "cached"}, move being
+null when the board has no legal move.
+
+Requests arriving within batch_window of each other are dispatched together:
+identical ones are solved once and the rest go to a process pool whose workers
+keep their agents (and their transposition tables) warm between requests.
+Expectimax answers without a time budget are kept in an LRU cache shared by
+all clients (Monte Carlo and time-budgeted answers vary from run to run). GET /metrics reports
+request counts, batching, cache hits, throughput and latency percentiles.
+request_move() is a small client for other Python processes.
+'''
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request as urllib_request
+
+import bitboard
+
+DEFAULT_URL = 'http://127.0.0.1:8048'
+BOARD_SIZES = (4, 5, 6)
+# 4x4 boards are packed into 4-bit bitboard nibbles, other sizes into 5 bits; 4x4 tiles stop at 16384
+# and expectimax boards whose tile sum nears 65536 are refused too (see bitboard.may_overflow), so no
+# search merges two 32768 tiles into a tile the nibbles cannot hold
+MAX_EXPONENTS = {4: 14}
+MAX_TIME = 60.0 # seconds
+# option -> (type, allowed values) or (type, lowest, highest); the caps keep a single request
+# from tying up a worker for long
+AGENT_OPTIONS = {
+    'E': {
+        'depth': (int, 1, 4),
+        'backend': (str, ('grid', 'bitboard')),
+        'evaluator': (str, ('tables', 'heuristic')),
+        'frontier': (int, 0, 4),
+        'star': (int, (0, 1)),
+        'prob_cutoff': (float, 0.0, 1.0),
+    },
+    'MC': {
+        'simulations': (int, 1, 2000),
+        'max_depth': (int, 1, 200),
+        'gamma': (float, 0.0, 1.0),
+        'backend': (str, ('grid', 'bitboard', 'numpy')),
+    },
+}
+
+
+worker_agents = {} # (agent, options) -> agent kept warm inside a pool worker
+
+
+def init_worker():
+    # build the row and heuristic tables before the first request arrives
+    from evaluation import load_tables
+
+    bitboard.row_tables()
+    load_tables()
+
+
+def make_agent(agent, options):
+    if agent == 'E':
+        from expectimax import ExpectimaxAI
+        return ExpectimaxAI(None, **options)
+    from montecarlo import MonteCarloAI
+    return MonteCarloAI(None, **options)
+
+
+def solve(task):
+    """
+    Answers one request in a pool worker:
+    (index, agent, cells, options, time_limit) -> (index, move, value, nodes, seconds).
+    """
+    from core import Game, Grid
+
+    index, agent, cells, options, time_limit = task
+    key = (agent, tuple(sorted(options.items())))
+    ai = worker_agents.get(key)
+    if ai is None:
+        ai = worker_agents[key] = make_agent(agent, options)
+    grid = Grid(len(cells))
+    grid.set_cells([list(row) for row in cells])
+    game = Game(grid, None, None, testing_mode=True)
+    start = time.perf_counter()
+    move = ai.get_action(game, start + time_limit if time_limit else None)
+    return index, move, ai.value if move is not None else None, getattr(ai, 'nodes', 0), time.perf_counter() - start
+
+
+def parse_request(data):
+    """
+    Validates a /move request. Returns (agent, cells, options, time_limit), cells as a tuple of row tuples.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('the request must be a JSON object')
+    agent = data.get('agent', 'E')
+    if agent not in AGENT_OPTIONS:
+        raise ValueError(f"unknown agent {agent!r}, expected 'E' or 'MC'")
+    board = data.get('board')
+    if not isinstance(board, list) or any(not isinstance(row, list) or len(row) != len(board) for row in board):
+        raise ValueError('board must be a square list of rows')
+    if len(board) not in BOARD_SIZES:
+        raise ValueError(f'board size must be one of {BOARD_SIZES}, got {len(board)}')
+    max_tile = 1 << MAX_EXPONENTS.get(len(board), 31)
+    for row in board:
+        for value in row:
+            if type(value) is not int or value < 0 or value & (value - 1) or value == 1 or value > max_tile:
+                raise ValueError(f'invalid tile {value!r} (tiles are 0 or powers of two from 2 to {max_tile})')
+    options = {name: parse_option(name, data[name], *spec) for name, spec in AGENT_OPTIONS[agent].items() if name in data}
+    if agent == 'E' and len(board) == bitboard.SIZE and bitboard.may_overflow(board, AGENT_OPTIONS['E']['depth'][2] + 1):
+        raise ValueError('4x4 board is too close to a 65536 tile for expectimax to search')
+    time_limit = data.get('time')
+    if time_limit is not None and (type(time_limit) not in (int, float) or not 0 < time_limit <= MAX_TIME):
+        raise ValueError(f'time must be a positive number of seconds, at most {MAX_TIME}')
+    return agent, tuple(tuple(row) for row in board), options, time_limit
+
+
+def cacheable(request):
+    """
+    Whether the answer to a parsed request is worth caching. Monte Carlo answers are samples
+    and time-budgeted answers depend on how busy the host was, so a repeat is searched again.
+    """
+    agent, cells, options, time_limit = request
+    return agent == 'E' and time_limit is None
+
+
+def parse_option(name, value, kind, *allowed):
+    """
+    Checks one agent option against its AGENT_OPTIONS entry and returns it as kind.
+    """
+    if kind is float and type(value) in (int, float):
+        value = float(value) # JSON has no separate integer and float numbers
+    if type(value) is not kind:
+        raise ValueError(f'{name} must be of type {kind.__name__}, got {value!r}')
+    if len(allowed) == 1:
+        if value not in allowed[0]:
+            raise ValueError(f'{name} must be one of {allowed[0]}, got {value!r}')
+    elif not allowed[0] <= value <= allowed[1]:
+        raise ValueError(f'{name} must be between {allowed[0]} and {allowed[1]}, got {value!r}')
+    return value
+
+
+class PendingRequest:
+    '''A request waiting for its batch to be solved.'''
+    def __init__(self, key, request):
+        self.key = key
+        self.request = request
+        self.done = threading.Event()
+        self.answer = None
+        self.error = None
+
+
+class ServiceMetrics:
+    '''Thread-safe request, batch, cache and latency counters.'''
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.solved = 0 # requests that reached a worker, after deduplication
+        self.agents = Counter()
+        self.latencies = deque(maxlen=window) # seconds of the most recent requests
+        self.finished = deque(maxlen=window) # completion times of the most recent requests
+
+    def record_request(self, agent, seconds, cached):
+        with self.lock:
+            self.requests += 1
+            self.cache_hits += cached
+            self.agents[agent] += 1
+            self.latencies.append(seconds)
+            self.finished.append(time.perf_counter())
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def record_batch(self, size, unique):
+        with self.lock:
+            self.batches += 1
+            self.batched_requests += size
+            self.solved += unique
+
+    def snapshot(self, recent=10.0):
+        with self.lock:
+            now = time.perf_counter()
+            latencies = sorted(self.latencies)
+            uptime = now - self.started
+            recent_count = sum(1 for finished in self.finished if finished >= now - recent)
+            return {
+                'uptime_seconds': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'agents': dict(self.agents),
+                'cache_hits': self.cache_hits,
+                'cache_hit_rate': self.cache_hits / self.requests if self.requests else 0.0,
+                'batches': self.batches,
+                'mean_batch_size': self.batched_requests / self.batches if self.batches else 0.0,
+                'deduplicated': self.batched_requests - self.solved,
+                'throughput_per_sec': self.requests / uptime if uptime else 0.0,
+                'recent_throughput_per_sec': recent_count / min(recent, uptime) if uptime else 0.0,
+                'latency_ms': {
+                    'mean': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                    'p50': 1000 * percentile(latencies, 0.5),
+                    'p90': 1000 * percentile(latencies, 0.9),
+                    'p99': 1000 * percentile(latencies, 0.99),
+                    'max': 1000 * latencies[-1] if latencies else 0.0,
+                },
+            }
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SolverService:
+    '''Batches best-move requests onto a warm process pool and answers repeats from a shared cache.'''
+    def __init__(self, workers=None, batch_window=0.005, max_batch=64, cache_size=100000):
+        self.batch_window = batch_window # seconds the dispatcher waits for more requests to batch
+        self.max_batch = max_batch
+        self.cache_size = cache_size # answers kept, 0 disables the cache
+        self.cache = OrderedDict() # (agent, cells, options, time) -> answer
+        self.cache_lock = threading.Lock()
+        self.metrics = ServiceMetrics()
+        self.pool = multiprocessing.Pool(workers, initializer=init_worker)
+        self.queue = queue.Queue()
+        self.dispatcher = threading.Thread(target=self.dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def best_move(self, data):
+        """
+        Answers one /move request, blocking until it is solved. Raises ValueError for bad requests.
+        """
+        start = time.perf_counter()
+        try:
+            request = parse_request(data)
+        except ValueError:
+            self.metrics.record_error()
+            raise
+        agent, cells, options, time_limit = request
+        key = (agent, cells, tuple(sorted(options.items())), time_limit)
+        answer = self.cached(key) if cacheable(request) else None
+        cached = answer is not None
+        if not cached:
+            pending = PendingRequest(key, request)
+            self.queue.put(pending)
+            pending.done.wait()
+            if pending.error is not None:
+                self.metrics.record_error()
+                raise pending.error
+            answer = pending.answer
+        seconds = time.perf_counter() - start
+        self.metrics.record_request(agent, seconds, cached)
+        return dict(answer, seconds=seconds, cached=cached)
+
+    def cached(self, key):
+        with self.cache_lock:
+            answer = self.cache.get(key)
+            if answer is not None:
+                self.cache.move_to_end(key)
+            return answer
+
+    def remember(self, key, answer):
+        if not self.cache_size:
+            return
+        with self.cache_lock:
+            self.cache[key] = answer
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def dispatch(self):
+        # collects requests into batches; each batch is solved on its own thread so that
+        # a slow batch never holds back the next one
+        while True:
+            pending = self.queue.get()
+            if pending is None:
+                return
+            batch = [pending]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self.queue.put(None) # stop after this batch
+                    break
+                batch.append(pending)
+            threading.Thread(target=self.solve_batch, args=(batch,), daemon=True).start()
+
+    def solve_batch(self, batch):
+        groups = OrderedDict() # identical requests of a batch are solved once
+        for pending in batch:
+            groups.setdefault(pending.key, []).append(pending)
+        keys = list(groups)
+        self.metrics.record_batch(len(batch), len(keys))
+        tasks = [(index, *groups[key][0].request) for index, key in enumerate(keys)]
+        try:
+            for index, move, value, nodes, seconds in self.pool.imap_unordered(solve, tasks):
+                answer = {'move': move, 'value': value, 'nodes': nodes, 'search_seconds': seconds}
+                if cacheable(groups[keys[index]][0].request):
+                    self.remember(keys[index], answer)
+                for pending in groups.pop(keys[index]):
+                    pending.answer = answer
+                    pending.done.set()
+        except Exception as error: # a worker failed: fail whatever is still waiting
+            for waiting in groups.values():
+                for pending in waiting:
+                    pending.error = error
+                    pending.done.set()
+
+    def close(self):
+        self.queue.put(None)
+        self.dispatcher.join()
+        self.pool.close()
+        self.pool.join()
+
+
+class SolverHandler(BaseHTTPRequestHandler):
+    '''HTTP front end of the SolverService held by its server.'''
+    def do_POST(self):
+        if self.path != '/move':
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length) or b'{}')
+            self.send_json(200, self.server.service.best_move(data))
+        except ValueError as error: # bad JSON or a bad request
+            self.send_json(400, {'error': str(error)})
+        except Exception as error:
+            self.send_json(500, {'error': f'{type(error).__name__}: {error}'})
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self.send_json(200, self.server.service.metrics.snapshot())
+        elif self.path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SolverServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, SolverHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def request_move(board, agent='E', url=DEFAULT_URL, timeout=60, **options):
+    """
+    Asks a running service for a move, e.g. request_move(grid.cells, 'E', depth=2) or
+    request_move(grid.cells, 'MC', time=0.1). Returns the reply as a dict.
+    """
+    data = json.dumps(dict(options, board=board, agent=agent)).encode()
+    request = urllib_request.Request(url + '/move', data, {'Content-Type': 'application/json'})
+    with urllib_request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve best moves of the 2048 agents over local HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8048, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=None, help='solver processes (all cores by default)')
+    parser.add_argument('--batch-window', type=float, default=0.005, help='seconds to wait for requests to batch')
+    parser.add_argument('--max-batch', type=int, default=64, help='largest batch dispatched at once')
+    parser.add_argument('--cache-size', type=int, default=100000, help='answers kept in the shared cache')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    service = SolverService(args.workers, args.batch_window, args.max_batch, args.cache_size)
+    server = SolverServer((args.host, args.port), service, args.verbose)
+    print(f'Serving best moves on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
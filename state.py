@@ -0,0 +1,159 @@
+'''
+Lightweight immutable board states for searching without Game or Grid objects.
+
+A State is a tuple of row tuples, so it hashes and compares like the
+tuple(tuple(row) for row in cells) keys the agents already use. A move returns a
+new State plus the Grid.move reward, and rows that did not change are shared
+with the previous state instead of copied. Row results are memoized, so a move
+is a few dictionary lookups. States work for any board size.
+'''
+import random
+
+ACTIONS = ('up', 'down', 'left', 'right') # same order as Game.get_legal_actions
+
+ROW_CACHE = {} # row -> (row after a left move or None if it does not move, reward contribution, merge score)
+
+
+def slide_row(row):
+    """
+    Left move of one row with the compress/merge/compress steps of Grid.move_left.
+    Returns (new_row, reward, score), the reward being this row's share of Grid.move's.
+    new_row is row itself when nothing moves, so callers can test it with `is`.
+    """
+    entry = ROW_CACHE.get(row)
+    if entry is not None:
+        new_row, reward, score = entry
+        return (row if new_row is None else new_row), reward, score
+    size = len(row)
+    line = [v for v in row if v != 0]
+    line += [0] * (size - len(line))
+    score = 0
+    for i in range(size - 1):
+        if line[i] != 0 and line[i] == line[i + 1]:
+            line[i] *= 2
+            score += line[i]
+            line[i + 1] = 0
+    line = [v for v in line if v != 0]
+    line += [0] * (size - len(line))
+    new_row = tuple(line)
+    empty_delta = new_row.count(0) - row.count(0)
+    reward = score + empty_delta * 10 + sum(abs(a - b) for a, b in zip(new_row, row))
+    if new_row == row:
+        ROW_CACHE[row] = (None, reward, score)
+        return row, reward, score
+    ROW_CACHE[row] = (new_row, reward, score)
+    return new_row, reward, score
+
+
+def slide_row_right(row):
+    reversed_row = row[::-1]
+    new_row, reward, score = slide_row(reversed_row)
+    return (row if new_row is reversed_row else new_row[::-1]), reward, score
+
+
+class State(tuple):
+    '''Immutable board: a tuple of row tuples. It also provides the Grid methods the heuristics read.'''
+    __slots__ = ()
+
+    @classmethod
+    def from_cells(cls, cells):
+        return cls(tuple(row) for row in cells)
+
+    @property
+    def size(self):
+        return len(self)
+
+    @property
+    def cells(self):
+        return self
+
+    def move(self, action):
+        """
+        Returns (successor, reward, score) where reward is what Grid.move returns and
+        score is the merge score. The successor is self itself if nothing moved.
+        """
+        if action == 'left' or action == 'right':
+            slide = slide_row if action == 'left' else slide_row_right
+            rows = []
+            reward = score = 0
+            for row in self:
+                new_row, row_reward, row_score = slide(row)
+                rows.append(new_row)
+                reward += row_reward
+                score += row_score
+        else:
+            slide = slide_row if action == 'up' else slide_row_right
+            columns = []
+            reward = score = 0
+            for column in zip(*self):
+                new_column, column_reward, column_score = slide(column)
+                columns.append(new_column)
+                reward += column_reward
+                score += column_score
+            # share every row that the vertical move left unchanged
+            rows = [old if old == new else new for old, new in zip(self, zip(*columns))]
+        if all(new is old for new, old in zip(rows, self)):
+            return self, reward, score
+        return State(rows), reward, score
+
+    def legal_actions(self):
+        actions = []
+        columns = list(zip(*self))
+        if any(slide_row(column)[0] is not column for column in columns):
+            actions.append('up')
+        if any(slide_row_right(column)[0] is not column for column in columns):
+            actions.append('down')
+        if any(slide_row(row)[0] is not row for row in self):
+            actions.append('left')
+        if any(slide_row_right(row)[0] is not row for row in self):
+            actions.append('right')
+        return actions
+
+    def spawn(self, cell, value):
+        i, j = cell
+        row = self[i]
+        return State(self[:i] + (row[:j] + (value,) + row[j + 1:],) + self[i + 1:])
+
+    def spawn_random(self, rng=random):
+        """
+        Adds a random 2 (90%) or 4 (10%) tile, consuming randomness exactly like Grid.random_cell.
+        """
+        cell = rng.choice(self.retrieve_empty_cells())
+        return self.spawn(cell, 2 if rng.random() < 0.9 else 4)
+
+    def symmetries(self):
+        """
+        The 8 rotations and reflections as tuples of rows, in the transform order of bitboard.symmetries.
+        """
+        mirrored = tuple(row[::-1] for row in self)
+        transposed = tuple(zip(*self))
+        transposed_mirrored = tuple(row[::-1] for row in transposed)
+        return (self, mirrored, self[::-1], mirrored[::-1],
+                transposed, transposed_mirrored, transposed[::-1], transposed_mirrored[::-1])
+
+    def canonical(self):
+        """
+        Returns (canonical_rows, transform) like bitboard.canonical, comparing boards as tuples of rows.
+        """
+        images = self.symmetries()
+        smallest = min(images)
+        return smallest, images.index(smallest)
+
+    def canonical_key(self):
+        return min(self.symmetries())
+
+    def retrieve_empty_cells(self):
+        return [(i, j) for i, row in enumerate(self) for j, value in enumerate(row) if value == 0]
+
+    def has_empty_cells(self):
+        return any(0 in row for row in self)
+
+    def found_2048(self):
+        return any(2048 in row for row in self)
+
+    def max_tile(self):
+        return max(max(row) for row in self)
+
+    def is_terminal(self):
+        # same rule as ExpectimaxAI.is_terminal: a 2048 tile or no legal move left
+        return self.found_2048() or not self.legal_actions()
@@ -0,0 +1,98 @@
+'''
+Per-move search statistics for the agents.
+
+An agent built with stats=True owns a StatsCollector and fills one MoveStats
+record per get_action call. Agents without stats skip all of the bookkeeping.
+Collectors can be merged, so numbers from the games of a run_tests batch (or
+from worker processes, as plain dicts) add up to a single summary.
+'''
+
+FIELDS = ('latency', 'nodes', 'evaluations', 'cache_hits', 'cache_misses',
+          'move_generation_seconds', 'evaluation_seconds', 'rollouts', 'rollout_steps')
+
+
+class MoveStats:
+    '''Work done by one get_action call.
+
+    Expectimax fills nodes (and nodes_per_ply, ply 1 being the chance nodes below the root
+    moves), leaf evaluations and cache hits. Monte Carlo fills rollouts and rollout_steps;
+    its evaluations are utility lookups, its evaluation time is spent backing up returns,
+    and the rest of the move counts as move generation.
+    '''
+    __slots__ = FIELDS + ('nodes_per_ply',)
+
+    def __init__(self):
+        for name in FIELDS:
+            setattr(self, name, 0)
+        self.nodes_per_ply = []
+
+    def count_node(self, ply):
+        while len(self.nodes_per_ply) <= ply:
+            self.nodes_per_ply.append(0)
+        self.nodes_per_ply[ply] += 1
+
+    def as_dict(self):
+        record = {name: getattr(self, name) for name in FIELDS}
+        record['nodes_per_ply'] = list(self.nodes_per_ply)
+        return record
+
+
+class StatsCollector:
+    '''The MoveStats records of an agent, summarized across moves, games and processes.'''
+    def __init__(self):
+        self.moves = []
+
+    def __len__(self):
+        return len(self.moves)
+
+    def start_move(self):
+        record = MoveStats()
+        self.moves.append(record)
+        return record
+
+    def records(self):
+        return [record.as_dict() for record in self.moves]
+
+    def merge(self, records):
+        """
+        Adds the records of another collector, or a list of dicts from records().
+        """
+        for record in getattr(records, 'moves', records):
+            if isinstance(record, dict):
+                move = MoveStats()
+                for name in FIELDS:
+                    setattr(move, name, record[name])
+                move.nodes_per_ply = list(record['nodes_per_ply'])
+                record = move
+            self.moves.append(record)
+
+    def summary(self):
+        moves = len(self.moves)
+        totals = {name: sum(getattr(record, name) for record in self.moves) for name in FIELDS}
+        nodes_per_ply = []
+        for record in self.moves:
+            for ply, nodes in enumerate(record.nodes_per_ply):
+                if ply == len(nodes_per_ply):
+                    nodes_per_ply.append(0)
+                nodes_per_ply[ply] += nodes
+        lookups = totals['cache_hits'] + totals['cache_misses']
+        return {
+            'moves': moves,
+            'totals': totals,
+            'nodes_per_ply': nodes_per_ply,
+            'mean_latency': totals['latency'] / moves if moves else 0.0,
+            'max_latency': max((record.latency for record in self.moves), default=0.0),
+            'nodes_per_sec': totals['nodes'] / totals['latency'] if totals['latency'] else 0.0,
+            'cache_hit_rate': totals['cache_hits'] / lookups if lookups else 0.0,
+            'mean_rollout_length': totals['rollout_steps'] / totals['rollouts'] if totals['rollouts'] else 0.0,
+        }
+
+    def report(self):
+        summary = self.summary()
+        totals = summary['totals']
+        return (f"Moves: {summary['moves']}, mean latency: {1000 * summary['mean_latency']:.1f} ms, "
+                f"max latency: {1000 * summary['max_latency']:.1f} ms, nodes: {totals['nodes']}, "
+                f"evaluations: {totals['evaluations']}, cache hit rate: {summary['cache_hit_rate']:.1%}, "
+                f"rollouts: {totals['rollouts']}, mean rollout length: {summary['mean_rollout_length']:.1f}, "
+                f"move generation: {totals['move_generation_seconds']:.2f} s, "
+                f"evaluation: {totals['evaluation_seconds']:.2f} s")
@@ -0,0 +1,50 @@
+'''
+Tests of batch.py: the vectorized moves and spawns have to agree with bitboard.py
+board by board on seeded random boards.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import unittest
+
+import bitboard
+from test_engines import MAX_4X4_EXPONENT, random_cells
+
+try:
+    import numpy as np
+    import batch
+except ImportError: # numpy is optional
+    batch = None
+
+
+@unittest.skipIf(batch is None, 'numpy is not installed')
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(9)
+        self.boards = [bitboard.encode(random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT)) for _ in range(300)]
+        self.boards.append(bitboard.encode([[2, 4, 8, 16], [4, 8, 16, 32], [2, 4, 8, 16], [4, 8, 16, 32]])) # no move left
+
+    def test_moves_match_bitboard(self):
+        after, rewards, legal = batch.move_all(batch.to_array(self.boards))
+        for k, action in enumerate(bitboard.ACTIONS):
+            for i, board in enumerate(self.boards):
+                result, reward, _ = bitboard.move(board, action)
+                self.assertEqual((int(after[k, i]), int(rewards[k, i]), bool(legal[k, i])),
+                                 (result, reward, result != board))
+
+    def test_spawn_adds_one_small_tile(self):
+        spawned = batch.spawn(batch.to_array(self.boards), np.random.default_rng(1))
+        for board, result in zip(self.boards, spawned.tolist()):
+            if not bitboard.empty_cells(board):
+                self.assertEqual(result, board)
+                continue
+            added = [cell for cell in bitboard.empty_cells(board) if cell not in bitboard.empty_cells(result)]
+            self.assertEqual(len(added), 1)
+            i, j = added[0]
+            self.assertIn(bitboard.decode(result)[i][j], (2, 4))
+            self.assertEqual(result & ~(0xF << (4 * (4 * i + j))), board)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+'''
+Tests of driver.py: GameDriver plays by the rules of the original recursive
+Game.run_ai (win check, spawn after a legal move, game over), run_many plays
+several games to their end, and BackgroundSearch returns a move within its deadline.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import time
+import unittest
+
+from core import Game, Grid
+from driver import BackgroundSearch, GameDriver, run_many
+from expectimax import ExpectimaxAI
+
+
+class RandomAI:
+    '''Plays a seeded random legal move.'''
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def get_action(self, game):
+        return self.rng.choice(game.get_legal_actions())
+
+
+class ScriptedAI:
+    '''Plays the given moves in order.'''
+    def __init__(self, moves):
+        self.moves = list(moves)
+        self.calls = 0
+
+    def get_action(self, game):
+        self.calls += 1
+        return self.moves.pop(0)
+
+
+def new_game(ai, cells=None):
+    game = Game(Grid(len(cells) if cells else 4), None, None, testing_mode=True)
+    game.ai = ai
+    if cells is None:
+        game.add_start_cells()
+    else:
+        game.grid.set_cells([row[:] for row in cells])
+    return game
+
+
+class GameDriverTest(unittest.TestCase):
+
+    def test_plays_to_the_end(self):
+        random.seed(1)
+        game = new_game(RandomAI(1))
+        result = GameDriver(game).run()
+        self.assertTrue(result['finished'])
+        self.assertTrue(result['over'] or result['won'])
+        self.assertTrue(game.is_game_terminated())
+        self.assertEqual(result['score'], game.grid.getScore())
+        self.assertEqual(result['max_tile'], max(max(row) for row in game.grid.cells))
+        self.assertEqual(len(result['move_times']), result['moves'])
+
+    def test_max_moves(self):
+        random.seed(2)
+        driver = GameDriver(new_game(RandomAI(2)))
+        result = driver.run(max_moves=10)
+        self.assertEqual(result['moves'], 10)
+        self.assertFalse(result['finished'])
+        self.assertEqual(driver.run(max_moves=5)['moves'], 15) # resumes where it stopped
+
+    def test_win_stops_without_spawn(self):
+        cells = [[1024, 1024, 0, 0], [0] * 4, [0] * 4, [0] * 4]
+        ai = ScriptedAI(['left'])
+        game = new_game(ai, cells)
+        result = GameDriver(game).run()
+        self.assertEqual(game.grid.cells, [[2048, 0, 0, 0], [0] * 4, [0] * 4, [0] * 4])
+        self.assertEqual((result['won'], result['over'], result['moves'], result['score']), (True, False, 1, 2048))
+        self.assertIsNone(GameDriver(game).step()) # a won game is terminated
+        self.assertEqual(ai.calls, 1)
+
+    def test_game_over_after_last_spawn(self):
+        # moving right leaves one empty cell, and neither a 2 nor a 4 there can merge
+        cells = [[2, 4, 2, 4], [4, 2, 4, 2], [8, 4, 2, 4], [16, 32, 64, 0]]
+        game = new_game(ScriptedAI(['right']), cells)
+        result = GameDriver(game).run()
+        self.assertEqual(game.grid.cells[3][1:], [16, 32, 64])
+        self.assertIn(game.grid.cells[3][0], (2, 4))
+        self.assertEqual((result['over'], result['won'], result['finished'], result['moves']), (True, False, True, 1))
+
+    def test_run_many(self):
+        random.seed(3)
+        games = [new_game(RandomAI(seed)) for seed in range(3)]
+        results = run_many(games)
+        self.assertEqual(len(results), 3)
+        for game, result in zip(games, results):
+            self.assertTrue(result['finished'])
+            self.assertEqual(result['score'], game.grid.getScore())
+        partial = run_many([new_game(RandomAI(seed)) for seed in range(3, 5)], max_moves=7)
+        self.assertEqual([result['moves'] for result in partial], [7, 7])
+
+
+class BackgroundSearchTest(unittest.TestCase):
+
+    def test_move_within_deadline(self):
+        random.seed(4)
+        game = new_game(None)
+        cells = [row[:] for row in game.grid.cells]
+        ai = ExpectimaxAI(None, depth=20, backend='bitboard') # far too deep to finish in time
+        search = BackgroundSearch(ai, time_limit=0.3).start(game)
+        polls = 0
+        while not search.done():
+            polls += 1
+            time.sleep(0.01)
+        self.assertGreater(polls, 0) # the caller kept running while the agent searched
+        self.assertIn(search.move, game.get_legal_actions())
+        self.assertLess(search.seconds, 2.0)
+        self.assertEqual(game.grid.cells, cells) # the agent searched a snapshot
+
+
+if __name__ == '__main__':
+    unittest.main()
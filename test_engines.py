@@ -0,0 +1,114 @@
+'''
+Equivalence tests of the board engines (bitboard.py, state.py and packed.py) against
+Grid.move on seeded random boards.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import unittest
+
+import bitboard
+import packed
+from core import Game, Grid
+from state import ACTIONS, State
+
+MAX_4X4_EXPONENT = 14 # two 2^15 tiles would merge past the 4-bit nibbles of a bitboard
+
+
+def random_cells(rng, size, max_exponent=11, empty=0.4):
+    return [[0 if rng.random() < empty else 1 << rng.randint(1, max_exponent) for _ in range(size)]
+            for _ in range(size)]
+
+
+def grid_move(cells, action):
+    """
+    Reference move: (cells, reward, score) with the cells and reward of Grid.move and the
+    merge score the game adds when the move is played (Game.apply_action).
+    """
+    grid = Grid(len(cells))
+    grid.set_cells([row[:] for row in cells])
+    reward = grid.move(action)
+    game = Game(Grid(len(cells)), None, None, testing_mode=True)
+    game.grid.set_cells([row[:] for row in cells])
+    game.apply_action(action)
+    assert game.grid.cells == grid.cells
+    return grid.cells, reward, game.grid.getScore()
+
+
+def grid_legal_actions(cells):
+    return [action for action in ACTIONS if grid_move(cells, action)[0] != cells]
+
+
+class EngineTest(unittest.TestCase):
+
+    def test_bitboard_matches_grid(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            cells = random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT)
+            board = bitboard.encode(cells)
+            self.assertEqual(bitboard.decode(board), cells)
+            for action in ACTIONS:
+                expected, reward, score = grid_move(cells, action)
+                result, board_reward, board_score = bitboard.move(board, action)
+                self.assertEqual(bitboard.decode(result), expected)
+                self.assertEqual((board_reward, board_score), (reward, score))
+            self.assertEqual(bitboard.legal_actions(board), grid_legal_actions(cells))
+            grid = Grid(4)
+            grid.set_cells(cells)
+            self.assertEqual(bitboard.empty_cells(board), grid.retrieve_empty_cells())
+
+    def test_bitboard_never_wraps(self):
+        cells = [[1 << 15, 1 << 15, 2, 2], [0] * 4, [0] * 4, [0] * 4]
+        board = bitboard.encode(cells)
+        result, reward, score = bitboard.move(board, 'left')
+        self.assertEqual(bitboard.decode(result)[0], [1 << 15, 1 << 15, 4, 0]) # the 32768 pair stays apart
+        self.assertEqual(score, 4)
+        self.assertNotIn('left', bitboard.legal_actions(bitboard.encode([[1 << 15, 1 << 15, 0, 0]] + cells[1:])))
+        self.assertRaises(ValueError, bitboard.encode, [[1 << 16, 0, 0, 0]] + cells[1:])
+        self.assertTrue(bitboard.may_overflow([[1 << 14] * 4] + cells[1:], 1))
+        self.assertFalse(bitboard.may_overflow([[1 << 14] * 3] + cells[1:], 4))
+
+    def test_state_matches_grid(self):
+        rng = random.Random(2)
+        for size in (4, 5):
+            for _ in range(150):
+                cells = random_cells(rng, size)
+                state = State.from_cells(cells)
+                for action in ACTIONS:
+                    expected, reward, score = grid_move(cells, action)
+                    result, state_reward, state_score = state.move(action)
+                    self.assertEqual([list(row) for row in result], expected)
+                    self.assertEqual((state_reward, state_score), (reward, score))
+                self.assertEqual(state.legal_actions(), grid_legal_actions(cells))
+
+    def test_packed_matches_grid(self):
+        rng = random.Random(3)
+        for size in (4, 5, 6):
+            engine = packed.engine(size)
+            for _ in range(100):
+                cells = random_cells(rng, size, max_exponent=20)
+                board = engine.encode(cells)
+                self.assertEqual(engine.decode(board), cells)
+                for action in ACTIONS:
+                    expected, reward, score = grid_move(cells, action)
+                    result, board_reward, board_score = engine.move(board, action)
+                    self.assertEqual(engine.decode(result), expected)
+                    self.assertEqual((board_reward, board_score), (reward, score))
+                self.assertEqual(engine.legal_actions(board), grid_legal_actions(cells))
+
+    def test_symmetries_agree_across_engines(self):
+        rng = random.Random(4)
+        engine = packed.engine(4)
+        for _ in range(100):
+            cells = random_cells(rng, 4)
+            transposed = [list(column) for column in zip(*cells)]
+            board = bitboard.encode(cells)
+            self.assertEqual(bitboard.transpose(board), bitboard.encode(transposed))
+            self.assertEqual(bitboard.transpose_key(board), bitboard.transpose_key(bitboard.encode(transposed)))
+            images = [bitboard.decode(image) for image in bitboard.symmetries(board)]
+            self.assertEqual(images, [engine.decode(image) for image in engine.symmetries(engine.encode(cells))])
+            self.assertEqual(images, [[list(row) for row in image] for image in State.from_cells(cells).symmetries()])
+
+
+if __name__ == '__main__':
+    unittest.main()
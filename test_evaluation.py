@@ -0,0 +1,134 @@
+'''
+Tests of evaluation.py: the heuristic tables (4x4 and packed) have to score seeded
+random boards exactly like ExpectimaxAI.calculate_score, with the default and with
+custom weights, also after a round trip through the cache file.
+
+    python -m unittest   (or python -m pytest)
+'''
+import os
+import random
+import tempfile
+import unittest
+
+import bitboard
+import evaluation
+import packed
+from core import Grid
+from evaluation import DEFAULT_WEIGHTS, HeuristicTables, complete_weights, load_tables
+from expectimax import ExpectimaxAI
+from test_engines import MAX_4X4_EXPONENT, random_cells
+
+CUSTOM_WEIGHTS = complete_weights({'empty': 150, 'corner': 7, 'smoothness': 0.5, 'border': -3})
+
+
+class EvaluatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ai = ExpectimaxAI(None, evaluator='heuristic')
+
+    def reference_score(self, cells, weights):
+        grid = Grid(len(cells))
+        grid.set_cells(cells)
+        self.ai.heuristic_weights = weights
+        return self.ai.calculate_score(grid)
+
+    def test_tables_match_calculate_score(self):
+        rng = random.Random(5)
+        tables = load_tables()
+        for _ in range(300):
+            cells = random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT)
+            board = bitboard.encode(cells)
+            for weights in (DEFAULT_WEIGHTS, CUSTOM_WEIGHTS):
+                self.assertAlmostEqual(tables.score(board, weights), self.reference_score(cells, weights))
+
+    def test_packed_tables_match_calculate_score(self):
+        rng = random.Random(6)
+        for size in (5, 6):
+            engine = packed.engine(size)
+            tables = load_tables(size=size)
+            for _ in range(100):
+                cells = random_cells(rng, size, max_exponent=20)
+                for weights in (DEFAULT_WEIGHTS, CUSTOM_WEIGHTS):
+                    self.assertAlmostEqual(tables.score(engine.encode(cells), weights),
+                                           self.reference_score(cells, weights))
+
+    def test_score_many_matches_score(self):
+        try:
+            import numpy as np
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        rng = random.Random(7)
+        tables = load_tables()
+        boards = [bitboard.encode(random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT)) for _ in range(300)]
+        for weights in (DEFAULT_WEIGHTS, CUSTOM_WEIGHTS):
+            scores = tables.score_many(np.array(boards, dtype=np.uint64), weights).tolist()
+            for board, score in zip(boards, scores):
+                self.assertAlmostEqual(score, tables.score(board, weights))
+
+    def test_cache_file_round_trip(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'tables.bin')
+        try:
+            built = HeuristicTables(path) # builds the tables and writes the cache
+            loaded = HeuristicTables(path)
+            self.assertEqual(loaded.border, built.border)
+            rng = random.Random(8)
+            for _ in range(50):
+                board = bitboard.encode(random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT))
+                self.assertEqual(loaded.score(board), built.score(board))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+    def test_bad_cache_files_are_rebuilt(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'tables.bin')
+        try:
+            built = HeuristicTables(path)
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                good = f.read()
+
+            def corrupt(offset, value):
+                data = bytearray(good)
+                data[offset] ^= value
+                return bytes(data)
+            cases = {
+                'truncated': good[:100], # not even whole int64s
+                'cut short': good[:size - 8],
+                'empty': b'',
+                'flipped bit': corrupt(size - 3, 1), # the checksum no longer matches
+                'old version': corrupt(8, 0xFF),
+                'not a cache': corrupt(0, 0xFF),
+            }
+            for name, data in cases.items():
+                with open(path, 'wb') as f:
+                    f.write(data)
+                self.assertIsNone(built.load(path), name)
+                self.assertEqual(HeuristicTables(path).border, built.border, name)
+                with open(path, 'rb') as f:
+                    self.assertEqual(f.read(), good, name) # and written back
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+    def test_shared_tables_follow_the_cache_path(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'tables.bin')
+        try:
+            tables = load_tables(path)
+            self.assertTrue(os.path.exists(path)) # not answered by tables loaded for another path
+            self.assertIs(load_tables(path), tables)
+            self.assertIsNot(load_tables(), tables)
+        finally:
+            evaluation.heuristic_tables.pop(path, None)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+'''
+Round-trip tests of gamelog.py: games recorded through GameDriver are read back and
+replayed into the same positions, moves and scores, in memory and through a file.
+
+    python -m unittest   (or python -m pytest)
+'''
+import os
+import random
+import struct
+import tempfile
+import unittest
+
+import bitboard
+from core import Game, Grid
+from driver import GameDriver
+from gamelog import HEADER, MAGIC, GameRecorder, final_board, parse_records, read_games, replay
+from test_driver import RandomAI
+
+
+def play_recorded(recorder, seed, size=4, max_moves=None):
+    """
+    Plays one seeded random game into recorder. Returns the finished Game and its moves.
+    """
+    random.seed(seed)
+    game = Game(Grid(size), None, None, testing_mode=True)
+    game.ai = RandomAI(seed)
+    game.add_start_cells()
+    driver = GameDriver(game, recorder, seed)
+    positions = []
+    while not driver.finished and (max_moves is None or driver.moves < max_moves):
+        positions.append([row[:] for row in game.grid.cells])
+        driver.step()
+    driver.finish_record()
+    return game, positions
+
+
+def as_cells(board):
+    if type(board) is int:
+        return bitboard.decode(board)
+    return [list(row) for row in board]
+
+
+class GameLogTest(unittest.TestCase):
+
+    def check_record(self, record, game, positions):
+        self.assertEqual(record.score, game.grid.getScore())
+        self.assertEqual(sum(record.rewards), record.score)
+        self.assertEqual(record.max_tile, max(max(row) for row in game.grid.cells))
+        self.assertEqual(as_cells(final_board(record)), game.grid.cells)
+        replayed = [as_cells(board) for board, action, reward, seconds in replay(record)]
+        self.assertEqual(replayed, positions)
+
+    def test_round_trip_in_memory(self):
+        recorder = GameRecorder()
+        games = [play_recorded(recorder, seed, size) for seed, size in ((1, 4), (2, 4), (3, 5), (4, 6))]
+        records = list(parse_records(recorder.take()))
+        self.assertEqual(len(records), len(games))
+        for record, (game, positions), seed in zip(records, games, (1, 2, 3, 4)):
+            self.assertEqual(record.seed, seed)
+            self.assertEqual(record.size, game.grid.size)
+            self.assertTrue(record.over or record.won) # played to the end
+            self.check_record(record, game, positions)
+
+    def test_round_trip_through_file(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'games.log')
+        try:
+            recorder = GameRecorder(path, flush_bytes=256) # small batches, so appends are exercised too
+            games = [play_recorded(recorder, seed, max_moves=50 if seed == 7 else None) for seed in range(5, 9)]
+            recorder.close()
+            records = list(read_games(path))
+            self.assertEqual(len(records), len(games))
+            for record, (game, positions) in zip(records, games):
+                self.check_record(record, game, positions)
+            self.assertFalse(records[2].over) # stopped after 50 moves
+            self.assertEqual(len(records[2]), 50)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+    def test_columns_are_little_endian(self):
+        recorder = GameRecorder()
+        play_recorded(recorder, 9, max_moves=20)
+        data = recorder.take()
+        record = next(parse_records(data))
+        moves = len(record)
+        columns = data[HEADER.size + len(record.start) + 3 * moves:]
+        self.assertEqual(columns[:4 * moves], struct.pack(f'<{moves}i', *record.rewards))
+        self.assertEqual(columns[4 * moves:], struct.pack(f'<{moves}f', *record.seconds))
+
+    def test_truncated_log(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'games.log')
+        try:
+            recorder = GameRecorder(path)
+            for seed in (10, 11):
+                play_recorded(recorder, seed, max_moves=30)
+            recorder.close()
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 5)
+            games = read_games(path)
+            self.assertEqual(len(next(games)), 30) # whole records before the cut are still read
+            self.assertRaises(ValueError, next, games)
+            with open(path, 'rb') as f:
+                data = f.read()
+            self.assertRaises(ValueError, list, parse_records(data, len(MAGIC)))
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
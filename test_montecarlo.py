@@ -0,0 +1,33 @@
+'''
+Tests of the MonteCarloAI settings: every backend scores moves with the smallest
+rollout budget, and budgets that cannot score a move are rejected up front.
+
+    python -m unittest   (or python -m pytest)
+'''
+import math
+import random
+import unittest
+
+from core import Game, Grid
+from montecarlo import MonteCarloAI
+
+
+class MonteCarloSettingsTest(unittest.TestCase):
+
+    def test_smallest_budget(self):
+        random.seed(1)
+        game = Game(Grid(4), None, None, testing_mode=True)
+        game.add_start_cells()
+        for backend in ('grid', 'bitboard', 'numpy'):
+            ai = MonteCarloAI(None, simulations=1, max_depth=1, backend=backend, seed=1)
+            self.assertIn(ai.get_action(game), game.get_legal_actions())
+            self.assertTrue(math.isfinite(ai.value))
+
+    def test_rejects_empty_budgets(self):
+        for options in ({'simulations': 0}, {'simulations': -5}, {'max_depth': 0}, {'max_depth': -1}):
+            with self.assertRaises(ValueError, msg=str(options)):
+                MonteCarloAI(None, backend='numpy', **options)
+
+
+if __name__ == '__main__':
+    unittest.main()
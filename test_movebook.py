@@ -0,0 +1,101 @@
+'''
+Tests of movebook.py: book files round-trip, lookups map the stored move into every
+orientation of a position, and ExpectimaxAI plays book moves only for entries
+searched deep enough.
+
+    python -m unittest   (or python -m pytest)
+'''
+import os
+import random
+import tempfile
+import unittest
+
+import bitboard
+from core import Game, Grid
+from expectimax import ExpectimaxAI
+from movebook import MoveBook, read_book, search_settings, write_book
+from ntuple import NTupleNetwork
+from test_search import random_positions
+
+
+class MoveBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'book.bin')
+        rng = random.Random(1)
+        self.entries = {}
+        for cells in random_positions(16, 20):
+            key = bitboard.canonical(bitboard.encode(cells))[0]
+            self.entries[key] = (rng.choice(bitboard.legal_actions(key)), rng.uniform(0, 5000), rng.randint(1, 4))
+        write_book(self.path, self.entries)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rmdir(self.directory)
+
+    def test_round_trip(self):
+        self.assertEqual(read_book(self.path), self.entries)
+        book = MoveBook(self.path)
+        try:
+            self.assertEqual(len(book), len(self.entries))
+            for key, entry in self.entries.items():
+                self.assertEqual(book.lookup(key), entry)
+                self.assertIsNone(book.lookup(key, entry[2] + 1)) # not searched deep enough
+            self.assertIsNone(book.lookup(bitboard.encode([[2, 0, 0, 0], [0] * 4, [0] * 4, [0] * 4])))
+            self.assertEqual((book.hits, book.misses), (len(self.entries), len(self.entries) + 1))
+        finally:
+            book.close()
+        with open(self.path, 'r+b') as f:
+            f.write(b'NOTABOOK')
+        self.assertRaises(ValueError, MoveBook, self.path)
+
+    def test_lookup_in_every_orientation(self):
+        book = MoveBook(self.path)
+        try:
+            for key, (action, value, depth) in self.entries.items():
+                played = bitboard.canonical(bitboard.move(key, action)[0])[0]
+                for image in bitboard.symmetries(key):
+                    image_action, image_value, image_depth = book.lookup(image)
+                    self.assertEqual((image_value, image_depth), (value, depth))
+                    # the mapped move leads to an image of the position the stored move leads to
+                    self.assertEqual(bitboard.canonical(bitboard.move(image, image_action)[0])[0], played)
+        finally:
+            book.close()
+
+    def test_agent_plays_book_moves(self):
+        key, (action, value, depth) = next((key, entry) for key, entry in self.entries.items() if entry[2] >= 2)
+        grid = Grid(4)
+        grid.set_cells(bitboard.decode(key))
+        game = Game(grid, None, None, testing_mode=True)
+        ai = ExpectimaxAI(None, depth=2, backend='bitboard', book=self.path)
+        self.assertEqual(ai.get_action(game), action)
+        self.assertEqual((ai.value, ai.nodes), (value, 0))
+        deeper = ExpectimaxAI(None, depth=depth + 1, backend='bitboard', book=self.path) # searches live
+        deeper.get_action(game)
+        self.assertGreater(deeper.nodes, 0)
+        ai.book.close()
+        deeper.book.close()
+
+    def test_book_settings_must_match(self):
+        weights = {'empty': 150, 'border': -3}
+        book = MoveBook(self.path)
+        self.assertEqual(book.settings, search_settings())
+        book.close()
+        ExpectimaxAI(None, evaluator='heuristic', book=self.path).book.close() # scores leaves like 'tables'
+        for options in ({'heuristic_weights': weights}, {'evaluator': 'ntuple', 'weights': NTupleNetwork()}):
+            self.assertRaises(ValueError, ExpectimaxAI, None, book=self.path, **options)
+
+        write_book(self.path, self.entries, search_settings(heuristic_weights=weights))
+        key, (action, value, depth) = next(iter(self.entries.items()))
+        grid = Grid(4)
+        grid.set_cells(bitboard.decode(key))
+        ai = ExpectimaxAI(None, depth=1, backend='bitboard', book=self.path, heuristic_weights=dict(weights))
+        self.assertEqual(ai.get_action(Game(grid, None, None, testing_mode=True)), action)
+        ai.book.close()
+        self.assertRaises(ValueError, ExpectimaxAI, None, book=self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
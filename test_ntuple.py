@@ -0,0 +1,84 @@
+'''
+Tests of ntuple.py: the network is symmetric, a TD(0) update moves a value towards
+its target, training is reproducible from a seed, and checkpoints round-trip.
+
+    python -m unittest   (or python -m pytest)
+'''
+import os
+import random
+import tempfile
+import unittest
+
+import bitboard
+from ntuple import NTupleNetwork, play_training_game, train
+from test_engines import MAX_4X4_EXPONENT, random_cells
+
+
+def random_boards(seed, count):
+    rng = random.Random(seed)
+    return [bitboard.encode(random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT)) for _ in range(count)]
+
+
+class NTupleTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.network = NTupleNetwork()
+        train(cls.network, 3, seed=1, verbose=False)
+
+    def test_symmetric_values(self):
+        for board in random_boards(1, 50):
+            value = self.network.value(board)
+            for image in bitboard.symmetries(board):
+                self.assertAlmostEqual(self.network.value(image), value)
+            lowest, highest = self.network.bounds()
+            self.assertLessEqual(lowest, value)
+            self.assertLessEqual(value, highest)
+
+    def test_td_update_moves_towards_target(self):
+        network = NTupleNetwork()
+        train(network, 2, seed=2, verbose=False)
+        for board in random_boards(2, 50):
+            before = network.value(board)
+            target = before + 100.0
+            network.update(board, 0.001 * (target - before))
+            after = network.value(board)
+            self.assertGreater(after, before)
+            self.assertLess(abs(target - after), abs(target - before))
+        self.assertIsNone(network.bounds_cache) # stale bounds are dropped
+
+    def test_training_is_seeded(self):
+        first, second = NTupleNetwork(), NTupleNetwork()
+        results = [train(network, 2, seed=3, verbose=False) for network in (first, second)]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(first.weights, second.weights)
+        self.assertEqual(first.games, 2)
+        self.assertTrue(any(any(table) for table in first.weights))
+        score, max_tile, moves = play_training_game(first, 0.0025, random.Random(4))
+        self.assertGreater(moves, 0)
+        self.assertEqual(score % 4, 0) # merge scores are sums of tiles of 4 or more
+
+    def test_save_load_round_trip(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'weights.bin')
+        try:
+            self.network.save(path)
+            loaded = NTupleNetwork.load(path)
+            self.assertEqual((loaded.tuples, loaded.games), (self.network.tuples, self.network.games))
+            self.assertEqual(loaded.weights, self.network.weights)
+            for board in random_boards(5, 20):
+                self.assertEqual(loaded.value(board), self.network.value(board))
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 8)
+            self.assertRaises(ValueError, NTupleNetwork.load, path)
+            with open(path, 'r+b') as f:
+                f.write(b'NOTNTUPL')
+            self.assertRaises(ValueError, NTupleNetwork.load, path)
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
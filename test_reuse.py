@@ -0,0 +1,80 @@
+'''
+Tests of search reuse between moves: the realized successor is answered from the
+previous move's work, and reuse=False starts every move from scratch.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import time
+import unittest
+
+from core import Game, Grid
+from expectimax import ExpectimaxAI
+from montecarlo import MonteCarloAI
+
+
+def play(ai, seed, moves):
+    """
+    Plays a seeded game with ai for the given number of moves. Returns the moves played.
+    """
+    random.seed(seed)
+    game = Game(Grid(4), None, None, testing_mode=True)
+    game.add_start_cells()
+    played = []
+    for _ in range(moves):
+        if game.is_game_terminated() or not game.get_legal_actions():
+            break
+        action = ai.get_action(game)
+        played.append(action)
+        game.apply_action(action)
+        game.grid.random_cell()
+    return played
+
+
+class ReuseTest(unittest.TestCase):
+
+    def test_expectimax_reuse_keeps_moves(self):
+        for backend in ('grid', 'bitboard'):
+            nodes = []
+            moves = []
+            for reuse in (True, False):
+                ai = ExpectimaxAI(None, depth=2, backend=backend, reuse=reuse, stats=True)
+                moves.append(play(ai, 1, 30))
+                nodes.append(ai.stats.summary()['totals']['nodes'])
+            self.assertEqual(moves[0], moves[1])
+            self.assertLess(nodes[0], nodes[1])
+
+    def test_anytime_search_starts_at_reused_depth(self):
+        ai = ExpectimaxAI(None, depth=3, backend='bitboard')
+        random.seed(2)
+        game = Game(Grid(4), None, None, testing_mode=True)
+        game.add_start_cells()
+        game.apply_action(ai.get_action(game, time.perf_counter() + 60.0))
+        self.assertEqual(ai.completed_depth, 3)
+        game.grid.random_cell()
+        ai.get_action(game, time.perf_counter() + 60.0)
+        self.assertEqual(ai.reused_depth, 1) # the successor was a depth-2 max node of the previous tree
+        fresh = ExpectimaxAI(None, depth=3, backend='bitboard', reuse=False)
+        fresh.get_action(game, time.perf_counter() + 60.0)
+        self.assertEqual(fresh.reused_depth, 0)
+
+    def test_monte_carlo_reuses_rollouts(self):
+        for backend in ('grid', 'bitboard', 'numpy'):
+            reused = []
+            for reuse in (True, False):
+                ai = MonteCarloAI(None, simulations=30, max_depth=5, backend=backend, seed=3, reuse=reuse)
+                counts = []
+                random.seed(3)
+                game = Game(Grid(4), None, None, testing_mode=True)
+                game.add_start_cells()
+                for _ in range(5):
+                    game.apply_action(ai.get_action(game))
+                    game.grid.random_cell()
+                    counts.append(ai.reused)
+                reused.append(sum(counts))
+            self.assertGreater(reused[0], 0)
+            self.assertEqual(reused[1], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+'''
+Value tests of the expectimax search variants: every backend, cache keying, frontier
+batching, pool and pruning option has to return the values of the plain serial search
+on the same seeded positions.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import unittest
+
+import bitboard
+from core import Game, Grid
+from expectimax import ExpectimaxAI
+from state import State
+
+
+def random_positions(seed, count, size=4, max_moves=120):
+    """
+    Seeded mid-game positions reached by random play, as lists of rows.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = State.from_cells([[0] * size for _ in range(size)]).spawn_random(rng).spawn_random(rng)
+        for _ in range(rng.randint(1, max_moves)):
+            actions = state.legal_actions()
+            if not actions:
+                break
+            state = state.move(rng.choice(actions))[0].spawn_random(rng)
+        if state.legal_actions():
+            positions.append([list(row) for row in state])
+    return positions
+
+
+def search(ai, cells):
+    """
+    Returns (action, value) of one get_action call on cells.
+    """
+    grid = Grid(len(cells))
+    grid.set_cells([row[:] for row in cells])
+    action = ai.get_action(Game(grid, None, None, testing_mode=True))
+    return action, ai.value
+
+
+class SearchTest(unittest.TestCase):
+
+    def assert_same_values(self, ai, reference, positions):
+        for cells in positions:
+            self.assertAlmostEqual(search(ai, cells)[1], search(reference, cells)[1], places=6)
+
+    def test_backends_agree(self):
+        for size in (4, 5):
+            positions = random_positions(size, 6, size)
+            grid_ai = ExpectimaxAI(None, depth=2, backend='grid', cache_size=0)
+            bitboard_ai = ExpectimaxAI(None, depth=2, backend='bitboard', cache_size=0)
+            self.assert_same_values(bitboard_ai, grid_ai, positions)
+
+    def test_transpose_keyed_cache(self):
+        reference = ExpectimaxAI(None, depth=2, backend='bitboard', symmetry=False, reuse=False)
+        for cells in random_positions(11, 6):
+            ai = ExpectimaxAI(None, depth=2, backend='bitboard', symmetry=True)
+            transposed = [list(column) for column in zip(*cells)]
+            search(ai, cells)
+            action, value = search(ai, transposed) # answered from the entries of the first search
+            self.assertAlmostEqual(value, search(reference, transposed)[1], places=6)
+            self.assertLess(ai.nodes, reference.nodes)
+
+    def test_symmetry_keeps_values(self):
+        positions = random_positions(12, 6)
+        self.assert_same_values(ExpectimaxAI(None, depth=3, backend='bitboard', symmetry=True),
+                                ExpectimaxAI(None, depth=3, backend='bitboard', symmetry=False), positions)
+
+    def test_frontier_matches_serial(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        positions = random_positions(13, 6)
+        for depth, frontier, prob_cutoff in ((2, 2, 0.0), (3, 2, 0.0), (3, 3, 0.01)):
+            ai = ExpectimaxAI(None, depth=depth, backend='bitboard', frontier=frontier, prob_cutoff=prob_cutoff)
+            reference = ExpectimaxAI(None, depth=depth, backend='bitboard', prob_cutoff=prob_cutoff)
+            self.assert_same_values(ai, reference, positions)
+
+    def test_cutoff_values_do_not_depend_on_visit_order(self):
+        # a node first reached along an unlikely path has more of its subtree cut to leaves;
+        # reached again with probability 1 it must not be answered from that visit's entry
+        frontiers = [0]
+        try:
+            import numpy
+            frontiers.append(3)
+        except ImportError:
+            pass
+        for cells in random_positions(16, 4):
+            board = bitboard.encode(cells)
+            for frontier in frontiers:
+                ai = ExpectimaxAI(None, depth=3, backend='bitboard', prob_cutoff=0.01, frontier=frontier)
+                fresh = ExpectimaxAI(None, depth=3, backend='bitboard', prob_cutoff=0.01, cache_size=0)
+                values = []
+                for searcher, probabilities in ((ai, (0.02, 1.0)), (fresh, (1.0,))):
+                    adapter = searcher.board_adapter('bitboard', bitboard.SIZE)
+                    for probability in probabilities:
+                        values.append(searcher.expectimax(adapter, board, 3, 0, float('-inf'), float('inf'), probability))
+                self.assertAlmostEqual(values[1], values[2], places=6)
+
+    def test_parallel_matches_serial(self):
+        positions = random_positions(14, 4)
+        reference = ExpectimaxAI(None, depth=2, backend='bitboard')
+        for parallel in ('root', 'chance'):
+            ai = ExpectimaxAI(None, depth=2, backend='bitboard', workers=2, parallel=parallel)
+            try:
+                self.assert_same_values(ai, reference, positions)
+            finally:
+                ai.close()
+
+    def test_refuses_positions_near_65536(self):
+        cells = [[1 << 14] * 4, [0] * 4, [0] * 4, [2, 0, 0, 0]]
+        for backend in ('grid', 'bitboard'):
+            self.assertRaises(ValueError, search, ExpectimaxAI(None, depth=2, backend=backend), cells)
+        cells[0][3] = 1 << 13
+        self.assertIsNotNone(search(ExpectimaxAI(None, depth=2, backend='bitboard'), cells)[0])
+
+    def test_star_matches_full_search(self):
+        positions = random_positions(15, 6)
+        for cache_size in (100000, 0):
+            self.assert_same_values(ExpectimaxAI(None, depth=3, backend='bitboard', star=1, cache_size=cache_size),
+                                    ExpectimaxAI(None, depth=3, backend='bitboard', cache_size=cache_size), positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+'''
+Tests of server.py: request parsing, answers matching a local agent, the shared
+answer cache, batching of concurrent requests, and the HTTP front end.
+
+    python -m unittest   (or python -m pytest)
+'''
+import json
+import threading
+import unittest
+from urllib import request as urllib_request
+from urllib.error import HTTPError
+
+from core import Game, Grid
+from expectimax import ExpectimaxAI
+from server import SolverServer, SolverService, parse_request, request_move
+
+BOARD = [[2, 0, 0, 0], [0, 4, 0, 0], [0, 0, 8, 0], [0, 0, 0, 2]]
+
+
+def local_answer(cells, **options):
+    grid = Grid(len(cells))
+    grid.set_cells([row[:] for row in cells])
+    ai = ExpectimaxAI(None, **options)
+    return ai.get_action(Game(grid, None, None, testing_mode=True)), ai.value
+
+
+class ParseRequestTest(unittest.TestCase):
+
+    def test_valid_request(self):
+        agent, cells, options, time_limit = parse_request({'board': BOARD, 'depth': 2, 'simulations': 5, 'time': 0.5})
+        self.assertEqual((agent, cells, time_limit), ('E', tuple(map(tuple, BOARD)), 0.5))
+        self.assertEqual(options, {'depth': 2}) # simulations is not an expectimax option
+        self.assertEqual(parse_request({'board': BOARD, 'agent': 'MC', 'simulations': 5})[2], {'simulations': 5})
+
+    def test_invalid_requests(self):
+        for data in ([], {'board': BOARD, 'agent': 'X'}, {'board': [[2, 0], [0]]}, {'board': [[2]]},
+                     {'board': BOARD, 'time': 0}, {'board': BOARD, 'time': 'soon'}):
+            self.assertRaises(ValueError, parse_request, data)
+
+    def test_option_allow_list(self):
+        agent, cells, options, time_limit = parse_request({'board': BOARD, 'depth': 2, 'star': 1, 'prob_cutoff': 0,
+                                                           'workers': 64, 'cache_size': 10 ** 9})
+        self.assertEqual(options, {'depth': 2, 'star': 1, 'prob_cutoff': 0.0}) # only allow-listed options pass
+        self.assertIs(type(options['prob_cutoff']), float)
+        for name, value in (('depth', True), ('depth', 2.0), ('depth', '2'), ('depth', 0), ('depth', 5),
+                            ('backend', 'nope'), ('evaluator', 'ntuple'), ('star', 2),
+                            ('frontier', -1), ('prob_cutoff', 1.5), ('prob_cutoff', None)):
+            with self.assertRaises(ValueError, msg=f'{name}={value!r}'):
+                parse_request({'board': BOARD, name: value})
+        for name, value in (('simulations', 0), ('simulations', 2001), ('max_depth', 0), ('gamma', -0.1),
+                            ('backend', 'packed')):
+            with self.assertRaises(ValueError, msg=f'{name}={value!r}'):
+                parse_request({'board': BOARD, 'agent': 'MC', name: value})
+        for time_limit in (True, -1, 60.5):
+            self.assertRaises(ValueError, parse_request, {'board': BOARD, 'time': time_limit})
+
+    def test_board_limits(self):
+        for size in (2, 3, 7):
+            self.assertRaises(ValueError, parse_request, {'board': [[0] * size for _ in range(size)]})
+        for size, tile in ((4, 1 << 15), (5, 1 << 32), (4, True), (4, 3), (4, 1), (4, -2), (4, 2.0)):
+            board = [[0] * size for _ in range(size)]
+            board[0][0] = tile
+            with self.assertRaises(ValueError, msg=f'{tile!r} on {size}x{size}'):
+                parse_request({'board': board})
+        for size, tile in ((4, 1 << 14), (5, 1 << 31), (6, 1 << 20)):
+            board = [[0] * size for _ in range(size)]
+            board[0][0] = tile
+            self.assertEqual(parse_request({'board': board})[1][0][0], tile)
+        # four 16384 tiles could become two 32768 tiles and then merge within a search
+        board = [[1 << 14] * 4, [0] * 4, [0] * 4, [0] * 4]
+        self.assertRaises(ValueError, parse_request, {'board': board, 'agent': 'E'})
+        self.assertEqual(parse_request({'board': board, 'agent': 'MC'})[0], 'MC')
+        board[0][3] = 1 << 13
+        self.assertEqual(parse_request({'board': board, 'agent': 'E'})[0], 'E')
+
+
+class SolverServiceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.service = SolverService(workers=1, batch_window=0.2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.close()
+
+    def test_answer_matches_local_agent(self):
+        answer = self.service.best_move({'board': BOARD, 'depth': 2, 'backend': 'bitboard'})
+        self.assertEqual((answer['move'], answer['value']), local_answer(BOARD, depth=2, backend='bitboard'))
+        self.assertGreater(answer['nodes'], 0)
+        lost = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]
+        self.assertIsNone(self.service.best_move({'board': lost, 'depth': 1})['move'])
+
+    def test_repeats_come_from_the_cache(self):
+        data = {'board': BOARD, 'depth': 1, 'backend': 'grid'}
+        first = self.service.best_move(data)
+        hits = self.service.metrics.snapshot()['cache_hits']
+        second = self.service.best_move(dict(data))
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertEqual((second['move'], second['value']), (first['move'], first['value']))
+        self.assertEqual(self.service.metrics.snapshot()['cache_hits'], hits + 1)
+
+    def test_varying_answers_are_not_cached(self):
+        for data in ({'board': BOARD, 'agent': 'MC', 'simulations': 2, 'max_depth': 2},
+                     {'board': BOARD, 'depth': 1, 'time': 0.05}):
+            hits = self.service.metrics.snapshot()['cache_hits']
+            self.assertFalse(self.service.best_move(data)['cached'])
+            self.assertFalse(self.service.best_move(dict(data))['cached'])
+            self.assertEqual(self.service.metrics.snapshot()['cache_hits'], hits)
+        self.assertFalse(any(key[0] == 'MC' or key[-1] is not None for key in self.service.cache))
+
+    def test_cache_is_lru_bounded(self):
+        service = self.service
+        size = service.cache_size
+        try:
+            service.cache_size = 2
+            for k in range(3):
+                service.remember(('E', k), {'move': 'up'})
+            self.assertIsNone(service.cached(('E', 0)))
+            self.assertIsNotNone(service.cached(('E', 1))) # now the most recently used
+            service.remember(('E', 3), {'move': 'up'})
+            self.assertIsNone(service.cached(('E', 2)))
+            self.assertEqual(list(service.cache)[-2:], [('E', 1), ('E', 3)])
+        finally:
+            service.cache_size = size
+            for k in range(4):
+                service.cache.pop(('E', k), None)
+
+    def test_concurrent_requests_are_batched(self):
+        service = SolverService(workers=1, batch_window=0.5, cache_size=0)
+        try:
+            boards = [BOARD] * 4 + [[[4, 0, 0, 0], [0, 2, 0, 0], [0, 0, 0, 0], [0, 0, 0, 2]]]
+            answers = [None] * len(boards)
+
+            def ask(k):
+                answers[k] = service.best_move({'board': boards[k], 'depth': 1})
+
+            threads = [threading.Thread(target=ask, args=(k,)) for k in range(len(boards))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            metrics = service.metrics.snapshot()
+            self.assertEqual(metrics['batches'], 1)
+            self.assertEqual(metrics['deduplicated'], 3) # the four identical requests were solved once
+            self.assertEqual(metrics['cache_hits'], 0)
+            for board, answer in zip(boards, answers):
+                self.assertEqual((answer['move'], answer['value']), local_answer(board, depth=1))
+        finally:
+            service.close()
+
+    def test_http(self):
+        server = SolverServer(('127.0.0.1', 0), self.service)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        try:
+            answer = request_move(BOARD, 'E', url, depth=1)
+            self.assertEqual(answer['move'], local_answer(BOARD, depth=1)[0])
+            for board, options in (([[3]], {}), (BOARD, {'backend': 'nope'})):
+                with self.assertRaises(HTTPError) as raised:
+                    request_move(board, 'E', url, **options)
+                self.assertEqual(raised.exception.code, 400)
+            with urllib_request.urlopen(url + '/metrics') as response:
+                self.assertGreater(json.loads(response.read())['requests'], 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
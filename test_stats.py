@@ -0,0 +1,84 @@
+'''
+Tests of stats.py: collectors add up across moves and processes, and both agents
+fill one consistent record per get_action call when built with stats=True.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import unittest
+
+from core import Game, Grid
+from expectimax import ExpectimaxAI
+from montecarlo import MonteCarloAI
+from stats import StatsCollector
+
+
+def start_game(seed):
+    random.seed(seed)
+    game = Game(Grid(4), None, None, testing_mode=True)
+    game.add_start_cells()
+    return game
+
+
+class StatsCollectorTest(unittest.TestCase):
+
+    def test_merge_and_summary(self):
+        first = StatsCollector()
+        record = first.start_move()
+        record.latency, record.nodes, record.cache_hits, record.cache_misses = 0.5, 100, 30, 10
+        record.count_node(1)
+        record.count_node(2)
+        record.count_node(2)
+        second = StatsCollector()
+        record = second.start_move()
+        record.latency, record.nodes, record.rollouts, record.rollout_steps = 1.5, 300, 4, 10
+        record.count_node(1)
+
+        merged = StatsCollector()
+        merged.merge(first)
+        merged.merge(second.records()) # as plain dicts, the way worker processes send them
+        summary = merged.summary()
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(summary['totals']['nodes'], 400)
+        self.assertEqual(summary['nodes_per_ply'], [0, 2, 2])
+        self.assertEqual((summary['mean_latency'], summary['max_latency']), (1.0, 1.5))
+        self.assertEqual(summary['nodes_per_sec'], 200.0)
+        self.assertEqual(summary['cache_hit_rate'], 0.75)
+        self.assertEqual(summary['mean_rollout_length'], 2.5)
+        self.assertEqual(StatsCollector().summary()['mean_latency'], 0.0)
+
+
+class AgentStatsTest(unittest.TestCase):
+
+    def test_expectimax_records(self):
+        game = start_game(1)
+        records = []
+        for backend in ('grid', 'bitboard'):
+            ai = ExpectimaxAI(None, depth=2, backend=backend, stats=True)
+            ai.get_action(game)
+            ai.get_action(game) # answered from the table
+            self.assertEqual(len(ai.stats), 2)
+            first, second = ai.stats.records()
+            self.assertEqual(first['nodes'], sum(first['nodes_per_ply']))
+            self.assertGreater(first['evaluations'], 0)
+            self.assertEqual(second['nodes'], 0)
+            self.assertGreater(second['cache_hits'], 0)
+            records.append([{name: value for name, value in record.items() if not name.endswith(('latency', 'seconds'))}
+                            for record in ai.stats.records()])
+        self.assertEqual(records[0], records[1]) # the backends do the same work
+        self.assertIsNone(ExpectimaxAI(None, depth=2).stats)
+
+    def test_monte_carlo_records(self):
+        game = start_game(2)
+        actions = len(game.get_legal_actions())
+        for backend in ('grid', 'bitboard', 'numpy'):
+            ai = MonteCarloAI(None, simulations=5, max_depth=4, backend=backend, seed=1, stats=True)
+            ai.get_action(game)
+            record, = ai.stats.records()
+            self.assertEqual(record['rollouts'], 5 * actions)
+            self.assertLessEqual(record['rollout_steps'], 4 * record['rollouts'])
+            self.assertGreater(record['rollout_steps'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+'''
+Tests of tournament.py: entrant parsing, the running score statistics, paired
+differences, and a small tournament streamed to a results file.
+
+    python -m unittest   (or python -m pytest)
+'''
+import json
+import math
+import os
+import statistics
+import tempfile
+import unittest
+
+from tournament import RunningScore, paired_difference, parse_entrant, play_match, run_tournament
+
+
+class TournamentTest(unittest.TestCase):
+
+    def test_parse_entrant(self):
+        self.assertEqual(parse_entrant('E2=E:depth=2,backend=bitboard'), ('E2', 'E', {'depth': 2, 'backend': 'bitboard'}))
+        self.assertEqual(parse_entrant('MC'), ('MC', 'MC', {}))
+        self.assertEqual(parse_entrant('MC:gamma=0.5')[2], {'gamma': 0.5})
+        for spec in ('X:depth=2', 'E:depth'):
+            self.assertRaises(ValueError, parse_entrant, spec)
+
+    def test_running_score(self):
+        values = [1200, 3400, 800, 5600, 2900]
+        running = RunningScore()
+        self.assertEqual(running.interval(), math.inf)
+        for value in values:
+            running.add(value)
+        self.assertAlmostEqual(running.mean, statistics.mean(values))
+        self.assertAlmostEqual(running.interval(), 1.96 * statistics.stdev(values) / math.sqrt(len(values)))
+
+    def test_paired_difference(self):
+        results = [{'entrant': name, 'seed': seed, 'score': score}
+                   for name, seed, score in (('A', 0, 100), ('B', 0, 150), ('A', 1, 200), ('B', 1, 260),
+                                             ('A', 2, 300), ('B', 2, 340), ('A', 3, 999))] # seed 3 is unpaired
+        mean, half, count = paired_difference(results, 'A', 'B')
+        self.assertEqual(count, 3)
+        self.assertAlmostEqual(mean, 50.0)
+        self.assertAlmostEqual(half, 1.96 * statistics.stdev([50, 60, 40]) / math.sqrt(3))
+
+    def test_tournament(self):
+        task = ('E1', 0, 5, 'E', {'depth': 1, 'backend': 'bitboard'}, 4)
+        self.assertEqual(play_match(task)['score'], play_match(task)['score']) # a game is reproducible from its seed
+        entrants = [parse_entrant('A=E:depth=1,backend=bitboard'), parse_entrant('B=E:depth=1,backend=grid')]
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'results.jsonl')
+        streamed = []
+        try:
+            results, summary = run_tournament(entrants, games=2, seed=5, processes=1, output=path,
+                                              callback=streamed.append, verbose=False)
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+        self.assertEqual(lines, streamed)
+        self.assertEqual([(result['entrant'], result['game']) for result in results],
+                         [('A', 0), ('A', 1), ('B', 0), ('B', 1)])
+        # both backends play the same moves, and the spawns depend on the seed only
+        self.assertEqual([result['score'] for result in results[:2]], [result['score'] for result in results[2:]])
+        self.assertEqual(summary['differences']['B'][:1], (0.0,))
+        self.assertEqual(summary['entrants']['A']['games'], 2)
+        self.assertRaises(ValueError, run_tournament, entrants + entrants[:1], games=1, processes=1, verbose=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+'''
+Tests of transposition.py: least-recently-used order, shallow-first eviction within
+the sample, and a bounded table leaving the expectimax moves unchanged.
+
+    python -m unittest   (or python -m pytest)
+'''
+import random
+import unittest
+
+import bitboard
+from expectimax import ExpectimaxAI
+from core import Game, Grid
+from transposition import TranspositionTable
+
+
+def random_boards(seed, count, max_moves=120):
+    """
+    Seeded mid-game bitboards reached by random play.
+    """
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = bitboard.spawn(bitboard.spawn(0, rng), rng)
+        for _ in range(rng.randint(1, max_moves)):
+            actions = bitboard.legal_actions(board)
+            if not actions:
+                break
+            board = bitboard.spawn(bitboard.move(board, rng.choice(actions))[0], rng)
+        if bitboard.legal_actions(board):
+            boards.append(board)
+    return boards
+
+
+class TranspositionTableTest(unittest.TestCase):
+
+    def test_evicts_shallowest_of_least_recently_used(self):
+        table = TranspositionTable(max_entries=4, sample=2)
+        for board, depth in ((1, 3), (2, 1), (3, 2), (4, 2)):
+            table.put((board, depth, 0), float(board))
+        self.assertEqual(table.get((1, 3, 0)), 1.0) # now the most recently used
+        table.put((5, 2, 0), 5.0) # samples boards 2 and 3, drops the shallower board 2
+        self.assertEqual(len(table), 4)
+        self.assertIsNone(table.get((2, 1, 0)))
+        self.assertEqual(table.get((3, 2, 0)), 3.0)
+        table.put((6, 1, 0), 6.0) # samples boards 4 and 1, drops the shallower board 4
+        self.assertIsNone(table.get((4, 2, 0)))
+        self.assertEqual(table.get((1, 3, 0)), 1.0)
+        self.assertEqual(table.evictions, 2)
+        self.assertEqual((table.hits, table.misses), (3, 2))
+
+    def test_bounded_table_keeps_moves(self):
+        for board in random_boards(1, 8):
+            moves = []
+            for cache_size in (0, 50, 100000):
+                game = Game(Grid(4), None, None, testing_mode=True)
+                game.grid.set_cells(bitboard.decode(board))
+                ai = ExpectimaxAI(game, depth=2, backend='bitboard', cache_size=cache_size)
+                moves.append(ai.get_action(game))
+            self.assertEqual(moves[1:], moves[:1] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
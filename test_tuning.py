@@ -0,0 +1,67 @@
+'''
+Tests of tuning.py: candidate sampling, common random numbers across candidates,
+and a small successive-halving race on a process pool.
+
+    python -m unittest   (or python -m pytest)
+'''
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from evaluation import DEFAULT_WEIGHTS
+from tuning import TUNED_TERMS, load_weights, play_candidate, sample_candidates, successive_halving
+
+
+class TuningTest(unittest.TestCase):
+
+    def test_sample_candidates(self):
+        candidates = sample_candidates(5, random.Random(1))
+        self.assertEqual(len(candidates), 5)
+        self.assertEqual(candidates[0], DEFAULT_WEIGHTS)
+        for weights in candidates[1:]:
+            self.assertEqual(weights['constant'], DEFAULT_WEIGHTS['constant']) # never tuned
+            for term in TUNED_TERMS:
+                self.assertGreater(weights[term] * DEFAULT_WEIGHTS[term], 0) # signs are kept
+            self.assertNotEqual(weights, DEFAULT_WEIGHTS)
+
+    def test_candidates_play_the_same_games(self):
+        options = {'depth': 1, 'backend': 'bitboard'}
+        first = play_candidate((0, 7, DEFAULT_WEIGHTS, options, 4))
+        second = play_candidate((1, 7, dict(DEFAULT_WEIGHTS), options, 4))
+        self.assertEqual(first[1:], second[1:]) # same seed and weights, same game
+
+    def test_successive_halving(self):
+        candidates = sample_candidates(4, random.Random(2))
+        results = successive_halving(candidates, {'depth': 1}, games=1, eta=2, rounds=2, processes=2, seed=3,
+                                     verbose=False)
+        self.assertEqual(sorted(result['candidate'] for result in results), [0, 1, 2, 3])
+        self.assertEqual([result['round'] for result in results], [2, 2, 1, 1])
+        self.assertEqual([result['games'] for result in results], [2, 2, 1, 1])
+        self.assertGreaterEqual(results[0]['mean_score'], results[1]['mean_score'])
+        # round 1 played seed 3 only and kept the better half on it
+        first_round = {k: play_candidate((k, 3, weights, {'depth': 1, 'backend': 'bitboard'}, 4))[2]
+                       for k, weights in enumerate(candidates)}
+        finalists = [result['candidate'] for result in results[:2]]
+        dropped = [result['candidate'] for result in results[2:]]
+        self.assertGreaterEqual(min(first_round[k] for k in finalists), max(first_round[k] for k in dropped))
+        for result in results[2:]:
+            self.assertEqual(result['mean_score'], first_round[result['candidate']])
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'tuning.json')
+        try:
+            with open(path, 'w') as f:
+                json.dump({'best': results[0], 'results': results}, f)
+            self.assertEqual(load_weights(path), results[0]['weights'])
+            with open(path, 'w') as f:
+                json.dump({'empty': 120}, f) # a plain partial weights file
+            self.assertEqual(load_weights(path), dict(DEFAULT_WEIGHTS, empty=120))
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+'''
+Tests of utility_store.py: lookups after eviction, the vectorized get_many,
+save/load round trips under every memory-map mode, and read-only stores.
+
+    python -m unittest   (or python -m pytest)
+'''
+import os
+import random
+import tempfile
+import unittest
+
+import bitboard
+from core import Game, Grid
+from test_engines import MAX_4X4_EXPONENT, random_cells
+
+try:
+    import numpy as np
+    from montecarlo import MonteCarloAI
+    from utility_store import UtilityStore
+except ImportError: # numpy is optional
+    UtilityStore = None
+
+
+def random_boards(seed, count):
+    rng = random.Random(seed)
+    boards = set()
+    while len(boards) < count:
+        boards.add(bitboard.encode(random_cells(rng, 4, max_exponent=MAX_4X4_EXPONENT)))
+    return sorted(boards - {0})
+
+
+@unittest.skipIf(UtilityStore is None, 'numpy is not installed')
+class UtilityStoreTest(unittest.TestCase):
+
+    def filled_store(self, boards, capacity=1000):
+        store = UtilityStore(capacity)
+        for n, board in enumerate(boards):
+            for k in range(n % 4 + 1): # board n gets n % 4 + 1 visits
+                store.visit(board, float(n + k))
+        return store
+
+    def test_running_mean(self):
+        store = UtilityStore(100)
+        board = bitboard.encode([[2, 4, 0, 0], [0] * 4, [0] * 4, [0] * 4])
+        for ut in (1.0, 2.0, 6.0):
+            store.visit(board, ut)
+        self.assertEqual((store.count(board), store.get(board)), (3, 3.0))
+        self.assertEqual(store.get(bitboard.decode(board)), 3.0) # cells are packed into the same key
+        self.assertEqual(store.get(board + 1, default=-1.0), -1.0)
+
+    def test_lookup_after_eviction(self):
+        boards = random_boards(1, 60)
+        store = self.filled_store(boards[:20], capacity=20)
+        self.assertEqual(len(store), 20)
+        before = {board: (store.count(board), store.get(board)) for board in boards[:20]}
+        for board in boards[20:]:
+            store.visit(board, 1.0)
+        self.assertGreater(store.evictions, 0)
+        self.assertLessEqual(len(store), store.capacity)
+        kept = [board for board in boards[:20] if board in store]
+        self.assertTrue(kept)
+        for board in kept: # survivors keep their counts and utilities
+            self.assertEqual((store.count(board), store.get(board)), before[board])
+        # the first eviction drops the least visited states: those with a single visit
+        self.assertTrue(all(before[board][0] > 1 for board in kept))
+        for board in boards[20:]:
+            if board not in store:
+                self.assertEqual(store.get(board, default=-1.0), -1.0)
+
+    def test_get_many_matches_get(self):
+        boards = random_boards(2, 300)
+        store = self.filled_store(boards[:200])
+        keys = np.array(boards, dtype=np.uint64)
+        expected = [store.get(board, default=-1.0) for board in boards]
+        self.assertEqual(store.get_many(keys, default=-1.0).tolist(), expected)
+
+    def test_save_load_modes(self):
+        boards = random_boards(3, 100)
+        store = self.filled_store(boards)
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'store.npy')
+        try:
+            store.save(path)
+            expected = [(store.count(board), store.get(board)) for board in boards]
+            for mode in ('c', 'r', 'r+'):
+                loaded = UtilityStore.load(path, mode)
+                self.assertEqual(len(loaded), len(store))
+                self.assertEqual([(loaded.count(board), loaded.get(board)) for board in boards], expected)
+                del loaded
+
+            copied = UtilityStore.load(path, 'c') # copy-on-write: updates stay in this process
+            copied.visit(boards[0], 100.0)
+            self.assertEqual(copied.count(boards[0]), expected[0][0] + 1)
+            del copied
+            self.assertEqual(UtilityStore.load(path, 'r').count(boards[0]), expected[0][0])
+
+            shared = UtilityStore.load(path, 'r+') # updates are written back to the file
+            shared.visit(boards[0], 100.0)
+            shared.table.flush()
+            del shared
+            self.assertEqual(UtilityStore.load(path, 'r').count(boards[0]), expected[0][0] + 1)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+    def test_read_only_store(self):
+        boards = random_boards(4, 50)
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'store.npy')
+        try:
+            self.filled_store(boards).save(path)
+            store = UtilityStore.load(path, 'r')
+            self.assertTrue(store.read_only)
+            self.assertFalse(UtilityStore.load(path, 'c').read_only)
+            before = store.table.copy()
+            self.assertRaises(ValueError, store.visit, boards[0], 1.0)
+            # an agent reads a read-only store as a fixed value table
+            game = Game(Grid(4), None, None, testing_mode=True)
+            game.grid.set_cells(bitboard.decode(boards[0]))
+            for backend in ('bitboard', 'numpy'):
+                ai = MonteCarloAI(None, simulations=5, max_depth=4, backend=backend, seed=1, store=store)
+                self.assertIn(ai.get_action(game), game.get_legal_actions())
+            self.assertTrue((store.table == before).all())
+            del store
+        finally:
+            os.remove(path)
+            os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
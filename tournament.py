@@ -0,0 +1,224 @@
+'''
+Tournament runner: plays several agent configurations ("entrants") side by side
+on the same seeded games, on a process pool.
+
+    python tournament.py --games 50 --processes 8 --output results.jsonl --plot tournament.png \
+        --entrant E2=E:depth=2,backend=bitboard --entrant MC=MC:simulations=100,max_depth=20
+
+An entrant is [name=]AGENT[:option=value,...], AGENT being 'E' or 'MC' and the
+options those of its constructor (values are read as JSON, else kept as strings).
+Game i of every entrant is seeded with seed + i. The start tiles and spawns are
+drawn from their own random.Random(seed + i), apart from the agent's randomness,
+so whatever an agent samples while searching, all entrants face the same spawn
+stream in game i. Comparisons are then paired: the difference between two
+entrants is measured game by game, which needs far fewer games than comparing
+independent runs.
+
+Tasks are interleaved (game 0 of every entrant, then game 1, ...), so every
+running mean fills in at the same pace. Each finished game is appended to the
+output file as one JSON line and printed with its entrant's running mean and
+confidence interval. Plots are drawn only after the last game.
+'''
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from core import Game, Grid
+from driver import GameDriver
+
+AGENT_SEED_OFFSET = 1 << 32 # the agent's randomness is seeded apart from the spawns of the same game
+DEFAULT_ENTRANTS = ('E:depth=2,backend=bitboard', 'MC:simulations=50,max_depth=20')
+
+
+def parse_entrant(spec):
+    """
+    Parses '[name=]AGENT[:option=value,...]' into (name, agent, options).
+    """
+    head, _, option_text = spec.partition(':')
+    name, _, agent = head.rpartition('=')
+    if agent not in ('E', 'MC'):
+        raise ValueError(f"entrant {spec!r}: unknown agent {agent!r}, expected 'E' or 'MC'")
+    options = {}
+    for item in filter(None, option_text.split(',')):
+        key, equals, value = item.partition('=')
+        if not equals:
+            raise ValueError(f'entrant {spec!r}: expected option=value, got {item!r}')
+        try:
+            options[key.strip()] = json.loads(value)
+        except ValueError:
+            options[key.strip()] = value
+    return name or spec, agent, options
+
+
+def play_match(task):
+    """
+    Plays one game of an entrant with its own spawn stream. Returns the game's result record.
+    """
+    name, index, seed, user_choice, ai_options, size = task
+    random.seed(seed + AGENT_SEED_OFFSET)
+    ai_options = dict(ai_options)
+    if user_choice == 'MC':
+        ai_options.setdefault('seed', seed) # seeds the 'numpy' rollouts
+    spawns = random.Random(seed)
+    game = Game(Grid(size), None, user_choice, testing_mode=True, ai_options=ai_options)
+    game.add_start_cells(spawns)
+    result = GameDriver(game, spawn_rng=spawns).run()
+    return {
+        'entrant': name,
+        'game': index,
+        'seed': seed,
+        'score': result['score'],
+        'max_tile': result['max_tile'],
+        'won': result['max_tile'] >= 2048,
+        'moves': result['moves'],
+        'seconds': result['seconds'],
+    }
+
+
+class RunningScore:
+    '''Running mean and variance of one entrant's scores (Welford's algorithm).'''
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0 # sum of squared deviations from the mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.squares += delta * (value - self.mean)
+
+    def interval(self, z=1.96):
+        """
+        Half-width of the normal-approximation confidence interval of the mean (95% for z=1.96).
+        """
+        if self.count < 2:
+            return math.inf
+        return z * math.sqrt(self.squares / (self.count - 1) / self.count)
+
+
+def paired_difference(results, first, second, z=1.96):
+    """
+    Mean and confidence half-width of score(second) - score(first) over the seeds both played.
+    """
+    scores = {}
+    for result in results:
+        scores.setdefault(result['seed'], {})[result['entrant']] = result['score']
+    running = RunningScore()
+    for by_entrant in scores.values():
+        if first in by_entrant and second in by_entrant:
+            running.add(by_entrant[second] - by_entrant[first])
+    return running.mean, running.interval(z), running.count
+
+
+def format_interval(running):
+    half = running.interval()
+    return f'{running.mean:.0f} ± {half:.0f}' if math.isfinite(half) else f'{running.mean:.0f}'
+
+
+def run_tournament(entrants, games=50, seed=0, processes=None, size=4, output=None, callback=None, verbose=True):
+    """
+    Plays games seeded games of every entrant, a list of (name, agent, options), on a pool of
+    processes (all cores by default, none if processes=1). With output (a path), every result is
+    appended to that file as a JSON line as soon as it arrives; callback(result) is also called
+    in this process. Returns (results ordered by entrant and game, summary).
+    """
+    names = [name for name, _, _ in entrants]
+    if len(set(names)) != len(names):
+        raise ValueError(f'entrant names must be unique, got {names}')
+    tasks = [(name, i, seed + i, agent, options, size) for i in range(games) for name, agent, options in entrants]
+    running = {name: RunningScore() for name in names}
+    results = []
+    start = time.perf_counter()
+    results_file = open(output, 'w') if output is not None else None
+    pool = None if processes == 1 else multiprocessing.Pool(processes) # a single process plays inline
+    try:
+        for result in (map(play_match, tasks) if pool is None else pool.imap_unordered(play_match, tasks)):
+            results.append(result)
+            score = running[result['entrant']]
+            score.add(result['score'])
+            if results_file is not None:
+                results_file.write(json.dumps(result) + '\n')
+                results_file.flush() # readable (e.g. tail -f) while the tournament runs
+            if verbose:
+                print(f"[{len(results)}/{len(tasks)} {time.perf_counter() - start:.0f}s] {result['entrant']} "
+                      f"game {result['game'] + 1}: score {result['score']}, tile {result['max_tile']} | "
+                      f"mean {format_interval(score)} over {score.count}")
+            if callback is not None:
+                callback(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if results_file is not None:
+            results_file.close()
+
+    results.sort(key=lambda result: (names.index(result['entrant']), result['game']))
+    summary = summarize(results, names)
+    if verbose:
+        print(summary['report'])
+    return results, summary
+
+
+def summarize(results, names):
+    entrants = {}
+    for name in names:
+        own = [result for result in results if result['entrant'] == name]
+        running = RunningScore()
+        for result in own:
+            running.add(result['score'])
+        moves = sum(result['moves'] for result in own)
+        entrants[name] = {
+            'games': len(own),
+            'mean_score': running.mean,
+            'interval': running.interval(),
+            'highest_tile': max((result['max_tile'] for result in own), default=0),
+            'win_rate': sum(result['won'] for result in own) / len(own) if own else 0,
+            'seconds_per_move': sum(result['seconds'] for result in own) / moves if moves else 0,
+        }
+    # every entrant against the first one, on the seeds both played
+    differences = {name: paired_difference(results, names[0], name) for name in names[1:]}
+
+    lines = [f"{'entrant':<16}{'games':>7}{'mean score':>20}{'best tile':>11}{'win rate':>10}{'ms/move':>10}"]
+    for name, entry in entrants.items():
+        half = entry['interval']
+        mean = f"{entry['mean_score']:.0f} ± {half:.0f}" if math.isfinite(half) else f"{entry['mean_score']:.0f}"
+        lines.append(f"{name:<16}{entry['games']:>7}{mean:>20}{entry['highest_tile']:>11}"
+                     f"{entry['win_rate']:>10.0%}{1000 * entry['seconds_per_move']:>10.1f}")
+    for name, (mean, half, count) in differences.items():
+        interval = f' ± {half:.0f}' if math.isfinite(half) else ''
+        lines.append(f'{name} - {names[0]}: {mean:+.0f}{interval} per game (paired over {count} seeds)')
+    return {'entrants': entrants, 'differences': differences, 'report': '\n'.join(lines)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play agent configurations against each other on the same seeded games.')
+    parser.add_argument('--entrant', action='append', default=None,
+                        help="[name=]AGENT[:option=value,...], e.g. 'E2=E:depth=2,backend=bitboard'; repeat for each entrant")
+    parser.add_argument('--games', type=int, default=50, help='games per entrant')
+    parser.add_argument('--seed', type=int, default=0, help='game i is seeded with seed + i')
+    parser.add_argument('--size', type=int, default=4, help='board size')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (all cores by default)')
+    parser.add_argument('--output', default='tournament.jsonl', help='file the results are streamed to, one JSON line per game')
+    parser.add_argument('--plot', default=None, help='save a plot of the results to this file at the end')
+    args = parser.parse_args(argv)
+
+    try:
+        entrants = [parse_entrant(spec) for spec in args.entrant or DEFAULT_ENTRANTS]
+    except ValueError as error:
+        parser.error(str(error))
+    results, _ = run_tournament(entrants, args.games, args.seed, args.processes, args.size, args.output)
+    if args.plot:
+        from plots import plot_tournament
+        scores = {name: [result['score'] for result in results if result['entrant'] == name]
+                  for name, _, _ in entrants}
+        plot_tournament(scores, args.plot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from itertools import islice
+
+
+class TranspositionTable:
+    '''Bounded cache of expectimax values keyed by (board, remaining depth, agent index), plus the
+    path probability when the search cuts unlikely chance outcomes (see ExpectimaxAI.table_key).
+
+    Entries are kept in least-recently-used order. When the table is full, the
+    shallowest of the `sample` least recently used entries is evicted, since it
+    is the cheapest one to recompute. The size is bounded by max_entries, a count
+    of entries rather than bytes.
+    '''
+    def __init__(self, max_entries=100000, sample=4):
+        self.max_entries = max_entries
+        self.sample = sample
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            return
+        if len(self.entries) >= self.max_entries:
+            self.evict()
+        self.entries[key] = value
+
+    def evict(self):
+        candidates = list(islice(self.entries, self.sample))
+        victim = min(candidates, key=lambda key: key[1]) # key[1] is the remaining depth
+        del self.entries[victim]
+        self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate(),
+        }
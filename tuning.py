@@ -0,0 +1,131 @@
+'''
+Parallel tuning of the calculate_score weights by successive halving.
+
+Candidates are weight sets (see evaluation.DEFAULT_WEIGHTS): the defaults plus
+random log-normal perturbations of them. Every candidate plays the same seeded
+games (common random numbers), so they are compared on the same start
+positions and spawn streams rather than on their luck. Round r plays each
+surviving candidate on games * eta^r seeds, games of earlier rounds included,
+and keeps the best 1 / eta of them by mean score. Weak candidates thus stop after
+a few games and the game budget goes to the promising ones. All games of a round
+run on one process pool, so every core stays busy until the round ends.
+
+    python tuning.py --candidates 27 --eta 3 --games 4 --depth 1 --processes 8 --output tuning.json
+    python cli.py --agent E --depth 2 --heuristic-weights tuning.json
+
+The 'constant' weight shifts every leaf equally and never changes a move, so it
+is not tuned, and scaling all weights together does not change play either.
+'''
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from evaluation import DEFAULT_WEIGHTS, complete_weights
+from parallel import play_game
+
+TUNED_TERMS = ('empty', 'corner', 'smoothness', 'monotonicity', 'border')
+
+
+def sample_candidates(count, rng, base=None, spread=0.7):
+    """
+    Returns count weight sets: base (the default weights if None) followed by copies whose
+    tuned weights are multiplied by exp(N(0, spread)), so they keep their signs.
+    """
+    base = complete_weights(base)
+    candidates = [base]
+    while len(candidates) < count:
+        candidates.append(dict(base, **{term: base[term] * math.exp(rng.gauss(0, spread)) for term in TUNED_TERMS}))
+    return candidates
+
+
+def play_candidate(task):
+    """
+    Plays one seeded game with a candidate's weights. Returns (candidate, seed, score).
+    """
+    candidate, seed, weights, ai_options, size = task
+    options = dict(ai_options, heuristic_weights=weights)
+    return candidate, seed, play_game((candidate, seed, 'E', options, size, False))['score']
+
+
+def successive_halving(candidates, ai_options=None, games=4, eta=3, rounds=None, processes=None, seed=0, size=4,
+                       verbose=True):
+    """
+    Races the candidate weight sets. Returns one result per candidate, best first:
+    {'candidate', 'weights', 'games', 'mean_score', 'round'} where round is the last one it played.
+    """
+    ai_options = dict({'depth': 1, 'backend': 'bitboard'}, **(ai_options or {}))
+    scores = [{} for _ in candidates] # per candidate: seed -> score
+    eliminated = {} # candidate -> round it was dropped after
+    alive = list(range(len(candidates)))
+    start = time.perf_counter()
+    round_index = 0
+    with multiprocessing.Pool(processes) as pool:
+        while True:
+            target = games * eta ** round_index
+            tasks = [(k, seed + i, candidates[k], ai_options, size)
+                     for k in alive for i in range(target) if seed + i not in scores[k]]
+            for k, game_seed, score in pool.imap_unordered(play_candidate, tasks):
+                scores[k][game_seed] = score
+            alive.sort(key=lambda k: -mean(scores[k]))
+            if verbose:
+                best = alive[0]
+                print(f'Round {round_index + 1}: {len(alive)} candidates x {target} games, best #{best} '
+                      f'mean {mean(scores[best]):.0f}, {time.perf_counter() - start:.0f} s')
+            if len(alive) == 1 or (rounds is not None and round_index + 1 >= rounds):
+                break
+            survivors = max(1, len(alive) // eta)
+            for k in alive[survivors:]:
+                eliminated[k] = round_index
+            alive = alive[:survivors]
+            round_index += 1
+
+    results = [{'candidate': k, 'weights': candidates[k], 'games': len(scores[k]), 'mean_score': mean(scores[k]),
+                'round': eliminated.get(k, round_index) + 1} for k in range(len(candidates))]
+    results.sort(key=lambda result: (-result['round'], -result['mean_score']))
+    return results
+
+
+def mean(scores):
+    return sum(scores.values()) / len(scores) if scores else float('-inf')
+
+
+def load_weights(path):
+    """
+    Reads the best weights of a tuning.py output file (or a plain {term: weight} JSON file).
+    """
+    with open(path) as f:
+        data = json.load(f)
+    return complete_weights(data['best']['weights'] if 'best' in data else data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune the expectimax heuristic weights by successive halving.')
+    parser.add_argument('--candidates', type=int, default=27, help='weight sets to race, the defaults included')
+    parser.add_argument('--eta', type=int, default=3, help='keep the best 1/eta each round, eta times more games')
+    parser.add_argument('--games', type=int, default=4, help='games per candidate in the first round')
+    parser.add_argument('--rounds', type=int, default=None, help='stop after this many rounds')
+    parser.add_argument('--spread', type=float, default=0.7, help='log-normal spread of the sampled weights')
+    parser.add_argument('--base', default=None, help='weights (JSON file) to sample around instead of the defaults')
+    parser.add_argument('--depth', type=int, default=1, help='expectimax depth of the tuning games')
+    parser.add_argument('--size', type=int, default=4, help='board size')
+    parser.add_argument('--seed', type=int, default=0, help='sampling seed; game i is seeded with seed + i')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (all cores by default)')
+    parser.add_argument('--output', default='tuning.json', help='where to write the ranked candidates')
+    args = parser.parse_args(argv)
+
+    base = load_weights(args.base) if args.base else None
+    candidates = sample_candidates(args.candidates, random.Random(args.seed), base, args.spread)
+    results = successive_halving(candidates, {'depth': args.depth}, args.games, args.eta, args.rounds,
+                                 args.processes, args.seed, args.size)
+    with open(args.output, 'w') as f:
+        json.dump({'best': results[0], 'default_weights': DEFAULT_WEIGHTS, 'results': results}, f, indent=2)
+    print(f"Best weights: {results[0]['weights']} (mean {results[0]['mean_score']:.0f} over {results[0]['games']} games)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+'''
+Compact, persistent visit-count/utility store for MonteCarloAI.
+
+States are packed 64-bit boards (see bitboard.py) held in one open-addressing hash
+table of (key, count, utility) records. The table has a fixed number of slots, so
+memory is bounded. When it reaches capacity, the least visited states are evicted.
+A table is saved as a single .npy file. It can be memory-mapped back, so many
+worker processes can share the learned utilities without copying them.
+'''
+import numpy as np
+
+import bitboard
+
+RECORD = np.dtype([('key', np.uint64), ('count', np.uint32), ('utility', np.float64)])
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # Fibonacci hashing
+MASK64 = 0xFFFFFFFFFFFFFFFF
+MAX_LOAD = 0.7
+
+
+class UtilityStore:
+    '''Bounded hash table of board -> (visit count, utility estimate).
+
+    Key 0 (the empty board, which never occurs in play) marks a free slot.
+    '''
+    def __init__(self, capacity=1000000, evict_fraction=0.25, table=None):
+        if table is None:
+            bits = max(4, int(np.ceil(np.log2(capacity / MAX_LOAD))))
+            table = np.zeros(1 << bits, dtype=RECORD)
+        self.table = table
+        self.bits = int(len(table)).bit_length() - 1
+        self.capacity = min(capacity, int(len(table) * MAX_LOAD))
+        self.evict_fraction = evict_fraction # share of the least visited states dropped when full
+        self.size = int(np.count_nonzero(table['key']))
+        self.evictions = 0
+        self.read_only = not table.flags.writeable # a store loaded with mode 'r' is a fixed value table
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.table['key'][self.slot(self.as_key(key))] != 0
+
+    def as_key(self, state):
+        # grid rollouts key on tuples of rows, pack those like the bitboard backends do
+        return state if isinstance(state, int) else bitboard.encode(state)
+
+    def home(self, key):
+        return ((key * HASH_MULTIPLIER) & MASK64) >> (64 - self.bits)
+
+    def slot(self, key):
+        keys = self.table['key']
+        mask = len(keys) - 1
+        i = self.home(key)
+        while True:
+            k = keys.item(i)
+            if k == key or k == 0:
+                return i
+            i = (i + 1) & mask
+
+    def get(self, state, default=0):
+        key = self.as_key(state)
+        i = self.slot(key)
+        if self.table['key'].item(i) == 0:
+            return default
+        return self.table['utility'].item(i)
+
+    def count(self, state):
+        i = self.slot(self.as_key(state))
+        return self.table['count'].item(i)
+
+    def visit(self, state, ut):
+        """
+        Counts one more visit of state and folds the return ut into its running mean utility.
+        """
+        if self.read_only:
+            raise ValueError('cannot update a read-only utility store')
+        key = self.as_key(state)
+        i = self.slot(key)
+        if self.table['key'].item(i) == 0:
+            if self.size >= self.capacity:
+                self.evict()
+                i = self.slot(key)
+            self.table['key'][i] = key
+            self.size += 1
+        n = self.table['count'].item(i) + 1
+        self.table['count'][i] = n
+        self.table['utility'][i] = ((n - 1) * self.table['utility'].item(i) + ut) / n
+
+    def get_many(self, keys, default=0.0):
+        """
+        Vectorized get for a uint64 array of packed boards.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        table_keys = self.table['key']
+        mask = np.uint64(len(table_keys) - 1)
+        slots = (keys * np.uint64(HASH_MULTIPLIER)) >> np.uint64(64 - self.bits)
+        result = np.full(len(keys), default, dtype=np.float64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            found = table_keys[slots[pending].astype(np.intp)]
+            hit = found == keys[pending]
+            result[pending[hit]] = self.table['utility'][slots[pending[hit]].astype(np.intp)]
+            pending = pending[~hit & (found != 0)]
+            slots[pending] = (slots[pending] + np.uint64(1)) & mask
+        return result
+
+    def evict(self):
+        """
+        Drops the least visited evict_fraction of the states and rehashes the rest.
+        """
+        used = self.table[self.table['key'] != 0]
+        keep = len(used) - max(1, int(len(used) * self.evict_fraction))
+        survivors = used[np.argsort(-used['count'].astype(np.int64), kind='stable')[:keep]]
+        self.table = np.zeros(len(self.table), dtype=RECORD)
+        for record in survivors:
+            self.table[self.slot(int(record['key']))] = record
+        self.size = len(survivors)
+        self.evictions += 1
+
+    def save(self, path):
+        np.save(path, self.table)
+
+    @classmethod
+    def load(cls, path, mode='c', capacity=None, evict_fraction=0.25):
+        """
+        Memory-maps a saved store. mode 'c' (copy-on-write) lets each process keep learning
+        without touching the file or copying it up front, 'r' is strictly read-only (agents then
+        use it as a fixed value table and do not learn) and 'r+' writes updates back to the file.
+        """
+        table = np.load(path, mmap_mode=mode)
+        return cls(capacity or len(table), evict_fraction, table)